@@ -3,15 +3,16 @@ views.py
 --------
 
 This module defines the core views for the `faceid` app, which include user registration, login, 
-logout, and profile management. It also handles the display of user photos and victories in the profile page.
+logout, and profile management. It also handles the display of user photos and victories in the profile page;
+the photos are linked by URL (see `faceid.photos`) rather than embedded in the page.
 
 """
 
-import base64
 from django.shortcuts import render, get_object_or_404
 from django.utils.translation import gettext as _
 from django.contrib.auth.models import User
 from faceid.models import UserPhoto, UserProfile
+from faceid.photos import photo_url
 
 # Create your views here.
 
@@ -60,10 +61,10 @@ def user_profile(request, username):
     """    
     user = User.objects.get(username=username)
     
-    # Завантаження фото користувача з бази даних
+    # Посилання на мініатюру фото користувача (сам файл браузер завантажує і кешує окремо)
     try:
-        user_photo_obj = UserPhoto.objects.get(user=user)
-        user_photo = base64.b64encode(user_photo_obj.photo).decode('utf-8')
+        user_photo_obj = UserPhoto.objects.defer("photo", "encoding").get(user=user)
+        user_photo = photo_url(user_photo_obj, "thumb")
     except UserPhoto.DoesNotExist:
         user_photo = None
     
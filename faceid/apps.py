@@ -11,3 +11,7 @@ class FaceidConfig(AppConfig):
     """
     default_auto_field = "django.db.models.BigAutoField"
     name = "faceid"
+
+    def ready(self):
+        # Реєстрація сигналів, що видаляють файли фото разом із записами
+        from . import signals
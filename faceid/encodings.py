@@ -0,0 +1,93 @@
+"""
+encodings.py
+------------
+
+This module computes the face encodings used for the face ID login and converts them to and from the
+compact form stored on `UserPhoto.encoding`: the 128 values of the face_recognition (dlib ResNet)
+embedding as float32 bytes, 512 bytes per user.
+
+Functions:
+----------
+
+- `encode_face(image_content)`:
+    Returns the encoding of the first face found in a JPEG/PNG image, or None.
+
+- `encode_photos(photos)`:
+    Computes the stored encodings of a batch of photos; runs in a process pool.
+
+- `encoding_to_bytes(encoding)`:
+    Packs an encoding into float32 bytes.
+
+- `encoding_from_bytes(data)`:
+    Unpacks stored float32 bytes into an encoding.
+"""
+
+import io
+
+import face_recognition
+import numpy as np
+
+# Розмірність і тип збереженого вектора обличчя
+ENCODING_SIZE = 128
+ENCODING_DTYPE = np.float32
+
+
+def encode_face(image_content):
+    """
+    Computes the face encoding of an image (HOG face detection and the dlib ResNet embedding).
+    Module-level, so that it can be run in a process pool.
+
+    Args:
+        image_content (bytes): The image content in bytes.
+
+    Returns:
+        numpy.ndarray: The 128-d encoding of the first face, or None if no face was found.
+    """
+    image = face_recognition.load_image_file(io.BytesIO(image_content))
+    encodings = face_recognition.face_encodings(image)
+    if not encodings:
+        return None
+    return encodings[0]
+
+
+def encode_photos(photos):
+    """
+    Computes the stored encodings of a batch of photos.
+    Module-level, so that it can be run in a process pool (see `streaming.map_batches`).
+
+    Args:
+        photos (list[tuple]): The (primary key, image bytes) pairs of the photos.
+
+    Returns:
+        list[tuple]: For every photo, its primary key, its encoding as float32 bytes (None if no face
+        was found or the image could not be read) and the error message, if any.
+    """
+    results = []
+    for pk, content in photos:
+        try:
+            encoding = encode_face(content)
+        except Exception as e:
+            results.append((pk, None, str(e)))
+            continue
+        results.append((pk, encoding_to_bytes(encoding) if encoding is not None else None, None))
+    return results
+
+
+def encoding_to_bytes(encoding):
+    """
+    Packs a face encoding into the float32 bytes stored on `UserPhoto.encoding`.
+    """
+    return np.asarray(encoding, dtype=ENCODING_DTYPE).tobytes()
+
+
+def encoding_from_bytes(data):
+    """
+    Unpacks the float32 bytes stored on `UserPhoto.encoding` into a face encoding.
+
+    Raises:
+        ValueError: If the data is not a 128-d float32 encoding.
+    """
+    encoding = np.frombuffer(bytes(data), dtype=ENCODING_DTYPE)
+    if encoding.shape != (ENCODING_SIZE,):
+        raise ValueError(f"A face encoding has {ENCODING_SIZE} values, got {encoding.size}.")
+    return encoding
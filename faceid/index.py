@@ -0,0 +1,424 @@
+"""
+index.py
+--------
+
+This module keeps the stored face encodings of all users in a nearest-neighbour index in memory,
+so that a face ID login is a single index search instead of a Python loop over the `UserPhoto` rows.
+The search backend is selected by FACEID_INDEX_BACKEND:
+
+- 'exact' (the default): one contiguous float32 matrix, searched with a single vectorized distance
+  computation; exact, and fast enough for tens of thousands of users.
+- 'hnsw': an approximate HNSW graph (the optional hnswlib package, CPU), whose search time grows
+  logarithmically with the number of users. The graph is persisted to FACEID_INDEX_PATH by
+  `python manage.py build_face_index`, so workers load it instead of rebuilding it at start-up;
+  `python manage.py benchmark_face_index` reports its recall against the exact search.
+
+The index is loaded once per worker process on first use and updated incrementally: registrations
+in this process are added directly, and before every search the rows added by other processes are
+loaded with one query on the primary key range after the highest loaded id. At most every
+FACEID_INDEX_RECONCILE_INTERVAL seconds, the number of stored encodings is compared with the index
+too; if rows were deleted or backfilled meanwhile, the index is reconciled with the user ids in the
+database. Rows whose encoding cannot be decoded are remembered as skipped, so they do not cause a
+reconciliation every time. Encodings recomputed in place (`encode_faces --force`) are picked up
+after a rebuild.
+
+Classes:
+--------
+
+- `ExactBackend`: Brute-force search in a float32 matrix.
+- `HnswBackend`: Approximate search in an hnswlib HNSW graph.
+- `FaceIndex`: Keeps a backend in sync with the `UserPhoto` rows.
+
+Variables:
+----------
+
+- `face_index`: The index of the current process.
+"""
+
+import os
+import threading
+import time
+
+import numpy as np
+from django.conf import settings
+
+from .encodings import ENCODING_DTYPE, ENCODING_SIZE, encoding_from_bytes
+from .models import UserPhoto
+
+# Початкова місткість індексу; далі вона подвоюється
+INITIAL_CAPACITY = 64
+
+# Кількість рядків, що читаються з бази даних за один запит
+LOAD_CHUNK_SIZE = 2000
+
+
+def face_tolerance():
+    """
+    Returns the largest face distance accepted as a match (FACEID_TOLERANCE, 0.6 by default).
+    """
+    return getattr(settings, "FACEID_TOLERANCE", 0.6)
+
+
+def reconcile_interval():
+    """
+    Returns the number of seconds between the checks for deleted and backfilled rows.
+    """
+    return getattr(settings, "FACEID_INDEX_RECONCILE_INTERVAL", 60)
+
+
+def index_path():
+    """
+    Returns the path the persistent index backends are saved to.
+    """
+    return getattr(settings, "FACEID_INDEX_PATH", "") or os.path.join(settings.BASE_DIR, "faceid_index.bin")
+
+
+class ExactBackend:
+    """
+    Brute-force nearest-neighbour search in one contiguous float32 matrix.
+
+    Attributes:
+    ----------
+    _matrix : numpy.ndarray
+        The (capacity, 128) matrix of encodings; the first `_size` rows are in use.
+    _sq_norms : numpy.ndarray
+        The squared norms of the rows of `_matrix`.
+    _labels : numpy.ndarray
+        The label (user id) of every row of `_matrix`.
+    """
+
+    name = "exact"
+    persistent = False
+
+    def __init__(self):
+        self._matrix = np.empty((INITIAL_CAPACITY, ENCODING_SIZE), dtype=ENCODING_DTYPE)
+        self._sq_norms = np.empty(INITIAL_CAPACITY, dtype=ENCODING_DTYPE)
+        self._labels = np.empty(INITIAL_CAPACITY, dtype=np.int64)
+        self._size = 0
+
+    def add(self, labels, vectors):
+        """
+        Adds a batch of (N,) labels and their (N, 128) vectors.
+        """
+        end = self._size + len(labels)
+        if end > len(self._matrix):
+            capacity = max(2 * len(self._matrix), end)
+            self._matrix = np.resize(self._matrix, (capacity, ENCODING_SIZE))
+            self._sq_norms = np.resize(self._sq_norms, capacity)
+            self._labels = np.resize(self._labels, capacity)
+
+        self._matrix[self._size:end] = vectors
+        self._sq_norms[self._size:end] = np.einsum("ij,ij->i", self._matrix[self._size:end], self._matrix[self._size:end])
+        self._labels[self._size:end] = labels
+        self._size = end
+
+    def remove(self, labels):
+        """
+        Removes the vectors of the given labels.
+        """
+        keep = ~np.isin(self._labels[:self._size], list(labels))
+        size = int(keep.sum())
+        # Нові масиви, щоб пошук, що вже виконується, дочитав старі
+        self._matrix = np.concatenate([self._matrix[:self._size][keep], np.empty((INITIAL_CAPACITY, ENCODING_SIZE), ENCODING_DTYPE)])
+        self._sq_norms = np.concatenate([self._sq_norms[:self._size][keep], np.empty(INITIAL_CAPACITY, ENCODING_DTYPE)])
+        self._labels = np.concatenate([self._labels[:self._size][keep], np.empty(INITIAL_CAPACITY, np.int64)])
+        self._size = size
+
+    def search(self, query):
+        """
+        Finds the nearest vector to a query.
+
+        Returns:
+            tuple: The label and the Euclidean distance of the nearest vector, or (None, None) if empty.
+        """
+        size = self._size
+        matrix, sq_norms, labels = self._matrix[:size], self._sq_norms[:size], self._labels[:size]
+        if not size:
+            return None, None
+
+        # |a - q|^2 = |a|^2 - 2 a.q + |q|^2 для всіх рядків одним множенням матриці на вектор
+        sq_distances = sq_norms - 2 * (matrix @ query) + np.dot(query, query)
+        best = int(np.argmin(sq_distances))
+        return int(labels[best]), float(np.sqrt(max(sq_distances[best], 0.0)))
+
+
+class HnswBackend:
+    """
+    Approximate nearest-neighbour search in an HNSW graph (hnswlib, L2 space).
+
+    The graph parameters are `M` (links per node) and `EF_CONSTRUCTION`; the search breadth is
+    FACEID_HNSW_EF (higher is slower, with a better recall).
+    """
+
+    name = "hnsw"
+    persistent = True
+    M = 16
+    EF_CONSTRUCTION = 200
+
+    def __init__(self, path=None, size=0):
+        try:
+            import hnswlib
+        except ImportError:
+            raise RuntimeError("FACEID_INDEX_BACKEND is 'hnsw', but hnswlib is not installed (pip install hnswlib).")
+
+        self.index = hnswlib.Index(space="l2", dim=ENCODING_SIZE)
+        if path:
+            self.index.load_index(path, allow_replace_deleted=True)
+        else:
+            self.index.init_index(
+                max_elements=INITIAL_CAPACITY, ef_construction=self.EF_CONSTRUCTION, M=self.M, allow_replace_deleted=True
+            )
+        self.index.set_ef(getattr(settings, "FACEID_HNSW_EF", 128))
+        self.index.set_num_threads(1)
+        self._size = size
+
+    def add(self, labels, vectors):
+        """
+        Adds a batch of (N,) labels and their (N, 128) vectors.
+        """
+        end = self._size + len(labels)
+        if end > self.index.get_max_elements():
+            self.index.resize_index(max(2 * self.index.get_max_elements(), end))
+        self.index.add_items(np.asarray(vectors, dtype=ENCODING_DTYPE), np.asarray(labels), replace_deleted=True)
+        self._size = end
+
+    def remove(self, labels):
+        """
+        Marks the vectors of the given labels as deleted; their slots are reused by later additions.
+        """
+        for label in labels:
+            self.index.mark_deleted(int(label))
+        self._size -= len(labels)
+
+    def search(self, query):
+        """
+        Finds the (approximately) nearest vector to a query.
+
+        Returns:
+            tuple: The label and the Euclidean distance of the nearest vector, or (None, None) if empty.
+        """
+        if not self._size:
+            return None, None
+        labels, sq_distances = self.index.knn_query(query, k=1)
+        # hnswlib повертає квадрат евклідової відстані
+        return int(labels[0, 0]), float(np.sqrt(max(sq_distances[0, 0], 0.0)))
+
+    def save(self, path):
+        self.index.save_index(path)
+
+
+BACKENDS = {
+    "exact": ExactBackend,
+    "hnsw": HnswBackend,
+}
+
+
+class FaceIndex:
+    """
+    Keeps a nearest-neighbour backend in sync with the face encodings stored on `UserPhoto`.
+
+    The labels of the backend are user ids (a user has a single photo).
+
+    Attributes:
+    ----------
+    _backend : ExactBackend | HnswBackend
+        The search backend, created on first use.
+    _labels : set
+        The user ids in the backend.
+    _skipped : set
+        The user ids whose stored encoding could not be decoded.
+    _last_id : int
+        The highest `UserPhoto` id loaded into the backend.
+    _reconciled_at : float
+        The `time.monotonic()` of the last comparison with the number of stored encodings.
+    """
+
+    def __init__(self, backend=None):
+        self.backend_name = backend
+        self._lock = threading.RLock()
+        self._backend = None
+        self._labels = set()
+        self._skipped = set()
+        self._last_id = 0
+        self._reconciled_at = None
+
+    def __len__(self):
+        return len(self._labels)
+
+    def _backend_class(self):
+        name = self.backend_name or getattr(settings, "FACEID_INDEX_BACKEND", "exact")
+        if name not in BACKENDS:
+            raise ValueError(f"Unknown face index backend: {name}")
+        return BACKENDS[name]
+
+    def _encoded_rows(self):
+        return UserPhoto.objects.filter(encoding__isnull=False, user__isnull=False)
+
+    def _load(self, rows):
+        # Завантажуються лише id і вектори, без фото, порціями
+        chunk = []
+        for row in rows.values_list("id", "user_id", "encoding").iterator(chunk_size=LOAD_CHUNK_SIZE):
+            chunk.append(row)
+            if len(chunk) == LOAD_CHUNK_SIZE:
+                self._add_rows(chunk)
+                chunk = []
+        if chunk:
+            self._add_rows(chunk)
+
+    def _add_rows(self, rows):
+        labels, vectors = [], []
+        for photo_id, user_id, data in rows:
+            self._last_id = max(self._last_id, photo_id)
+            if user_id in self._labels or user_id in self._skipped:
+                continue
+            try:
+                vectors.append(encoding_from_bytes(data))
+            except ValueError as e:
+                print(f"Skipping the face encoding of the photo {photo_id}: {e}")
+                self._skipped.add(user_id)
+                continue
+            labels.append(user_id)
+        if labels:
+            self._backend.add(np.array(labels, dtype=np.int64), np.stack(vectors))
+            self._labels.update(labels)
+
+    def _open(self):
+        """
+        Creates the backend: loads the persisted index if the backend has one, else builds it.
+        """
+        backend_class = self._backend_class()
+        if backend_class.persistent and os.path.exists(index_path()):
+            try:
+                self._restore(index_path())
+                return
+            except Exception as e:
+                print(f"Could not load the face index {index_path()}, rebuilding it: {e}")
+        self.rebuild()
+
+    def _restore(self, path):
+        meta = np.load(f"{path}.npz")
+        self._backend = self._backend_class()(path, size=len(meta["labels"]))
+        self._labels = set(meta["labels"].tolist())
+        self._skipped = set(meta["skipped"].tolist()) if "skipped" in meta.files else set()
+        self._last_id = int(meta["last_id"])
+        self._reconciled_at = None
+
+    def rebuild(self):
+        """
+        Loads all stored face encodings from the database into a new backend.
+        """
+        with self._lock:
+            self._backend = self._backend_class()()
+            self._labels = set()
+            self._skipped = set()
+            self._last_id = 0
+            self._load(self._encoded_rows().order_by("id"))
+            self._reconciled_at = time.monotonic()
+
+    def save(self):
+        """
+        Persists the index to FACEID_INDEX_PATH, if the backend supports it.
+
+        Returns:
+            str: The path of the index, or None if the backend is not persistent.
+        """
+        with self._lock:
+            if self._backend is None:
+                self.rebuild()
+            if not self._backend.persistent:
+                return None
+            path = index_path()
+            # Запис у тимчасові файли і заміна, щоб воркери не прочитали недописаний індекс
+            self._backend.save(f"{path}.part")
+            with open(f"{path}.npz.part", "wb") as f:
+                np.savez(
+                    f,
+                    labels=np.array(sorted(self._labels), dtype=np.int64),
+                    skipped=np.array(sorted(self._skipped), dtype=np.int64),
+                    last_id=self._last_id,
+                )
+            os.replace(f"{path}.part", path)
+            os.replace(f"{path}.npz.part", f"{path}.npz")
+            return path
+
+    def refresh(self):
+        """
+        Brings the index up to date with the database: loads it on first use, adds rows stored by
+        other processes, and, at most every FACEID_INDEX_RECONCILE_INTERVAL seconds, drops the users
+        deleted meanwhile and adds the backfilled rows.
+        """
+        with self._lock:
+            if self._backend is None:
+                self._open()
+
+            # Нові рядки: один запит за діапазоном первинного ключа, без підрахунку всієї таблиці
+            self._load(self._encoded_rows().filter(id__gt=self._last_id).order_by("id"))
+
+            now = time.monotonic()
+            if self._reconciled_at is not None and now - self._reconciled_at < reconcile_interval():
+                return
+            self._reconciled_at = now
+            if self._encoded_rows().count() != len(self._labels) + len(self._skipped):
+                self._reconcile()
+
+    def _reconcile(self):
+        # Видалені користувачі та рядки, заповнені пізніше (encode_faces), за повним списком id
+        user_ids = set(self._encoded_rows().values_list("user_id", flat=True))
+        deleted = self._labels - user_ids
+        if deleted:
+            self._backend.remove(deleted)
+            self._labels -= deleted
+        self._skipped &= user_ids
+        missing = list(user_ids - self._labels - self._skipped)
+        for start in range(0, len(missing), LOAD_CHUNK_SIZE):
+            self._load(self._encoded_rows().filter(user_id__in=missing[start:start + LOAD_CHUNK_SIZE]))
+
+    def add(self, photo_id, user_id, encoding):
+        """
+        Adds the encoding of a newly registered user.
+
+        Args:
+            photo_id (int): The id of the `UserPhoto` row.
+            user_id (int): The id of the user.
+            encoding (numpy.ndarray): The 128-d face encoding.
+        """
+        with self._lock:
+            if self._backend is None or user_id in self._labels:
+                # Індекс ще не завантажено: новий рядок потрапить у нього разом з іншими
+                return
+            self._backend.add(np.array([user_id], dtype=np.int64), np.asarray(encoding, dtype=ENCODING_DTYPE)[None])
+            self._labels.add(user_id)
+            self._last_id = max(self._last_id, photo_id)
+
+    def nearest(self, encoding):
+        """
+        Finds the stored face encoding closest to a face.
+
+        Args:
+            encoding (numpy.ndarray): The 128-d encoding of the face.
+
+        Returns:
+            tuple: The user id and the Euclidean distance of the nearest encoding, or (None, None) if
+            the index is empty.
+        """
+        self.refresh()
+        return self._backend.search(np.asarray(encoding, dtype=ENCODING_DTYPE))
+
+    def match(self, encoding, tolerance=None):
+        """
+        Returns the id of the user whose face is nearest to `encoding`, if it is within the tolerance.
+
+        Args:
+            encoding (numpy.ndarray): The 128-d encoding of the face.
+            tolerance (float): The largest accepted distance (default: FACEID_TOLERANCE).
+
+        Returns:
+            tuple: The user id (None if there is no match) and the distance of the nearest encoding.
+        """
+        user_id, distance = self.nearest(encoding)
+        if user_id is None or distance > (face_tolerance() if tolerance is None else tolerance):
+            return None, distance
+        return user_id, distance
+
+
+face_index = FaceIndex()
@@ -0,0 +1,90 @@
+"""
+benchmark_face_index.py
+=======================
+
+Management command that compares an approximate face index backend with the exact search: the
+build time, the search latency and the recall@1 (how often both return the same nearest user).
+The encodings are the ones stored on `UserPhoto`, or `--synthetic N` random 128-d vectors to
+measure user bases larger than the database; the queries are stored encodings with Gaussian noise,
+like a new photo of a registered user.
+
+Usage:
+    python manage.py benchmark_face_index [--backend hnsw] [--synthetic N] [--queries N] [--noise SIGMA]
+"""
+import time
+
+import numpy as np
+from django.core.management.base import BaseCommand, CommandError
+
+from faceid.encodings import ENCODING_DTYPE, ENCODING_SIZE, encoding_from_bytes
+from faceid.index import BACKENDS, ExactBackend
+from faceid.models import UserPhoto
+
+
+class Command(BaseCommand):
+    help = "Reports the latency and recall of a face index backend against the exact search."
+
+    def add_arguments(self, parser):
+        parser.add_argument("--backend", choices=sorted(set(BACKENDS) - {"exact"}), default="hnsw")
+        parser.add_argument("--synthetic", type=int, default=0, help="Number of random encodings instead of the stored ones.")
+        parser.add_argument("--queries", type=int, default=500)
+        parser.add_argument("--noise", type=float, default=0.05, help="Standard deviation of the noise added to the queries.")
+        parser.add_argument("--seed", type=int, default=0)
+
+    def handle(self, *args, **options):
+        rng = np.random.default_rng(options["seed"])
+        labels, vectors = self.encodings(options, rng)
+        if not len(labels):
+            raise CommandError("There are no face encodings; use --synthetic N.")
+
+        picked = rng.integers(0, len(labels), options["queries"])
+        queries = (vectors[picked] + rng.normal(0, options["noise"], (len(picked), ENCODING_SIZE))).astype(ENCODING_DTYPE)
+
+        exact = ExactBackend()
+        exact.add(labels, vectors)
+        try:
+            started = time.perf_counter()
+            backend = BACKENDS[options["backend"]]()
+            backend.add(labels, vectors)
+            build_time = time.perf_counter() - started
+        except RuntimeError as e:
+            raise CommandError(str(e))
+
+        expected, exact_time = self.search(exact, queries)
+        found, backend_time = self.search(backend, queries)
+        recall = float(np.mean(found == expected))
+
+        self.stdout.write(f"{len(labels)} encodings, {len(queries)} queries (noise {options['noise']})")
+        self.stdout.write(f"exact: {exact_time * 1000:.3f} ms per query")
+        self.stdout.write(
+            f"{options['backend']}: {backend_time * 1000:.3f} ms per query, built in {build_time:.2f}s, recall@1 {recall:.4f}"
+        )
+
+    def encodings(self, options, rng):
+        """
+        Returns the labels and vectors to index: the stored encodings or random ones.
+        """
+        if options["synthetic"]:
+            # Випадкові вектори з розкидом, близьким до векторів face_recognition
+            vectors = rng.normal(0, 0.1, (options["synthetic"], ENCODING_SIZE)).astype(ENCODING_DTYPE)
+            return np.arange(1, options["synthetic"] + 1, dtype=np.int64), vectors
+
+        rows = UserPhoto.objects.filter(encoding__isnull=False, user__isnull=False).values_list("user_id", "encoding")
+        labels, vectors = [], []
+        for user_id, data in rows.iterator(chunk_size=2000):
+            labels.append(user_id)
+            vectors.append(encoding_from_bytes(data))
+        if not labels:
+            return np.empty(0, dtype=np.int64), np.empty((0, ENCODING_SIZE), dtype=ENCODING_DTYPE)
+        return np.array(labels, dtype=np.int64), np.stack(vectors)
+
+    def search(self, backend, queries):
+        """
+        Runs the queries one by one, as logins do.
+
+        Returns:
+            tuple: The nearest label of every query and the mean time per query in seconds.
+        """
+        started = time.perf_counter()
+        labels = np.array([backend.search(query)[0] for query in queries])
+        return labels, (time.perf_counter() - started) / len(queries)
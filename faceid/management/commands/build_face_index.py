@@ -0,0 +1,39 @@
+"""
+build_face_index.py
+===================
+
+Management command that rebuilds the face ID index from the encodings stored on `UserPhoto` and,
+for a persistent backend (FACEID_INDEX_BACKEND=hnsw), saves it to FACEID_INDEX_PATH, where the
+workers load it at start-up. Run it after `encode_faces`, and periodically for large user bases,
+so that the workers have fewer rows to add on their own.
+
+Usage:
+    python manage.py build_face_index [--backend exact|hnsw]
+"""
+import time
+
+from django.core.management.base import BaseCommand, CommandError
+
+from faceid.index import BACKENDS, FaceIndex
+
+
+class Command(BaseCommand):
+    help = "Rebuilds the face ID index and saves it if the backend is persistent."
+
+    def add_arguments(self, parser):
+        parser.add_argument("--backend", choices=sorted(BACKENDS), help="Default: FACEID_INDEX_BACKEND.")
+
+    def handle(self, *args, **options):
+        index = FaceIndex(options["backend"])
+        started = time.perf_counter()
+        try:
+            index.rebuild()
+            path = index.save()
+        except RuntimeError as e:
+            raise CommandError(str(e))
+
+        self.stdout.write(f"{len(index)} face encodings indexed in {time.perf_counter() - started:.2f}s.")
+        if path:
+            self.stdout.write(self.style.SUCCESS(f"Index saved to {path}."))
+        else:
+            self.stdout.write(self.style.SUCCESS("The backend is not persistent; the workers build it in memory."))
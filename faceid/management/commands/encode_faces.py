@@ -0,0 +1,72 @@
+"""
+encode_faces.py
+===============
+
+Management command that computes and stores the face encodings of the `UserPhoto` rows registered
+before the encodings were stored, so that they can log in with face ID. Only rows without an
+encoding are processed, unless `--force` is given.
+
+The photos are read in batches of `--batch-size` rows and encoded in a pool of `--workers`
+processes with a bounded number of batches in flight (see `faceid/streaming.py`), so the memory
+use does not grow with the number of users. Progress is reported after every batch.
+
+Usage:
+    python manage.py encode_faces [--force] [--batch-size N] [--workers N]
+"""
+import os
+import time
+
+from django.core.management.base import BaseCommand
+
+from faceid.encodings import encode_photos
+from faceid.models import UserPhoto
+from faceid.streaming import iter_batches, map_batches
+
+
+class Command(BaseCommand):
+    help = "Computes the stored face encodings of the users' photos."
+
+    def add_arguments(self, parser):
+        parser.add_argument("--force", action="store_true", help="Recompute the encodings that are already stored too.")
+        parser.add_argument("--batch-size", type=int, default=32, help="Number of photos read and encoded together.")
+        parser.add_argument(
+            "--workers", type=int, default=os.cpu_count() or 1, help="Number of encoding processes (0: encode in this process)."
+        )
+
+    def handle(self, *args, **options):
+        user_photos = UserPhoto.objects.all()
+        if not options["force"]:
+            user_photos = user_photos.filter(encoding__isnull=True)
+        total = user_photos.count()
+
+        # Лише id і фото (з файлового сховища або з бази даних); вектори та дані користувачів не завантажуються
+        batches = (
+            [(user_photo.pk, user_photo.read_photo() or b"") for user_photo in batch]
+            for batch in iter_batches(user_photos.only("id", "photo", "image"), options["batch_size"])
+        )
+
+        encoded = without_face = failed = processed = 0
+        started = time.perf_counter()
+        for batch, results in map_batches(encode_photos, batches, options["workers"]):
+            updates = []
+            for pk, data, error in results:
+                if error is not None:
+                    failed += 1
+                    self.stderr.write(f"UserPhoto {pk}: {error}")
+                elif data is None:
+                    without_face += 1
+                    self.stdout.write(f"UserPhoto {pk}: no face found")
+                else:
+                    updates.append(UserPhoto(pk=pk, encoding=data))
+
+            # bulk_update(): змінюється лише вектор обличчя, одним запитом на порцію
+            UserPhoto.objects.bulk_update(updates, ["encoding"])
+            encoded += len(updates)
+            processed += len(batch)
+
+            elapsed = time.perf_counter() - started
+            self.stdout.write(f"{processed}/{total} photos processed ({processed / elapsed:.1f} per second)")
+
+        self.stdout.write(self.style.SUCCESS(
+            f"{encoded} face encodings stored, {without_face} photos without a face, {failed} failed."
+        ))
@@ -0,0 +1,59 @@
+"""
+move_face_photos.py
+===================
+
+Management command that moves the users' photos from the `UserPhoto.photo` database blobs to the
+file storage and generates their thumbnails (see `faceid/photos.py`). The rows are read in batches
+of `--batch-size` (see `faceid/streaming.py`); the blob of a row is cleared once its files are
+saved, unless `--keep-blobs` is given. Rows that already have a stored photo are skipped, so the
+command can be interrupted and run again.
+
+Usage:
+    python manage.py move_face_photos [--batch-size N] [--keep-blobs]
+"""
+import time
+
+from django.core.management.base import BaseCommand
+from django.db.models import Q
+
+from faceid.models import UserPhoto
+from faceid.photos import store_photo
+from faceid.streaming import iter_batches
+
+
+class Command(BaseCommand):
+    help = "Moves the users' photos from the database to the file storage and generates thumbnails."
+
+    def add_arguments(self, parser):
+        parser.add_argument("--batch-size", type=int, default=50, help="Number of photos read per query.")
+        parser.add_argument("--keep-blobs", action="store_true", help="Keep the photos in the database too.")
+
+    def handle(self, *args, **options):
+        user_photos = UserPhoto.objects.filter(Q(image="") | Q(image__isnull=True), photo__isnull=False)
+        fields = ["image", "thumbnail"] if options["keep_blobs"] else ["image", "thumbnail", "photo"]
+        total = user_photos.count()
+
+        moved = failed = processed = 0
+        started = time.perf_counter()
+        for batch in iter_batches(user_photos.only("id", "photo", "image", "thumbnail"), options["batch_size"]):
+            updated = []
+            for user_photo in batch:
+                try:
+                    store_photo(user_photo, bytes(user_photo.photo))
+                except Exception as e:
+                    failed += 1
+                    self.stderr.write(f"UserPhoto {user_photo.pk}: {e}")
+                    continue
+                if not options["keep_blobs"]:
+                    user_photo.photo = None
+                updated.append(user_photo)
+
+            # Одним запитом на порцію; фото з бази даних не записується назад
+            UserPhoto.objects.bulk_update(updated, fields)
+            moved += len(updated)
+            processed += len(batch)
+
+            elapsed = time.perf_counter() - started
+            self.stdout.write(f"{processed}/{total} photos processed ({processed / elapsed:.1f} per second)")
+
+        self.stdout.write(self.style.SUCCESS(f"{moved} photos moved to the file storage, {failed} failed."))
@@ -2,10 +2,10 @@
 Models for storing user data and photos for face recognition.
 
 This module defines models that store user profile information 
-and binary data for face recognition photos.
+and the photos used for face recognition.
 
 Classes:
-    UserPhoto: Stores the binary photo data for a user's face ID.
+    UserPhoto: Stores the photo, its thumbnail and the face encoding for a user's face ID.
     UserProfile: Stores additional profile information like victories.
 """
 
@@ -14,17 +14,34 @@ from django.db import models
 
 class UserPhoto(models.Model):
     """
-    Model for storing the binary photo data for face recognition.
+    Model for storing the photo data for face recognition.
     
     Attributes:
         user: A one-to-one relationship with the Django user.
-        photo: Binary field to store the image data.
+        photo: Binary field with the image data of rows registered before the photos were moved
+            to the file storage (`python manage.py move_face_photos`); empty for newer rows.
+        image: The photo in the file storage, named after its content hash (see `faceid.photos`).
+        thumbnail: A small copy of the photo for the profile page.
+        encoding: The 128-d face encoding of the photo as float32 bytes (see `faceid.encodings`),
+            computed at registration; empty if no face was found or it has not been computed yet.
     """
     user = models.OneToOneField(User, on_delete=models.CASCADE, null=True, blank=True)
-    photo = models.BinaryField()  # Store image data as binary
+    photo = models.BinaryField(null=True, blank=True)  # Legacy: image data stored as binary
+    image = models.ImageField(upload_to="faceid/photos/", null=True, blank=True)
+    thumbnail = models.ImageField(upload_to="faceid/thumbnails/", null=True, blank=True)
+    encoding = models.BinaryField(null=True, blank=True)  # Face encoding, 128 x float32
 
     def __str__(self):
         return self.user.username
+
+    def read_photo(self):
+        """
+        Returns the image bytes of the photo, from the file storage or the legacy binary field.
+        """
+        if self.image:
+            with self.image.open("rb") as f:
+                return f.read()
+        return bytes(self.photo) if self.photo else None
     
 
 class UserProfile(models.Model):
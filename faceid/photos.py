@@ -0,0 +1,163 @@
+"""
+photos.py
+---------
+
+This module stores the users' face ID photos in the default file storage (MEDIA_ROOT, or object
+storage if STORAGES is configured so) instead of the database, together with a small thumbnail for
+the profile page. The files are named after a hash of their content, so a name never changes its
+content: the hash is the ETag of the photo.
+
+The photos are biometric data and the `UserPhoto` ids are sequential, so a photo is only served at
+the URL handed out by `photo_url`, which carries a signature of the row id, the size and the content
+hash made with SECRET_KEY. The URL cannot be guessed from the id, and it changes with the content,
+which lets the browser of the viewer cache the photo for a long time (see `views.user_photo`).
+
+Functions:
+----------
+
+- `content_hash(content)`:
+    Returns the hash of image bytes used in the file names and as the ETag.
+
+- `make_thumbnail(content)`:
+    Returns a JPEG thumbnail of an image.
+
+- `store_photo(user_photo, content)`:
+    Saves a photo and its thumbnail into the storage fields of a `UserPhoto`.
+
+- `photo_etag(user_photo, size)`:
+    Returns the ETag of a stored photo or thumbnail.
+
+- `photo_signature(user_photo, size, etag)`:
+    Returns the signature that grants access to a photo.
+
+- `photo_url(user_photo, size)`:
+    Returns the signed URL a photo is served from.
+
+- `delete_photo_files(user_photo)`:
+    Deletes the stored files of a `UserPhoto`.
+"""
+
+import hashlib
+import io
+import os
+
+from django.core import signing
+from django.core.files.base import ContentFile
+from django.urls import reverse
+from PIL import Image
+
+# Розмір мініатюри для сторінки профілю (пропорції фото 4:3 зберігаються)
+THUMBNAIL_SIZE = (200, 150)
+THUMBNAIL_QUALITY = 85
+
+# Розміри фото, які віддає `views.user_photo`
+PHOTO_SIZES = ("full", "thumb")
+
+# Час кешування фото браузером (секунди) за підписаним URL; новий вміст отримує новий URL
+PHOTO_MAX_AGE = 365 * 24 * 60 * 60
+
+# Сіль підпису URL фото, щоб підпис не збігався з іншими підписами на SECRET_KEY
+PHOTO_SIGNING_SALT = "faceid.photo"
+
+
+def content_hash(content):
+    """
+    Returns the first 16 hexadecimal characters of the SHA-256 of image bytes.
+    """
+    return hashlib.sha256(content).hexdigest()[:16]
+
+
+def make_thumbnail(content):
+    """
+    Downscales an image to fit THUMBNAIL_SIZE.
+
+    Args:
+        content (bytes): The image content in bytes.
+
+    Returns:
+        bytes: The thumbnail in JPEG format.
+    """
+    image = Image.open(io.BytesIO(content))
+    if image.mode != "RGB":
+        image = image.convert("RGB")
+    image.thumbnail(THUMBNAIL_SIZE)
+    byte_arr = io.BytesIO()
+    image.save(byte_arr, format="JPEG", quality=THUMBNAIL_QUALITY, optimize=True)
+    return byte_arr.getvalue()
+
+
+def store_photo(user_photo, content):
+    """
+    Saves a photo and its thumbnail to the storage; the model instance itself is not saved.
+
+    Args:
+        user_photo (UserPhoto): The row to store the files on.
+        content (bytes): The resized JPEG photo.
+    """
+    digest = content_hash(content)
+    user_photo.image.save(f"{digest}.jpg", ContentFile(content), save=False)
+    user_photo.thumbnail.save(f"{digest}.jpg", ContentFile(make_thumbnail(content)), save=False)
+
+
+def photo_etag(user_photo, size="full"):
+    """
+    Returns the ETag of a photo: the content hash in the file name of the stored photo, or the hash
+    of the database blob of a row that has not been moved to the storage yet.
+
+    Args:
+        user_photo (UserPhoto): The row.
+        size (str): "full" or "thumb".
+
+    Returns:
+        str: The ETag (unquoted), or None if the row has no photo.
+    """
+    if user_photo.image:
+        # Мініатюра походить з того самого фото, тож відрізняється лише суфіксом
+        digest = os.path.splitext(os.path.basename(user_photo.image.name))[0].split("_")[0]
+        return digest if size == "full" else f"{digest}-thumb"
+    if user_photo.photo:
+        return content_hash(bytes(user_photo.photo))
+    return None
+
+
+def photo_signature(user_photo, size, etag):
+    """
+    Returns the signature of a photo URL: the row id, the size and the content hash signed with
+    SECRET_KEY, so that only URLs handed out by `photo_url` give access to the photo.
+
+    Args:
+        user_photo (UserPhoto): The row.
+        size (str): "full" or "thumb".
+        etag (str): The ETag of the photo (see `photo_etag`).
+
+    Returns:
+        str: The URL-safe signature.
+    """
+    return signing.Signer(salt=PHOTO_SIGNING_SALT).signature(f"{user_photo.pk}:{size}:{etag}")
+
+
+def photo_url(user_photo, size="thumb"):
+    """
+    Returns the signed URL of a photo. The signature covers the content hash, so the URL changes with
+    the photo and can be cached for PHOTO_MAX_AGE.
+
+    Args:
+        user_photo (UserPhoto): The row.
+        size (str): "full" or "thumb".
+
+    Returns:
+        str: The URL, or None if the row has no photo.
+    """
+    etag = photo_etag(user_photo, size)
+    if etag is None:
+        return None
+    return reverse("faceid:photo", args=[user_photo.pk, size, photo_signature(user_photo, size, etag)])
+
+
+def delete_photo_files(user_photo):
+    """
+    Deletes the photo and thumbnail files of a row from the storage.
+    """
+    for field in (user_photo.image, user_photo.thumbnail):
+        if field:
+            field.delete(save=False)
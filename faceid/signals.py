@@ -0,0 +1,22 @@
+"""
+signals.py
+----------
+
+Signal handlers that delete the photo files of a `UserPhoto` from the storage together with the row
+(e.g. when the user is deleted), so that no face photos are left behind.
+"""
+
+from django.db import transaction
+from django.db.models.signals import post_delete
+from django.dispatch import receiver
+
+from .models import UserPhoto
+from .photos import delete_photo_files
+
+
+@receiver(post_delete, sender=UserPhoto)
+def delete_deleted_photo_files(sender, instance, **kwargs):
+    """
+    Deletes the photo and thumbnail files of a deleted row once the deletion is committed.
+    """
+    transaction.on_commit(lambda: delete_photo_files(instance))
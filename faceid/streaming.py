@@ -0,0 +1,82 @@
+"""
+streaming.py
+------------
+
+This module processes the `UserPhoto` rows, whose `photo` blobs can add up to far more than the
+memory of a worker, in bounded batches: the rows are read one batch per query, and the batches are
+processed in a pool of processes with a bounded number of batches in flight, so the peak memory
+depends on the batch size and the number of processes, not on the number of users.
+
+Functions:
+----------
+
+- `iter_batches(queryset, batch_size)`:
+    Yields the rows of a queryset in primary key order, one query per batch.
+
+- `map_batches(func, batches, workers)`:
+    Applies a function to every batch in a process pool and yields the results in order.
+"""
+
+import multiprocessing
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor
+
+
+def iter_batches(queryset, batch_size=100):
+    """
+    Yields the rows of a queryset in batches, in primary key order.
+
+    Every batch is a separate query that starts after the last primary key of the previous one
+    (keyset pagination), so no cursor stays open while the caller writes to the same table, and rows
+    updated meanwhile are neither skipped nor read twice. Restrict the columns with `.only()` or
+    `.defer("photo")` on the queryset.
+
+    Args:
+        queryset (QuerySet): The rows to read.
+        batch_size (int): The number of rows per batch.
+
+    Yields:
+        list: The model instances of one batch.
+    """
+    queryset = queryset.order_by("pk")
+    last_pk = None
+    while True:
+        page = queryset if last_pk is None else queryset.filter(pk__gt=last_pk)
+        batch = list(page[:batch_size])
+        if not batch:
+            return
+        yield batch
+        last_pk = batch[-1].pk
+
+
+def map_batches(func, batches, workers=0):
+    """
+    Applies a function to every batch in a pool of processes.
+
+    At most two batches per process are in flight, so a lazily produced sequence of batches (e.g.
+    from `iter_batches`) is never read far ahead of the processing.
+
+    Args:
+        func (callable): A module-level function taking one batch; it runs in the pool processes.
+        batches (iterable): The batches (picklable, e.g. lists of bytes).
+        workers (int): The number of processes; 0 processes the batches in this process.
+
+    Yields:
+        tuple: Every batch and the result of `func` on it, in the order of `batches`.
+    """
+    if workers <= 0:
+        for batch in batches:
+            yield batch, func(batch)
+        return
+
+    # spawn: процеси пулу не успадковують з'єднання з базою даних і стан Django
+    with ProcessPoolExecutor(max_workers=workers, mp_context=multiprocessing.get_context("spawn")) as executor:
+        pending = deque()
+        for batch in batches:
+            pending.append((batch, executor.submit(func, batch)))
+            if len(pending) >= 2 * workers:
+                batch, future = pending.popleft()
+                yield batch, future.result()
+        while pending:
+            batch, future = pending.popleft()
+            yield batch, future.result()
@@ -1,3 +1,183 @@
-from django.test import TestCase
+import io
+import os
+import shutil
+import tempfile
+import unittest
+from importlib.util import find_spec
+from unittest import mock
 
-# Create your tests here.
+import numpy as np
+from django.contrib.auth.models import User
+from django.test import SimpleTestCase, TestCase, override_settings
+from django.urls import reverse
+from PIL import Image
+
+from faceid import index
+from faceid.encodings import ENCODING_SIZE, encoding_to_bytes
+from faceid.index import ExactBackend, FaceIndex, HnswBackend
+from faceid.models import UserPhoto
+from faceid.photos import photo_etag, photo_signature, photo_url, store_photo
+
+
+def random_encodings(count, seed=0):
+    return np.random.default_rng(seed).normal(0, 0.1, (count, ENCODING_SIZE)).astype(np.float32)
+
+
+def add_user(name, encoding):
+    user = User.objects.create_user(name)
+    data = encoding if isinstance(encoding, bytes) else encoding_to_bytes(encoding)
+    return UserPhoto.objects.create(user=user, encoding=data)
+
+
+@override_settings(FACEID_INDEX_RECONCILE_INTERVAL=60)
+class FaceIndexRefreshTests(TestCase):
+    def setUp(self):
+        self.encodings = random_encodings(3)
+        self.photos = [add_user(f"user{i}", encoding) for i, encoding in enumerate(self.encodings)]
+        # Рядок з пошкодженим вектором
+        add_user("broken", b"not an encoding")
+        self.index = FaceIndex("exact")
+        with mock.patch("builtins.print"):
+            self.index.refresh()
+
+    def test_finds_the_stored_faces(self):
+        for photo, encoding in zip(self.photos, self.encodings):
+            self.assertEqual(self.index.match(encoding, tolerance=0.01)[0], photo.user_id)
+        self.assertEqual(len(self.index), 3)
+
+    def test_login_runs_one_primary_key_range_query(self):
+        with self.assertNumQueries(1):
+            self.index.refresh()
+
+    def test_skipped_row_does_not_cause_reconciliation(self):
+        # Після інтервалу — лише підрахунок; пропущений рядок входить у загальну кількість
+        with mock.patch.object(index.time, "monotonic", return_value=self.index._reconciled_at + 61):
+            with self.assertNumQueries(2):
+                self.index.refresh()
+
+    def test_new_and_deleted_users_are_picked_up(self):
+        new_encoding = random_encodings(1, seed=1)[0]
+        new_photo = add_user("new", new_encoding)
+        self.assertEqual(self.index.match(new_encoding, tolerance=0.01)[0], new_photo.user_id)
+
+        self.photos[0].user.delete()
+        with mock.patch.object(index.time, "monotonic", return_value=self.index._reconciled_at + 61):
+            self.index.refresh()
+        self.assertNotEqual(self.index.match(self.encodings[0])[0], self.photos[0].user_id)
+        self.assertEqual(len(self.index), 3)
+
+
+@unittest.skipUnless(find_spec("hnswlib"), "hnswlib is not installed")
+class HnswBackendTests(SimpleTestCase):
+    def setUp(self):
+        self.vectors = random_encodings(500)
+        self.labels = np.arange(1, 501)
+        # Запити — збережені вектори з невеликим шумом
+        self.queries = self.vectors[:100] + random_encodings(100, seed=1) * 0.1
+        self.exact, self.hnsw = ExactBackend(), HnswBackend()
+        for backend in (self.exact, self.hnsw):
+            backend.add(self.labels, self.vectors)
+
+    def assert_agree(self, exact, hnsw):
+        agreed = 0
+        for query in self.queries:
+            exact_label, exact_distance = exact.search(query)
+            hnsw_label, hnsw_distance = hnsw.search(query)
+            if hnsw_label == exact_label:
+                agreed += 1
+                self.assertAlmostEqual(hnsw_distance, exact_distance, places=4)
+        self.assertGreaterEqual(agreed / len(self.queries), 0.99)
+
+    def test_agrees_with_the_exact_search(self):
+        self.assert_agree(self.exact, self.hnsw)
+
+    def test_removed_vectors_are_not_found_and_slots_are_reused(self):
+        removed = self.labels[:50]
+        for backend in (self.exact, self.hnsw):
+            backend.remove(removed)
+            self.assertNotIn(backend.search(self.vectors[0])[0], set(removed))
+        new_labels = np.arange(1001, 1051)
+        for backend in (self.exact, self.hnsw):
+            backend.add(new_labels, self.vectors[:50])
+        self.assertEqual(self.hnsw.index.get_current_count(), 500)
+        self.assert_agree(self.exact, self.hnsw)
+
+    def test_saved_index_is_loaded(self):
+        root = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, root, ignore_errors=True)
+        path = os.path.join(root, "faces.hnsw")
+        self.hnsw.save(path)
+        self.assert_agree(self.exact, HnswBackend(path, size=len(self.labels)))
+
+
+def jpeg_bytes(color):
+    buf = io.BytesIO()
+    Image.new("RGB", (400, 300), color).save(buf, "JPEG")
+    return buf.getvalue()
+
+
+class UserPhotoViewTests(TestCase):
+    def setUp(self):
+        media_root = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, media_root, ignore_errors=True)
+        settings_override = override_settings(MEDIA_ROOT=media_root)
+        settings_override.enable()
+        self.addCleanup(settings_override.disable)
+
+        self.owner = User.objects.create_user("owner")
+        self.photo = UserPhoto(user=self.owner, encoding=encoding_to_bytes(random_encodings(1)[0]))
+        store_photo(self.photo, jpeg_bytes((255, 0, 0)))
+        self.photo.save()
+
+    def url(self, size, signature, photo=None):
+        return reverse("faceid:photo", args=[(photo or self.photo).pk, size, signature])
+
+    def test_signed_thumbnail_is_served_with_a_private_cache(self):
+        response = self.client.get(photo_url(self.photo, "thumb"))
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response["Content-Type"], "image/jpeg")
+        self.assertEqual(response["ETag"], f'"{photo_etag(self.photo, "thumb")}"')
+        self.assertIn("private", response["Cache-Control"])
+        self.assertIn("immutable", response["Cache-Control"])
+        with Image.open(io.BytesIO(b"".join(response.streaming_content))) as thumbnail:
+            self.assertLessEqual(thumbnail.size, (200, 150))
+
+    def test_bad_signature_is_rejected(self):
+        signature = photo_signature(self.photo, "thumb", photo_etag(self.photo, "thumb"))
+        self.assertEqual(self.client.get(self.url("thumb", "x" + signature[1:])).status_code, 404)
+        self.assertEqual(self.client.get(self.url("thumb", "-")).status_code, 404)
+        # The signature of the thumbnail does not open the full-size photo or another row
+        self.client.force_login(self.owner)
+        self.assertEqual(self.client.get(self.url("full", signature)).status_code, 404)
+        other = UserPhoto.objects.create(user=User.objects.create_user("other"), photo=jpeg_bytes((0, 0, 255)))
+        self.assertEqual(self.client.get(self.url("thumb", signature, other)).status_code, 404)
+
+    def test_replaced_photo_invalidates_the_old_url(self):
+        old_url = photo_url(self.photo, "thumb")
+        store_photo(self.photo, jpeg_bytes((0, 255, 0)))
+        self.photo.save()
+        self.assertEqual(self.client.get(old_url).status_code, 404)
+        self.assertEqual(self.client.get(photo_url(self.photo, "thumb")).status_code, 200)
+
+    def test_matching_etag_gets_not_modified(self):
+        url = photo_url(self.photo, "thumb")
+        etag = self.client.get(url)["ETag"]
+        response = self.client.get(url, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 304)
+        self.assertEqual(response["ETag"], etag)
+
+    def test_full_photo_is_only_served_to_its_owner_and_staff(self):
+        url = photo_url(self.photo, "full")
+        self.assertEqual(self.client.get(url).status_code, 404)
+        self.client.force_login(User.objects.create_user("stranger"))
+        self.assertEqual(self.client.get(url).status_code, 404)
+        self.client.force_login(self.owner)
+        self.assertEqual(self.client.get(url).status_code, 200)
+        self.client.force_login(User.objects.create_user("admin", is_staff=True))
+        self.assertEqual(self.client.get(url).status_code, 200)
+
+    def test_legacy_database_photo_is_served(self):
+        legacy = UserPhoto.objects.create(user=User.objects.create_user("legacy"), photo=jpeg_bytes((0, 0, 255)))
+        response = self.client.get(photo_url(legacy, "thumb"))
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.content, jpeg_bytes((0, 0, 255)))
@@ -9,6 +9,7 @@ URLs:
     login: Page for user login with face ID.
     signup: Page for user registration with face ID.
     logout: Logout functionality using Django's built-in view.
+    photo: A user's photo or its thumbnail, at a signed URL (see `faceid.photos.photo_url`).
 """
 
 from django.urls import path
@@ -22,4 +23,5 @@ urlpatterns = [
     path("login/", views.login, name="login"),
     path("signup/", views.register, name="register"),
     path('logout/', auth_views.LogoutView.as_view(), name='logout'),
+    path("photo/<int:pk>/<str:size>/<str:signature>/", views.user_photo, name="photo"),
 ]
@@ -6,15 +6,25 @@ This module defines views for user registration, login, and image resizing funct
 It also handles the logic for user session management, including automatic login after registration 
 and facial recognition-based login.
 
+The face encoding of a user's photo is computed once, at registration, and stored on `UserPhoto`
+(`python manage.py encode_faces` fills it in for older rows), so a login only encodes the new photo
+and finds the nearest stored vector in the in-memory index (see `index.py`).
+
 """
 
 import io
-import face_recognition
 from PIL import Image
-from django.shortcuts import render, redirect
-from django.http import JsonResponse
+from django.shortcuts import render, redirect, get_object_or_404
+from django.http import FileResponse, Http404, HttpResponse, JsonResponse
+from django.utils.cache import get_conditional_response, patch_cache_control
+from django.utils.crypto import constant_time_compare
+from django.utils.http import quote_etag
+from .encodings import encode_face, encoding_to_bytes
+from .index import face_index
 from .models import UserPhoto
+from .photos import PHOTO_MAX_AGE, PHOTO_SIZES, photo_etag, photo_signature, store_photo
 from django.views.decorators.csrf import csrf_exempt
+from django.views.decorators.http import require_GET
 from django.contrib.auth import logout, login as auth_login
 from django.contrib.auth.models import User
 
@@ -81,9 +91,15 @@ def register(request):
             # Створюємо нового користувача
             user = User.objects.create_user(username=name, password="temporary_password")
 
-            # Зберігаємо фото користувача
-            user_photo = UserPhoto(user=user, photo=resized_photo_content)
+            # Обчислюємо вектор обличчя один раз, під час реєстрації
+            encoding = encode_face(resized_photo_content)
+
+            # Зберігаємо фото (у файловому сховищі, з мініатюрою) разом із вектором обличчя
+            user_photo = UserPhoto(user=user, encoding=encoding_to_bytes(encoding) if encoding is not None else None)
+            store_photo(user_photo, resized_photo_content)
             user_photo.save()
+            if encoding is not None:
+                face_index.add(user_photo.id, user.id, encoding)
 
             # Автоматичний вхід користувача після реєстрації
             auth_login(request, user)
@@ -108,31 +124,61 @@ def login(request):
         photo = request.FILES.get("photo")
 
         if photo:
-            login_image_content = resize_image(photo.read())
-            login_image = face_recognition.load_image_file(io.BytesIO(login_image_content))
-            login_face_encodings = face_recognition.face_encodings(login_image)
-
-            if not login_face_encodings:
+            login_face_encoding = encode_face(resize_image(photo.read()))
+            if login_face_encoding is None:
                 return JsonResponse({"success": False})
 
-            users = UserPhoto.objects.all()
-            for user_photo in users:
-                registered_image_content = user_photo.photo
+            # Найближчий збережений вектор обличчя (одне векторизоване обчислення відстаней)
+            user_id, distance = face_index.match(login_face_encoding)
+            user = User.objects.filter(id=user_id).first() if user_id is not None else None
+            if user is not None:
+                # Вхід у систему
+                auth_login(request, user)
+                return JsonResponse({"success": True, "name": user.username})
 
-                try:
-                    registered_image = face_recognition.load_image_file(io.BytesIO(registered_image_content))
-                    registered_face_encodings = face_recognition.face_encodings(registered_image)
+    return JsonResponse({"success": False})
 
-                    if len(registered_face_encodings) > 0 and face_recognition.compare_faces(registered_face_encodings, login_face_encodings[0])[0]:
-                        # Вхід у систему
-                        user = user_photo.user
-                        auth_login(request, user)
-                        return JsonResponse({"success": True, "name": user.username})
-                except Exception as e:
-                    print(f"Error processing image: {e}")
-                    continue
 
-    return JsonResponse({"success": False})
+@require_GET
+def user_photo(request, pk, size, signature):
+    """
+    Serves a user's photo or its thumbnail with an ETag.
+
+    Only the signed URLs handed out by `photos.photo_url` are served, and the full-size photo (no
+    page links it) only to its owner and to staff; other requests get a 404 response, so the
+    photos cannot be enumerated by id. The signature changes with the content, so the response may
+    be cached for PHOTO_MAX_AGE, but only by the browser of the viewer (`private`).
+
+    Args:
+        request: The HTTP request object.
+        pk (int): The id of the `UserPhoto` row.
+        size (str): "full" or "thumb".
+        signature (str): The signature of the URL (see `photos.photo_signature`).
+
+    Returns:
+        HttpResponse: The JPEG image, or a 304 response.
+    """
+    if size not in PHOTO_SIZES:
+        raise Http404
+    # Вектор обличчя не потрібен; фото з бази даних читається лише для ще не перенесених рядків
+    user_photo = get_object_or_404(UserPhoto.objects.defer("photo", "encoding"), pk=pk)
+    etag = photo_etag(user_photo, size)
+    if etag is None or not constant_time_compare(signature, photo_signature(user_photo, size, etag)):
+        raise Http404
+    if size == "full" and not (request.user.is_staff or request.user.id == user_photo.user_id):
+        raise Http404
+
+    response = get_conditional_response(request, etag=quote_etag(etag))
+    if response is None:
+        field = user_photo.thumbnail if size == "thumb" and user_photo.thumbnail else user_photo.image
+        if field:
+            response = FileResponse(field.open("rb"), content_type="image/jpeg")
+        else:
+            response = HttpResponse(bytes(user_photo.photo), content_type="image/jpeg")
+
+    response["ETag"] = quote_etag(etag)
+    patch_cache_control(response, private=True, max_age=PHOTO_MAX_AGE, immutable=True)
+    return response
 
 
 def success(request):
@@ -4,3 +4,7 @@ from django.apps import AppConfig
 class Game2Config(AppConfig):
     default_auto_field = 'django.db.models.BigAutoField'
     name = 'game2'
+
+    def ready(self):
+        # Реєстрація сигналів, що оновлюють збережені прогнози моделі
+        from . import signals
@@ -0,0 +1,170 @@
+"""
+inference.py
+------------
+
+This module runs the game model (`GAME_MODEL`) on batches of images. The whole batch is prepared at
+once and goes through a single model call: the PyTorch VGG16 through the shared micro-batching of the
+recognition app, the Keras model through a traced `tf.function` (see `recognition.loaders`) or its
+ONNX Runtime session, instead of `model.predict` per image. `warm_up()` loads the model and runs one
+batch, so that the first game round of a worker does not pay the loading and graph tracing;
+`warm_up_worker()` does so in every gunicorn worker after fork (see `post_worker_init` in
+gunicorn.conf.py), never in the master process or in `manage.py` commands. With the inference pool
+the warm-up runs in the initializer of every pool process (see `recognition.pool.add_warm_up`).
+
+Functions:
+----------
+
+- `predict_batch(images, model_name=None)`:
+    Returns the CIFAR-10 class probabilities of a batch of images.
+
+- `classify_batch(images, model_name=None)`:
+    Returns the predicted class and confidence of every image of a batch.
+
+- `classify_paths(paths)`:
+    Classifies image files, skipping unreadable ones; runs in the inference process pool if it is enabled.
+
+- `warm_up(model_name=None)`:
+    Loads the game model and runs it once.
+
+- `warm_up_worker()`:
+    Warms up the game model of a web worker if GAME_WARM_UP is enabled.
+
+Variables:
+----------
+
+- `CLASSES`: A list of class names corresponding to the CIFAR-10 dataset categories.
+"""
+
+import numpy as np
+import torch
+from django.conf import settings
+from PIL import Image
+
+from recognition.batching import run_batched
+from recognition.pool import add_warm_up, start_processes
+from recognition.preprocessing import classifier_inputs
+# Імпорт loaders реєструє моделі (застосунок game2 ініціалізується раніше за recognition)
+from recognition.loaders import registry
+
+# Список класів CIFAR-10, що буде використовуватись для класифікації зображень
+CLASSES = [
+    "plane",
+    "car",
+    "bird",
+    "cat",
+    "deer",
+    "dog",
+    "frog",
+    "horse",
+    "ship",
+    "truck",
+]
+
+# Розмір входу моделі Keras
+KERAS_INPUT_SIZE = (32, 32)
+
+
+def keras_inputs(images):
+    """
+    Prepares images for the Keras model: a (N, 32, 32, 3) float32 batch with values in [0, 1].
+    """
+    batch = np.empty((len(images), *KERAS_INPUT_SIZE, 3), dtype=np.float32)
+    for i, image in enumerate(images):
+        batch[i] = np.asarray(image.resize(KERAS_INPUT_SIZE), dtype=np.float32)
+    return batch / 255.0
+
+
+def predict_batch(images, model_name=None):
+    """
+    Returns the CIFAR-10 class probabilities of a batch of images predicted by the game model.
+
+    Args:
+        images (list[PIL.Image.Image]): The images.
+        model_name (str): "vgg16" or "cifar10_keras" (default: the `GAME_MODEL` setting).
+
+    Returns:
+        numpy.ndarray: A (N, 10) array of the probabilities of the classes in `CLASSES` order.
+    """
+    model_name = model_name or getattr(settings, "GAME_MODEL", "cifar10_keras")
+    images = [image.convert("RGB") for image in images]
+    if not images:
+        return np.empty((0, len(CLASSES)), dtype=np.float32)
+
+    if model_name == "vgg16":
+        # Та сама VGG16 (PyTorch), що й у розпізнаванні, з тією ж підготовкою зображення
+        output = torch.stack(run_batched("vgg16", classifier_inputs(images)))
+        return torch.softmax(output, dim=1).numpy()
+
+    # Один виклик моделі Keras (tf.function або ONNX Runtime) на весь батч
+    return registry.get("cifar10_keras").predict(keras_inputs(images))
+
+
+def classify_batch(images, model_name=None):
+    """
+    Classifies a batch of images with the game model.
+
+    Returns:
+        list[tuple]: The predicted class name and the model's confidence in percent for every image.
+    """
+    probabilities = predict_batch(images, model_name)
+    indices = probabilities.argmax(axis=1)
+    return [(CLASSES[index], float(row[index] * 100)) for index, row in zip(indices, probabilities)]
+
+
+def classify_paths(paths):
+    """
+    Classifies image files with the game model.
+    Module-level, so that it can be run in the inference process pool.
+
+    An image that cannot be read is reported and skipped, the other images of the batch are still classified.
+
+    Args:
+        paths (list[str]): The paths of the images.
+
+    Returns:
+        list[tuple]: The predicted class name and the model's confidence in percent for every image,
+                     None for the images that could not be read.
+    """
+    images, readable = [], []
+    for i, path in enumerate(paths):
+        try:
+            with Image.open(path) as image:
+                images.append(image.convert("RGB"))
+        except Exception as e:
+            print(f"Could not read the game image {path}: {e}")
+            continue
+        readable.append(i)
+
+    results = [None] * len(paths)
+    if images:
+        for i, result in zip(readable, classify_batch(images)):
+            results[i] = result
+    return results
+
+
+def warm_up(model_name=None):
+    """
+    Loads the game model and runs it on a blank image, so that the first real call is fast.
+    """
+    predict_batch([Image.new("RGB", KERAS_INPUT_SIZE)], model_name)
+
+
+def warm_up_worker():
+    """
+    Warms up the game model of a web worker if GAME_WARM_UP is enabled: in every inference pool
+    process if the pool is enabled, otherwise in the worker itself. Errors are printed, not raised,
+    so that a model that cannot be loaded does not stop the worker from serving the other pages.
+    """
+    if not getattr(settings, "GAME_WARM_UP", False):
+        return
+
+    try:
+        if getattr(settings, "INFERENCE_POOL_SIZE", 2) <= 0:
+            warm_up()
+            return
+        # Прогрів в ініціалізаторі кожного процесу пулу, зокрема процесів, запущених пізніше;
+        # воркер ще не обслуговує запити, тож чекаємо на запуск процесів напряму
+        add_warm_up(warm_up)
+        start_processes()
+    except Exception as e:
+        print(f"Could not warm up the game model: {e}")
@@ -0,0 +1,65 @@
+"""
+check_game_model.py
+===================
+
+Management command that compares the game models on the ImageForGame set: the accuracy of the
+Keras CIFAR-10 model and of the PyTorch VGG16 against the correct labels, and how often their
+predictions agree. It fails if the model selected by `--candidate` is less accurate than the
+`--reference` model by more than `--max-drop`.
+
+Usage:
+    python manage.py check_game_model [--reference cifar10_keras] [--candidate vgg16] [--max-drop FRACTION]
+"""
+from django.core.management.base import BaseCommand, CommandError
+from PIL import Image
+
+from game2.models import ImageForGame
+from game2.inference import CLASSES
+from game2.views import predict_probabilities
+
+
+GAME_MODELS = ("cifar10_keras", "vgg16")
+
+
+class Command(BaseCommand):
+    help = "Compares the predictions of the game models on the ImageForGame set."
+
+    def add_arguments(self, parser):
+        parser.add_argument("--reference", choices=GAME_MODELS, default="cifar10_keras")
+        parser.add_argument("--candidate", choices=GAME_MODELS, default="vgg16")
+        parser.add_argument("--max-drop", type=float, default=0.0, help="Maximum allowed loss of accuracy.")
+
+    def handle(self, *args, **options):
+        names = (options["reference"], options["candidate"])
+        correct = dict.fromkeys(names, 0)
+        agreed = total = 0
+
+        for game_image in ImageForGame.objects.only("image", "correct_label").iterator():
+            try:
+                with game_image.image.open("rb") as f:
+                    image = Image.open(f)
+                    image.load()
+                predictions = {name: CLASSES[predict_probabilities(image, name).argmax()] for name in names}
+            except RuntimeError as e:
+                raise CommandError(str(e))
+            except OSError as e:
+                self.stderr.write(f"{game_image.image.name}: {e}")
+                continue
+
+            total += 1
+            agreed += predictions[names[0]] == predictions[names[1]]
+            for name in names:
+                correct[name] += predictions[name] == game_image.correct_label
+
+        if not total:
+            raise CommandError("There are no game images.")
+
+        accuracy = {name: correct[name] / total for name in names}
+        for name in names:
+            self.stdout.write(f"{name}: accuracy {accuracy[name]:.4f} ({correct[name]}/{total})")
+        self.stdout.write(f"agreement: {agreed / total:.4f}")
+
+        drop = accuracy[names[0]] - accuracy[names[1]]
+        if drop > options["max_drop"]:
+            raise CommandError(f"{names[1]} is less accurate than {names[0]} by {drop:.4f}.")
+        self.stdout.write(self.style.SUCCESS(f"{names[1]} is at least as accurate as {names[0]} (within {options['max_drop']})."))
@@ -0,0 +1,70 @@
+"""
+predict_game_images.py
+======================
+
+Management command that stores the game model's predictions on the `ImageForGame` rows. The images
+are scored in batches, one model call per batch. Only rows without a prediction of the current model
+version are processed, unless `--force` is given. Images that cannot be read are reported and skipped.
+
+Usage:
+    python manage.py predict_game_images [--force] [--batch-size N]
+"""
+import time
+
+from django.core.management.base import BaseCommand
+from django.db.models import Q
+
+from game2.inference import warm_up
+from game2.models import ImageForGame
+from game2.predictions import current_model_version, update_predictions
+
+
+class Command(BaseCommand):
+    help = "Precomputes the game model's predictions for the game images."
+
+    def add_arguments(self, parser):
+        parser.add_argument("--force", action="store_true", help="Recompute the predictions that are up to date too.")
+        parser.add_argument("--batch-size", type=int, default=64, help="Number of images per model call.")
+
+    def handle(self, *args, **options):
+        version = current_model_version()
+        images = ImageForGame.objects.all()
+        if not options["force"]:
+            images = images.filter(Q(model_version__isnull=True) | ~Q(model_version=version) | Q(predicted_class__isnull=True))
+
+        # Завантаження і трасування моделі не враховуються в часі на зображення
+        warm_up()
+
+        updated = 0
+        self.skipped = 0
+        started = time.perf_counter()
+        batch = []
+        for game_image in images.order_by("id").iterator():
+            batch.append(game_image)
+            if len(batch) == options["batch_size"]:
+                updated += self.score(batch, version)
+                batch = []
+        if batch:
+            updated += self.score(batch, version)
+
+        elapsed = time.perf_counter() - started
+        per_image = f", {elapsed / updated * 1000:.1f} ms per image" if updated else ""
+        self.stdout.write(self.style.SUCCESS(f"{updated} predictions stored (model version {version}){per_image}."))
+        if self.skipped:
+            self.stderr.write(f"{self.skipped} images could not be read and were skipped.")
+
+    def score(self, batch, version):
+        """
+        Scores one batch of images and reports their predictions; returns the number of stored predictions.
+        """
+        results = update_predictions(batch, version)
+        stored = 0
+        for game_image, result in zip(batch, results):
+            if result is None:
+                self.skipped += 1
+                self.stderr.write(f"{game_image.image.name}: could not be read, skipped")
+                continue
+            predicted_class, confidence = result
+            self.stdout.write(f"{game_image.image.name}: {predicted_class}, {confidence:.2f}%")
+            stored += 1
+        return stored
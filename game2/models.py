@@ -9,11 +9,18 @@ class ImageForGame(models.Model):
     - title: The name of the image (max 255 characters), defaults to 'Untitled'.
     - image: The image file uploaded to the 'game_images/' folder.
     - correct_label: The correct label or class for this image (max 50 characters).
+    - predicted_class: The class predicted by the game model, stored so that a round needs no inference.
+    - predicted_confidence: The model's confidence in the predicted class, in percent.
+    - model_version: The version of the model that made the stored prediction; predictions of
+      other versions are recomputed (see `game2/predictions.py`).
     """
 
     title = models.CharField(max_length=255, default="Untitled")
     image = models.ImageField(upload_to="game_images/")
     correct_label = models.CharField(max_length=50)
+    predicted_class = models.CharField(max_length=50, blank=True, null=True)
+    predicted_confidence = models.FloatField(blank=True, null=True)
+    model_version = models.CharField(max_length=16, blank=True, null=True, db_index=True)
 
     def __str__(self):
         """
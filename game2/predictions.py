@@ -0,0 +1,111 @@
+"""
+predictions.py
+--------------
+
+This module stores the game model's predictions on the `ImageForGame` rows, so that a game round is
+a database lookup instead of an inference. Every stored prediction records the version of the model
+that made it; when the model changes (`GAME_MODEL`, its weights, variant or backend), stale
+predictions are recomputed on first use or by `python manage.py predict_game_images`.
+
+Functions:
+----------
+
+- `current_model_version()`:
+    Returns the version of the configured game model.
+
+- `get_prediction(game_image)`:
+    Returns the stored prediction of an image, recomputing it if it is missing or stale.
+
+- `update_prediction(game_image)`:
+    Runs the game model on an image and stores its prediction.
+
+- `update_predictions(game_images)`:
+    Runs the game model on a batch of images in one call and stores their predictions; unreadable
+    images are skipped.
+"""
+
+from django.conf import settings
+
+from recognition.cache import model_version
+from recognition.pool import run_in_pool
+
+from .models import ImageForGame
+
+
+def current_model_version():
+    """
+    Returns the version of the configured game model (16 hexadecimal characters).
+    """
+    return model_version(getattr(settings, "GAME_MODEL", "cifar10_keras"))
+
+
+def update_predictions(game_images, version=None):
+    """
+    Runs the game model on a batch of images in one call and stores their predictions.
+
+    An image that cannot be read keeps its old prediction and does not stop the rest of the batch.
+
+    Args:
+        game_images (list[ImageForGame]): The images.
+        version (str): The current model version, if already known.
+
+    Returns:
+        list[tuple]: The predicted class name and the model's confidence in percent for every image,
+                     None for the images that could not be read.
+    """
+    from .inference import classify_paths
+
+    if not game_images:
+        return []
+
+    # Модель запускається у пулі процесів інференсу, не блокуючи інші запити
+    results = run_in_pool(classify_paths, [game_image.image.path for game_image in game_images])
+
+    version = version or current_model_version()
+    predicted = []
+    for game_image, result in zip(game_images, results):
+        if result is None:
+            continue
+        game_image.predicted_class, game_image.predicted_confidence = result
+        game_image.model_version = version
+        predicted.append(game_image)
+
+    # bulk_update() замість save(), щоб не викликати сигнали повторно
+    ImageForGame.objects.bulk_update(predicted, ["predicted_class", "predicted_confidence", "model_version"])
+    return results
+
+
+def update_prediction(game_image, version=None):
+    """
+    Runs the game model on an image and stores its prediction.
+
+    Args:
+        game_image (ImageForGame): The image.
+        version (str): The current model version, if already known.
+
+    Returns:
+        tuple: The predicted class name and the model's confidence in percent.
+
+    Raises:
+        ValueError: If the image cannot be read.
+    """
+    result = update_predictions([game_image], version)[0]
+    if result is None:
+        raise ValueError(f"Could not read the game image {game_image.image.name}.")
+    return result
+
+
+def get_prediction(game_image):
+    """
+    Returns the stored prediction of an image, recomputing it if it is missing or was made by another model version.
+
+    Args:
+        game_image (ImageForGame): The image.
+
+    Returns:
+        tuple: The predicted class name and the model's confidence in percent.
+    """
+    version = current_model_version()
+    if game_image.model_version == version and game_image.predicted_class is not None:
+        return game_image.predicted_class, game_image.predicted_confidence
+    return update_prediction(game_image, version)
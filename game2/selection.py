@@ -0,0 +1,86 @@
+"""
+selection.py
+------------
+
+This module picks the images of the game rounds without loading the image table. The ids of all game
+images are cached (Django cache, invalidated by signals when images are added or deleted), and every
+session draws its rounds from its own shuffled deck of ids, so images do not repeat within a game
+and starting a round costs one primary-key lookup.
+
+Functions:
+----------
+
+- `image_ids()`:
+    Returns the cached ids of all game images.
+
+- `invalidate_image_ids()`:
+    Drops the cached ids after images are added or deleted.
+
+- `next_image(session)`:
+    Returns the next image of the session's deck, dealing a new deck when it runs out.
+"""
+
+import random
+
+from django.core.cache import cache
+
+from .models import ImageForGame
+
+
+IMAGE_IDS_CACHE_KEY = "game2:image_ids"
+
+# Секунди, після яких список id перечитується (для кешів, що не спільні між процесами)
+IMAGE_IDS_TIMEOUT = 300
+
+# Кількість зображень в одній колоді сесії
+DECK_SIZE = 50
+
+
+def image_ids():
+    """
+    Returns the ids of all game images, from the cache if possible.
+    """
+    ids = cache.get(IMAGE_IDS_CACHE_KEY)
+    if ids is None:
+        ids = list(ImageForGame.objects.order_by("id").values_list("id", flat=True))
+        cache.set(IMAGE_IDS_CACHE_KEY, ids, IMAGE_IDS_TIMEOUT)
+    return ids
+
+
+def invalidate_image_ids():
+    """
+    Drops the cached ids of the game images.
+    """
+    cache.delete(IMAGE_IDS_CACHE_KEY)
+
+
+def next_image(session):
+    """
+    Returns the next image of the session's shuffled deck of image ids.
+
+    Args:
+        session (SessionBase): The session of the player.
+
+    Returns:
+        ImageForGame: The image, or None if there are no game images.
+    """
+    deck = session.get("image_deck") or []
+    for attempt in range(3):
+        while deck:
+            image = ImageForGame.objects.filter(id=deck.pop()).first()
+            if image is not None:
+                session["image_deck"] = deck
+                return image
+
+        if attempt:
+            # Нова колода складалась лише з видалених зображень: перечитуємо список id
+            invalidate_image_ids()
+
+        # Колода закінчилась: роздаємо нову
+        ids = image_ids()
+        if not ids:
+            break
+        deck = random.sample(ids, min(DECK_SIZE, len(ids)))
+
+    session["image_deck"] = []
+    return None
@@ -0,0 +1,55 @@
+"""
+signals.py
+----------
+
+Signal handlers that keep the stored model predictions of `ImageForGame` rows and the cached list of
+image ids up to date when images are added, replaced or deleted (e.g. in the admin).
+"""
+
+from django.db.models.signals import post_delete, post_save, pre_save
+from django.dispatch import receiver
+
+from .models import ImageForGame
+from .predictions import current_model_version, update_prediction
+from .selection import invalidate_image_ids
+
+
+@receiver(pre_save, sender=ImageForGame)
+def clear_replaced_prediction(sender, instance, raw=False, **kwargs):
+    """
+    Drops the stored prediction when the image file of an existing row is replaced.
+    """
+    if raw or instance.pk is None:
+        return
+    old_image = ImageForGame.objects.filter(pk=instance.pk).values_list("image", flat=True).first()
+    if old_image != instance.image.name:
+        instance.predicted_class = None
+        instance.predicted_confidence = None
+        instance.model_version = None
+
+
+@receiver(post_save, sender=ImageForGame)
+def predict_saved_image(sender, instance, created=False, raw=False, **kwargs):
+    """
+    Computes the prediction of a saved image if it has none or it was made by another model version.
+    """
+    if created:
+        invalidate_image_ids()
+    if raw or not instance.image:
+        return
+    version = current_model_version()
+    if instance.predicted_class is not None and instance.model_version == version:
+        return
+    try:
+        update_prediction(instance, version)
+    except Exception as e:
+        # Збереження не повинно падати через модель; прогноз буде обчислено під час гри
+        print(f"Could not predict the game image {instance.pk}: {e}")
+
+
+@receiver(post_delete, sender=ImageForGame)
+def forget_deleted_image(sender, instance, **kwargs):
+    """
+    Drops the cached list of image ids after an image is deleted.
+    """
+    invalidate_image_ids()
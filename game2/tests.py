@@ -1,3 +1,210 @@
-from django.test import TestCase
+import io
+import os
+import shutil
+import tempfile
+import unittest
+from importlib.util import find_spec
+from unittest import mock
 
-# Create your tests here.
+import numpy as np
+from django.conf import settings
+from django.core.cache import cache
+from django.core.files.base import ContentFile
+from django.core.files.storage import default_storage
+from django.core.management import call_command
+from django.core.management.base import CommandError
+from django.test import TestCase, override_settings
+from PIL import Image
+
+from game2 import inference, selection
+from game2.inference import CLASSES, classify_paths
+from game2.management.commands import check_game_model, predict_game_images
+from game2.models import ImageForGame
+from game2.predictions import update_prediction
+from game2.selection import next_image
+from recognition import artifacts
+
+# Кольори тестових зображень і класи, які їм "передбачають" моделі
+COLORS = {(255, 0, 0): "cat", (0, 255, 0): "dog", (0, 0, 255): "truck", (255, 255, 0): "ship"}
+
+# Помилки кандидата: колір -> клас, відмінний від правильного
+CANDIDATE_MISTAKES = {(0, 0, 255): "car"}
+
+
+def fake_probabilities(image, model_name=None):
+    """
+    Returns one-hot probabilities: the reference model is always right, the candidate is wrong on
+    the images listed in CANDIDATE_MISTAKES.
+    """
+    color = image.convert("RGB").getpixel((0, 0))
+    label = COLORS[color]
+    if model_name == "vgg16":
+        label = CANDIDATE_MISTAKES.get(color, label)
+    probabilities = np.zeros(len(CLASSES), dtype=np.float32)
+    probabilities[CLASSES.index(label)] = 1.0
+    return probabilities
+
+
+class GameImagesTestCase(TestCase):
+    """
+    Runs every test with an empty media directory and the models inline (no inference pool).
+    """
+
+    def setUp(self):
+        self.media_root = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.media_root, ignore_errors=True)
+        settings_override = override_settings(MEDIA_ROOT=self.media_root, INFERENCE_POOL_SIZE=0)
+        settings_override.enable()
+        self.addCleanup(settings_override.disable)
+
+    def add_images(self):
+        # bulk_create не надсилає сигналів, тож модель не запускається під час збереження
+        rows = []
+        for i, (color, label) in enumerate(COLORS.items()):
+            buf = io.BytesIO()
+            Image.new("RGB", (32, 32), color).save(buf, "PNG")
+            name = default_storage.save(f"game_images/test{i}.png", ContentFile(buf.getvalue()))
+            rows.append(ImageForGame(title=f"test{i}", image=name, correct_label=label))
+        ImageForGame.objects.bulk_create(rows)
+
+
+class CheckGameModelTests(GameImagesTestCase):
+
+    def run_check(self, **options):
+        out = io.StringIO()
+        with mock.patch.object(check_game_model, "predict_probabilities", side_effect=fake_probabilities):
+            call_command("check_game_model", stdout=out, **options)
+        return out.getvalue()
+
+    def test_reports_accuracy_and_agreement(self):
+        self.add_images()
+        output = self.run_check(max_drop=0.25)
+        self.assertIn("cifar10_keras: accuracy 1.0000 (4/4)", output)
+        self.assertIn("vgg16: accuracy 0.7500 (3/4)", output)
+        self.assertIn("agreement: 0.7500", output)
+
+    def test_accuracy_drop_above_the_limit_fails(self):
+        self.add_images()
+        with self.assertRaisesMessage(CommandError, "vgg16 is less accurate than cifar10_keras by 0.2500"):
+            self.run_check(max_drop=0.2)
+
+    def test_more_accurate_candidate_passes(self):
+        self.add_images()
+        output = self.run_check(reference="vgg16", candidate="cifar10_keras")
+        self.assertIn("cifar10_keras is at least as accurate as vgg16", output)
+
+    def test_unreadable_image_is_skipped(self):
+        self.add_images()
+        default_storage.delete(ImageForGame.objects.get(title="test2").image.name)
+        err = io.StringIO()
+        with mock.patch.object(check_game_model, "predict_probabilities", side_effect=fake_probabilities):
+            call_command("check_game_model", stdout=io.StringIO(), stderr=err)
+        self.assertIn("game_images/test2.png", err.getvalue())
+
+    def test_no_images_fails(self):
+        with self.assertRaisesMessage(CommandError, "There are no game images."):
+            self.run_check()
+
+
+def fake_predict_batch(images, model_name=None):
+    return np.stack([fake_probabilities(image) for image in images])
+
+
+class PredictGameImagesTests(GameImagesTestCase):
+    def test_unreadable_image_does_not_stop_the_backfill(self):
+        self.add_images()
+        default_storage.delete(ImageForGame.objects.get(title="test2").image.name)
+        out, err = io.StringIO(), io.StringIO()
+        with mock.patch.object(inference, "predict_batch", side_effect=fake_predict_batch), \
+                mock.patch.object(predict_game_images, "warm_up"), mock.patch("builtins.print"):
+            call_command("predict_game_images", stdout=out, stderr=err)
+
+        self.assertIn("3 predictions stored", out.getvalue())
+        self.assertIn("game_images/test2.png: could not be read, skipped", err.getvalue())
+        predicted = dict(ImageForGame.objects.values_list("title", "predicted_class"))
+        self.assertEqual(predicted, {"test0": "cat", "test1": "dog", "test2": None, "test3": "ship"})
+
+    def test_single_unreadable_image_raises(self):
+        self.add_images()
+        game_image = ImageForGame.objects.get(title="test0")
+        default_storage.delete(game_image.image.name)
+        with mock.patch.object(inference, "predict_batch", side_effect=fake_predict_batch), \
+                mock.patch("builtins.print"):
+            with self.assertRaisesMessage(ValueError, "Could not read the game image game_images/test0.png."):
+                update_prediction(game_image)
+
+
+class SessionDeckTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.addCleanup(cache.clear)
+        # bulk_create без сигналів: файли зображень для вибору не потрібні
+        ImageForGame.objects.bulk_create(
+            ImageForGame(title=f"img{i}", image=f"game_images/img{i}.jpg", correct_label="cat") for i in range(5)
+        )
+        self.ids = set(ImageForGame.objects.values_list("id", flat=True))
+        self.session = {}
+
+    def draw(self, count):
+        return [next_image(self.session).id for _ in range(count)]
+
+    def test_images_do_not_repeat_within_a_deck(self):
+        first = self.draw(5)
+        self.assertEqual(set(first), self.ids)
+        # Колода закінчилась: нова колода з тих самих зображень
+        self.assertEqual(set(self.draw(5)), self.ids)
+
+    def test_deck_size_is_capped(self):
+        with mock.patch.object(selection, "DECK_SIZE", 3):
+            self.assertEqual(len(set(self.draw(3))), 3)
+            self.assertEqual(len(self.session["image_deck"]), 0)
+            next_image(self.session)
+            self.assertEqual(len(self.session["image_deck"]), 2)
+
+    def test_round_costs_one_primary_key_lookup(self):
+        next_image(self.session)
+        with self.assertNumQueries(1):
+            next_image(self.session)
+
+    def test_deleted_images_are_skipped(self):
+        deck_top = self.draw(1)[0]
+        remaining = list(self.session["image_deck"])
+        deleted = remaining[-2:]  # наступні два зображення колоди
+        ImageForGame.objects.filter(id__in=deleted).delete()
+        self.assertEqual(self.draw(2), remaining[-3::-1])
+        self.assertNotIn(deck_top, remaining)
+
+    def test_stale_cached_ids_are_reloaded(self):
+        # Кеш id містить лише видалені рядки (наприклад, видалені в іншому процесі без спільного кешу)
+        cache.set(selection.IMAGE_IDS_CACHE_KEY, [10_000, 10_001])
+        self.assertIn(next_image(self.session).id, self.ids)
+
+    def test_no_images(self):
+        ImageForGame.objects.all().delete()
+        self.assertIsNone(next_image(self.session))
+        self.assertEqual(self.session["image_deck"], [])
+
+
+# Правильні класи зображень гри, що поставляються з репозиторієм (static/game_images/imgN.jpg)
+GAME_IMAGE_LABELS = [
+    "cat", "dog", "dog", "ship", "ship", "bird", "truck", "horse", "horse", "deer",
+    "horse", "frog", "plane", "frog", "car", "cat", "car", "car", "deer",
+]
+
+
+@unittest.skipUnless(find_spec("tensorflow"), "TensorFlow is not installed")
+class DefaultGameModelTests(TestCase):
+    def test_classifies_the_game_images(self):
+        # Справжня модель за замовчуванням (GAME_MODEL) зі сховища артефактів, без підміни прогнозів
+        store_root = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, store_root, ignore_errors=True)
+        paths = [
+            os.path.join(settings.BASE_DIR, "static", "game_images", f"img{i}.jpg")
+            for i in range(1, len(GAME_IMAGE_LABELS) + 1)
+        ]
+        with override_settings(MODEL_ARTIFACTS_DIR=store_root, INFERENCE_POOL_SIZE=0), \
+                mock.patch.object(artifacts, "_store", None):
+            results = classify_paths(paths)
+
+        correct = sum(predicted == label for (predicted, _), label in zip(results, GAME_IMAGE_LABELS))
+        self.assertGreaterEqual(correct / len(paths), 0.75)
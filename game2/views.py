@@ -10,24 +10,22 @@ Functions:
 ----------
 
 - `play_game(request)`:
-    Main function for the game. It handles random image selection, model prediction processing,
-    compares the results with the user's input, and updates the score.
+    Main function for the game. It handles random image selection, looks up the model's stored prediction
+    (see `predictions.py`), compares the results with the user's input, and updates the score.
     The function also determines the winner once either the user or the model reaches 7 points.
 
+- `predict_probabilities(image, model_name=None)`:
+    Returns the CIFAR-10 class probabilities of an image predicted by the game model (`GAME_MODEL`).
+
 - `reset_game(request)`:
     Resets the game by clearing the session data and redirects the user to the start of the game.
 
 Dependencies:
 -------------
-- `tensorflow.keras.models`: Used to load the pre-trained CIFAR-10 model for image classification.
-- `PIL.Image`: For loading and processing the images.
-- `numpy`: Used for handling image arrays and model predictions.
-
-Variables:
-----------
-
-- `CLASSES`: A list of class names corresponding to the CIFAR-10 dataset categories.
-- `model`: The pre-trained CIFAR-10 model loaded from a saved Keras model file.
+- `inference`: Runs the game model on batches of images. By default (`GAME_MODEL=cifar10_keras`) it is
+  the Keras model shipped with the game, served by TensorFlow or ONNX Runtime (see
+  `ONNX_RUNTIME_MODELS`); `GAME_MODEL=vgg16` selects the PyTorch VGG16 fine-tuned on CIFAR-10 that the
+  recognition app already uses, so that the web process runs a single ML runtime.
 
 Session Data:
 -------------
@@ -37,38 +35,37 @@ Session Data:
 """
 
 from django.utils.translation import gettext as _
-import os
-from django.contrib.auth.models import User
+from django.conf import settings
 from faceid.models import UserProfile
 
-# Вимкнення GPU
-os.environ["TF_ENABLE_ONEDNN_OPTS"] = "0"
-os.environ["CUDA_VISIBLE_DEVICES"] = "-1"
-
-from tensorflow.keras.models import load_model
-
 from django.shortcuts import render, redirect
 from .models import ImageForGame
-import random
-import numpy as np
-from PIL import Image
-
-# Завантаження попередньо навченого CIFAR-10 моделі
-model = load_model("game2/cifar10_model.keras")
-
-# Список класів CIFAR-10, що буде використовуватись для класифікації зображень
-CLASSES = [
-    "plane",
-    "car",
-    "bird",
-    "cat",
-    "deer",
-    "dog",
-    "frog",
-    "horse",
-    "ship",
-    "truck",
-]
+from .predictions import get_prediction
+from .selection import next_image
+from .inference import predict_batch
+
+
+def predict_probabilities(image, model_name=None):
+    """
+    Returns the CIFAR-10 class probabilities of an image predicted by the game model.
+
+    Args:
+        image (PIL.Image.Image): The image.
+        model_name (str): "vgg16" or "cifar10_keras" (default: the `GAME_MODEL` setting).
+
+    Returns:
+        numpy.ndarray: The probabilities of the classes in `inference.CLASSES` order.
+    """
+    return predict_batch([image], model_name)[0]
+
+
+def model_label():
+    """
+    Returns the name of the game model shown to the user.
+    """
+    if getattr(settings, "GAME_MODEL", "cifar10_keras") == "cifar10_keras":
+        return _("Модель cifar10.keras")
+    return _("Модель VGG16")
 
 
 def play_game(request):
@@ -86,7 +83,7 @@ def play_game(request):
 
     # Перевірка, чи хтось вже набрав 7 балів
     if request.session["user_score"] >= 7 or request.session["model_score"] >= 7:
-        winner = _("Користувач") if request.session["user_score"] >= 7 else _("Модель cifar10.keras")
+        winner = _("Користувач") if request.session["user_score"] >= 7 else model_label()
 
         # Якщо користувач виграв і він авторизований, оновлюємо кількість перемог у UserProfile
         if request.session["user_score"] >= 7 and request.user.is_authenticated:
@@ -97,30 +94,22 @@ def play_game(request):
         return render(request, "game2/game_over.html", {"winner": winner, "title": _("Гра завершена")})
 
     # Вибір випадкового зображення для гри, якщо ще не було вибрано
-    if "current_image_id" not in request.session:
-        images = ImageForGame.objects.all()  # Отримуємо всі зображення з бази даних
-        if not images.exists():
+    random_image = None
+    if "current_image_id" in request.session:
+        random_image = ImageForGame.objects.filter(id=request.session["current_image_id"]).first()
+    if random_image is None:
+        # Наступне зображення з перемішаної колоди сесії (без завантаження всієї таблиці)
+        random_image = next_image(request.session)
+        if random_image is None:
             return render(request, "game2/no_images.html")  # Якщо зображень немає
-        random_image = random.choice(images)
         request.session["current_image_id"] = random_image.id  # Зберігаємо ID зображення у сесії
-    else:
-        random_image = ImageForGame.objects.get(id=request.session["current_image_id"])
 
     # Обробка POST-запиту, коли користувач робить свій вибір
     if request.method == "POST":
         user_guess = request.POST.get("class_guess")  # Отримуємо вибір користувача
 
-        # Підготовка зображення для моделі (розмір, нормалізація тощо)
-        image_path = random_image.image.path
-        image = Image.open(image_path).resize((32, 32))  # Зміна розміру до 32x32
-        image = np.array(image) / 255.0  # Нормалізація зображення
-        image = np.expand_dims(image, axis=0)  # Додавання виміру для батчу
-
-        # Отримуємо прогноз моделі
-        prediction = model.predict(image)
-        predicted_class_index = np.argmax(prediction)
-        predicted_class = CLASSES[predicted_class_index]
-        confidence = np.max(prediction) * 100  # Відсоток впевненості моделі
+        # Прогноз моделі зберігається в базі даних; модель запускається лише для нових зображень або нової версії моделі
+        predicted_class, confidence = get_prediction(random_image)
 
         # Перевірка правильності вибору користувача та моделі
         user_is_correct = user_guess == random_image.correct_label
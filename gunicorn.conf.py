@@ -1,4 +1,11 @@
 # gunicorn.conf.py
+import gc
+import os
+
+# gevent патчимо до завантаження застосунку: з preload_app Django і моделі імпортуються ще в master-процесі
+from gevent import monkey
+
+monkey.patch_all()
 
 # Вкажіть кількість воркерів
 workers = 1
@@ -6,6 +13,10 @@ workers = 1
 # Вкажіть тип воркерів
 worker_class = 'gunicorn.workers.ggevent.GeventWorker'
 
+# Завантаження застосунку до fork(): моделі з RECOGNITION_PRELOAD_MODELS завантажуються один раз,
+# а воркери ділять ті самі сторінки пам'яті (copy-on-write, ваги відображені з диска через mmap)
+preload_app = os.environ.get('GUNICORN_PRELOAD_APP', 'True') == 'True'
+
 # Вкажіть хост і порт
 bind = '0.0.0.0:8001'
 
@@ -15,3 +26,17 @@ errorlog = '-'
 
 # Налаштування таймаутів
 timeout = 120
+
+
+def pre_fork(server, worker):
+    # Переносимо вже створені об'єкти в постійне покоління GC, щоб збирач сміття
+    # у воркерах не торкався їх і не копіював спільні сторінки
+    gc.freeze()
+
+
+def post_worker_init(worker):
+    # Пробний прогін моделі гри (GAME_WARM_UP) у кожному воркері після fork і завантаження застосунку,
+    # а не в master-процесі чи в командах manage.py
+    from game2.inference import warm_up_worker
+
+    warm_up_worker()
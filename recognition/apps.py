@@ -4,3 +4,9 @@ from django.apps import AppConfig
 class RecognitionConfig(AppConfig):
     default_auto_field = 'django.db.models.BigAutoField'
     name = 'recognition'
+
+    def ready(self):
+        # Registering the loaders is cheap; the models themselves are only built on first use.
+        # RECOGNITION_PRELOAD_MODELS are loaded by the web entry point (root/wsgi.py), not here,
+        # so that manage.py commands (migrate, fetch_models, ...) never build them
+        from . import loaders
@@ -0,0 +1,264 @@
+"""
+artifacts.py
+============
+
+This module implements a local, hash-verified store for the model artifacts (weights files) used by
+the application. The artifacts are described in `artifacts.json`, a manifest that maps each artifact
+name to its file name, its source (Google Drive, a URL or a file shipped with the repository) and its
+SHA-256 digest; artifacts without a full digest are refused unless MODEL_ALLOW_UNPINNED is enabled. `manage.py fetch_models` warms the store once; afterwards the models are loaded from
+disk only. With `MODEL_OFFLINE` enabled the store never touches the network and a missing artifact
+is reported as an error instead of being downloaded.
+"""
+import hashlib
+import json
+import os
+import shutil
+import threading
+import urllib.request
+
+from django.conf import settings
+
+
+MANIFEST_PATH = os.path.join(os.path.dirname(__file__), 'artifacts.json')
+
+
+def is_pinned(digest):
+    """
+    Returns True if a manifest digest is a full SHA-256 digest (64 hexadecimal characters).
+    """
+    return len(digest) == 64 and all(c in '0123456789abcdef' for c in digest.lower())
+
+
+def sha256sum(path, chunk_size=1024 * 1024):
+    """
+    Computes the SHA-256 digest of a file.
+
+    Args:
+        path (str): The path of the file.
+        chunk_size (int): The number of bytes read at a time.
+
+    Returns:
+        str: The hexadecimal digest.
+    """
+    digest = hashlib.sha256()
+    with open(path, 'rb') as f:
+        for chunk in iter(lambda: f.read(chunk_size), b''):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+
+class ArtifactStore:
+    """
+    Resolves artifact names from the manifest to verified files in the local store.
+
+    Attributes:
+    ----------
+    root : str
+        The directory the artifacts are stored in.
+    offline : bool
+        If True, artifacts are never downloaded.
+    allow_unpinned : bool
+        If True, artifacts without a full digest in the manifest are loaded (with a warning).
+    manifest : dict
+        The parsed manifest.
+    """
+
+    def __init__(self, root=None, offline=None, manifest_path=MANIFEST_PATH, allow_unpinned=None):
+        self.root = root or getattr(settings, 'MODEL_ARTIFACTS_DIR', os.path.join(settings.MEDIA_ROOT, 'models'))
+        self.offline = getattr(settings, 'MODEL_OFFLINE', False) if offline is None else offline
+        if allow_unpinned is None:
+            allow_unpinned = getattr(settings, 'MODEL_ALLOW_UNPINNED', False)
+        self.allow_unpinned = allow_unpinned
+        self.manifest_path = manifest_path
+        with open(manifest_path) as f:
+            self.manifest = json.load(f)
+        self._verified = {}
+        self._lock = threading.Lock()
+
+    def entry(self, name):
+        """
+        Returns the manifest entry of an artifact.
+
+        Raises:
+            KeyError: If the artifact is not listed in the manifest.
+        """
+        try:
+            return self.manifest[name]
+        except KeyError:
+            raise KeyError(f"The artifact '{name}' is not listed in {self.manifest_path}.")
+
+    def local_path(self, name):
+        """
+        Returns the path the artifact is stored at, whether or not it exists yet.
+        """
+        return os.path.join(self.root, self.entry(name)['filename'])
+
+    def path(self, name):
+        """
+        Returns the path of a verified artifact, fetching it first if it is missing and the store is online.
+
+        Args:
+            name (str): The artifact name from the manifest.
+
+        Returns:
+            str: The path of the artifact file.
+
+        Raises:
+            RuntimeError: If the artifact is missing in offline mode, cannot be fetched, or fails verification.
+        """
+        path = self.local_path(name)
+        if path in self._verified:
+            return path
+
+        with self._lock:
+            if not os.path.exists(path):
+                self.fetch(name)
+            self._verified[path] = self.verify(name)
+        return path
+
+    def digest(self, name):
+        """
+        Returns the SHA-256 digest of a verified artifact, fetching and verifying it first if needed.
+        """
+        return self._verified[self.path(name)]
+
+    def fetch(self, name, force=False):
+        """
+        Copies or downloads an artifact into the store.
+
+        Args:
+            name (str): The artifact name from the manifest.
+            force (bool): If True, the artifact is fetched even if it is already stored.
+
+        Returns:
+            str: The path of the artifact file.
+
+        Raises:
+            RuntimeError: If the store is offline and the artifact has to be downloaded, or the download fails.
+        """
+        entry = self.entry(name)
+        path = self.local_path(name)
+        if os.path.exists(path) and not force:
+            return path
+
+        os.makedirs(self.root, exist_ok=True)
+        tmp_path = path + '.part'
+        source = entry['source']
+
+        try:
+            if source == 'file':
+                shutil.copyfile(os.path.join(settings.BASE_DIR, entry['path']), tmp_path)
+            elif self.offline:
+                raise RuntimeError(
+                    f"The model artifact '{name}' is missing from {self.root} and MODEL_OFFLINE is enabled. "
+                    f"Run 'python manage.py fetch_models' on a machine with network access first."
+                )
+            elif source == 'gdrive':
+                import gdown
+
+                print(f"Downloading model to {path}...")
+                if gdown.download(id=entry['id'], output=tmp_path, quiet=False) is None:
+                    raise RuntimeError(f"Failed to download the model '{name}' from Google Drive.")
+            elif source == 'url':
+                print(f"Downloading model to {path}...")
+                urllib.request.urlretrieve(entry['url'], tmp_path)
+            else:
+                raise RuntimeError(f"Unknown source '{source}' for the model artifact '{name}'.")
+            os.replace(tmp_path, path)
+        finally:
+            if os.path.exists(tmp_path):
+                os.remove(tmp_path)
+
+        self._verified.pop(path, None)
+        return path
+
+    def verify(self, name):
+        """
+        Checks the stored artifact against the full SHA-256 digest in the manifest.
+
+        An artifact whose digest is missing or only a prefix (torchvision publishes its weights with
+        an 8-character prefix in the file name) is refused, unless MODEL_ALLOW_UNPINNED is enabled;
+        then a prefix is still checked. The full digests belong in the committed manifest; they are
+        never recorded on a deployment from whatever file it happened to download.
+
+        Returns:
+            str: The SHA-256 digest of the stored file.
+
+        Raises:
+            RuntimeError: If the digest does not match the manifest or is not pinned.
+        """
+        # An unpinned artifact is refused before hashing the file
+        self.check_pinned(name)
+        digest = sha256sum(self.local_path(name))
+        self.check_digest(name, digest)
+        return digest
+
+    def check_pinned(self, name):
+        """
+        Raises a RuntimeError if the manifest has no full digest of an artifact and MODEL_ALLOW_UNPINNED
+        is disabled.
+        """
+        if not is_pinned(self.entry(name).get('sha256', '')) and not self.allow_unpinned:
+            raise RuntimeError(
+                f"The model artifact '{name}' has no full SHA-256 digest in {self.manifest_path}. "
+                f"Update the repository to a version whose manifest pins it, "
+                f"or set MODEL_ALLOW_UNPINNED=True to load it unverified."
+            )
+
+    def check_digest(self, name, digest):
+        """
+        Checks a digest of the stored artifact, computed now or recorded earlier, against the manifest.
+
+        Raises:
+            RuntimeError: If the digest does not match the manifest or is not pinned.
+        """
+        self.check_pinned(name)
+        expected = self.entry(name).get('sha256', '')
+        if not digest.startswith(expected):
+            raise RuntimeError(
+                f"The model artifact {self.local_path(name)} does not match the manifest (expected {expected}, got {digest}). "
+                f"Delete it and run 'python manage.py fetch_models {name}'."
+            )
+        if not is_pinned(expected):
+            print(f"Warning: the model artifact '{name}' is loaded without a pinned SHA-256 digest.")
+
+    def pin(self, name):
+        """
+        Records the full digest of a stored artifact in the manifest file. This is a maintenance
+        step: the file has to come from the official source, and the manifest is then committed.
+
+        Returns:
+            str: The recorded SHA-256 digest.
+
+        Raises:
+            RuntimeError: If the manifest has no digest prefix to check the file against, or the
+                file does not match it.
+        """
+        digest = sha256sum(self.local_path(name))
+        expected = self.entry(name).get('sha256', '')
+        if not expected:
+            raise RuntimeError(
+                f"Refusing to pin '{name}': the manifest has no digest to check the file against. "
+                f"Compute its SHA-256 from a copy obtained from the owner of the artifact and add it by hand."
+            )
+        if not digest.startswith(expected):
+            raise RuntimeError(f"Refusing to pin '{name}': its digest {digest} does not match {expected}.")
+
+        self.manifest[name]['sha256'] = digest
+        with open(self.manifest_path, 'w') as f:
+            json.dump(self.manifest, f, indent=4)
+            f.write('\n')
+        return digest
+
+
+_store = None
+
+
+def get_store():
+    """
+    Returns the process-wide artifact store, configured from the Django settings.
+    """
+    global _store
+    if _store is None:
+        _store = ArtifactStore()
+    return _store
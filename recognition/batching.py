@@ -0,0 +1,234 @@
+"""
+batching.py
+===========
+
+This module implements dynamic micro-batching for the recognition models. Concurrent requests put
+their inputs into a per-model queue; a background thread (a greenlet under gunicorn's gevent worker)
+collects them into batches of up to `max_batch_size` items, waiting at most `max_wait_ms` for a batch
+to fill, runs a single forward pass and hands every caller its own result through a future.
+
+Batching is controlled by the RECOGNITION_BATCHING, RECOGNITION_BATCH_MAX_WAIT_MS,
+RECOGNITION_VGG16_BATCH_SIZE and RECOGNITION_DETECTOR_BATCH_SIZE settings. When it is disabled,
+`run_batched` runs the forward passes directly in the calling thread. A pool process serves one
+request at a time (see `pool.py`), so with INFERENCE_POOL_SIZE > 0 the batches are collected in the
+web worker instead: `run_inference` keeps the request there, and every batcher runs one dispatcher
+thread per pool process, each sending a whole batch to the pool as one forward pass.
+"""
+import os
+import queue
+import threading
+import time
+from concurrent.futures import Future
+
+import torch
+from django.conf import settings
+
+from .masks import MASK_THRESHOLD
+from .pool import in_pool_worker, run_in_pool, wait
+from .registry import registry
+
+
+def forward_stacked(model, inputs):
+    """
+    Runs a classification model on equally sized image tensors stacked into one batch.
+
+    Returns:
+        list[torch.Tensor]: The output row of every input.
+    """
+    with torch.no_grad():
+        return list(model(torch.stack(inputs)))
+
+
+def forward_list(model, inputs):
+    """
+    Runs a torchvision detection model, which accepts a list of differently sized image tensors.
+
+    Returns:
+        list[dict]: The predictions for every input.
+    """
+    with torch.no_grad():
+        return model(list(inputs))
+
+
+# How the inputs of each model are combined into a batch
+BATCH_FORWARD = {
+    'vgg16': forward_stacked,
+    'faster_rcnn': forward_list,
+    'mask_rcnn': forward_list,
+    'faster_rcnn_mobilenet': forward_list,
+    'ssdlite': forward_list,
+}
+
+
+def forward_batch(name, inputs):
+    """
+    Runs a registry model on one batch of inputs; module-level, so that it can run in the inference pool.
+    """
+    outputs = BATCH_FORWARD[name](registry.get(name), inputs)
+    if in_pool_worker():
+        # The masks are sent back to the web worker: binary masks are a quarter of the probabilities
+        for output in outputs:
+            if isinstance(output, dict) and 'masks' in output:
+                output['masks'] = output['masks'] > MASK_THRESHOLD
+    return outputs
+
+
+def max_batch_size(name):
+    """
+    Returns the maximum batch size configured for a model.
+    """
+    if BATCH_FORWARD.get(name) is forward_stacked:
+        return getattr(settings, 'RECOGNITION_VGG16_BATCH_SIZE', 16)
+    return getattr(settings, 'RECOGNITION_DETECTOR_BATCH_SIZE', 2)
+
+
+class MicroBatcher:
+    """
+    Collects single inputs from concurrent callers into batches for one model.
+
+    Attributes:
+    ----------
+    name : str
+        The registry name of the model.
+    max_batch_size : int
+        The maximum number of inputs in one forward pass.
+    max_wait : float
+        The maximum time in seconds the first input of a batch waits for more inputs.
+    dispatchers : int
+        The number of threads collecting and running batches; more than one when the batches run in
+        the inference pool, so that every pool process can run one.
+    """
+
+    def __init__(self, name, max_batch_size, max_wait_ms, dispatchers=1):
+        self.name = name
+        self.max_batch_size = max_batch_size
+        self.max_wait = max_wait_ms / 1000
+        self.dispatchers = dispatchers
+        self._queue = queue.Queue()
+        self._threads = None
+        self._pid = None
+        self._lock = threading.Lock()
+
+    def submit(self, item):
+        """
+        Queues an input for the next batch.
+
+        Args:
+            item: A single model input.
+
+        Returns:
+            concurrent.futures.Future: Resolves to the model output for this input.
+        """
+        self._ensure_running()
+        future = Future()
+        self._queue.put((item, future))
+        return future
+
+    def _ensure_running(self):
+        # The threads do not survive a fork, so gunicorn workers start their own
+        if self._threads is not None and self._pid == os.getpid():
+            return
+        with self._lock:
+            if self._threads is None or self._pid != os.getpid():
+                self._queue = queue.Queue()
+                self._pid = os.getpid()
+                self._threads = [
+                    threading.Thread(target=self._run, name=f"batcher-{self.name}-{i}", daemon=True)
+                    for i in range(self.dispatchers)
+                ]
+                for thread in self._threads:
+                    thread.start()
+
+    def _collect(self):
+        batch = [self._queue.get()]
+        deadline = time.monotonic() + self.max_wait
+        while len(batch) < self.max_batch_size:
+            remaining = deadline - time.monotonic()
+            if remaining <= 0:
+                break
+            try:
+                batch.append(self._queue.get(timeout=remaining))
+            except queue.Empty:
+                break
+        return batch
+
+    def _run(self):
+        while True:
+            # Skip the inputs whose callers have cancelled their futures meanwhile
+            batch = [(item, future) for item, future in self._collect() if future.set_running_or_notify_cancel()]
+            if not batch:
+                continue
+            try:
+                # In the inference pool if it is enabled, otherwise in this thread
+                outputs = run_in_pool(forward_batch, self.name, [item for item, future in batch])
+            except Exception as e:
+                for item, future in batch:
+                    future.set_exception(e)
+            else:
+                for (item, future), output in zip(batch, outputs):
+                    future.set_result(output)
+
+
+_batchers = {}
+_batchers_lock = threading.Lock()
+
+
+def get_batcher(name):
+    """
+    Returns the process-wide micro-batcher of a model, creating it on first use.
+    """
+    batcher = _batchers.get(name)
+    if batcher is None:
+        with _batchers_lock:
+            batcher = _batchers.get(name)
+            if batcher is None:
+                batcher = MicroBatcher(
+                    name, max_batch_size(name), getattr(settings, 'RECOGNITION_BATCH_MAX_WAIT_MS', 10),
+                    dispatchers=max(1, getattr(settings, 'INFERENCE_POOL_SIZE', 2)),
+                )
+                _batchers[name] = batcher
+    return batcher
+
+
+def run_batched(name, inputs):
+    """
+    Runs a registry model on a list of inputs.
+
+    With RECOGNITION_BATCHING enabled the inputs go through the model's micro-batcher and may share
+    forward passes with other requests; otherwise (and in the pool processes, which serve one request
+    at a time) they are processed here in chunks of the configured maximum batch size.
+
+    Args:
+        name (str): The registry name of the model.
+        inputs (list): The model inputs (image tensors).
+
+    Returns:
+        list: The model output for every input, in order.
+    """
+    if getattr(settings, 'RECOGNITION_BATCHING', False) and not in_pool_worker():
+        futures = [get_batcher(name).submit(item) for item in inputs]
+        return [wait(future) for future in futures]
+
+    forward = BATCH_FORWARD[name]
+    model = registry.get(name)
+    size = max_batch_size(name)
+    outputs = []
+    for start in range(0, len(inputs), size):
+        outputs.extend(forward(model, inputs[start:start + size]))
+    return outputs
+
+
+def run_inference(func, *args, **kwargs):
+    """
+    Runs a recognition function, e.g. `views.recognize`, without blocking the web worker on the models.
+
+    With RECOGNITION_BATCHING enabled the function runs here, so that its inputs meet those of concurrent
+    requests in the micro-batchers, which send the batched forward passes to the inference pool;
+    otherwise the whole function runs in the inference pool (see `pool.run_in_pool`).
+
+    Returns:
+        object: The return value of `func`.
+    """
+    if getattr(settings, 'RECOGNITION_BATCHING', False):
+        return func(*args, **kwargs)
+    return run_in_pool(func, *args, **kwargs)
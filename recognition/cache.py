@@ -0,0 +1,179 @@
+"""
+cache.py
+========
+
+This module implements the content-addressed cache of recognition results. Results are keyed on
+the SHA-256 of the uploaded file, the recognition type, the confidence threshold and the version of
+the models, so re-uploading the same image reuses the stored result text, the stored upload and the
+annotated image file instead of running the models again.
+
+The cache has two layers: a bounded in-memory LRU per process (RECOGNITION_RESULT_CACHE_SIZE
+entries) and the UploadedImage table itself, whose `image_hash` column is indexed.
+"""
+import hashlib
+import threading
+from collections import OrderedDict
+
+from django.conf import settings
+
+from .artifacts import get_store
+from .loaders import MODEL_ARTIFACTS
+from .models import UploadedImage
+
+
+# Bump when a change to the pre-processing or rendering changes the results of the same models
+PIPELINE_VERSION = 5
+
+
+def content_hash(file):
+    """
+    Computes the SHA-256 digest of an uploaded file.
+
+    Args:
+        file (django.core.files.File): The uploaded file.
+
+    Returns:
+        str: The hexadecimal digest.
+    """
+    digest = hashlib.sha256()
+    for chunk in file.chunks():
+        digest.update(chunk)
+    file.seek(0)
+    return digest.hexdigest()
+
+
+def model_version(recognition_type):
+    """
+    Returns a short identifier of the models and pipeline that produce a recognition type's results.
+
+    Args:
+        recognition_type (str): The recognition type.
+
+    Returns:
+        str: A 16-character hexadecimal version string.
+    """
+    store = get_store()
+    digest = hashlib.sha256(f"{recognition_type}:{PIPELINE_VERSION}".encode())
+    digest.update(f":{getattr(settings, 'RECOGNITION_MAX_IMAGE_SIDE', 1000)}".encode())
+    # Every recognition type classifies with VGG16, whose variants and preprocessing change the scores
+    digest.update(f":{getattr(settings, 'RECOGNITION_VGG16_VARIANT', 'fp32')}".encode())
+    digest.update(f":{getattr(settings, 'RECOGNITION_VGG16_PREPROCESS', 'legacy')}".encode())
+    digest.update(f":{','.join(sorted(getattr(settings, 'ONNX_RUNTIME_MODELS', [])))}".encode())
+    if recognition_type != 'vgg16':
+        # The inference resolution and tiling change what the detectors find
+        digest.update(":{}:{}:{}:{}".format(
+            getattr(settings, 'RECOGNITION_DETECTOR_MAX_SIDE', 800),
+            getattr(settings, 'RECOGNITION_DETECTOR_TILING', False),
+            getattr(settings, 'RECOGNITION_TILE_SIZE', 800),
+            getattr(settings, 'RECOGNITION_TILE_OVERLAP', 128),
+        ).encode())
+    for name in MODEL_ARTIFACTS.get(recognition_type, ()):
+        entry = store.entry(name)
+        digest.update(f":{entry['filename']}:{entry.get('sha256', '')}".encode())
+    return digest.hexdigest()[:16]
+
+
+def cache_key(image_hash, recognition_type, confidence_threshold, version):
+    """
+    Builds the cache key of a recognition. The threshold does not apply to whole-image classification.
+    """
+    if recognition_type == 'vgg16':
+        confidence_threshold = None
+    else:
+        confidence_threshold = round(confidence_threshold, 4)
+    return image_hash, recognition_type, confidence_threshold, version
+
+
+class LRUCache:
+    """
+    A thread-safe, bounded mapping that evicts the least recently used entries.
+    """
+
+    def __init__(self, max_size):
+        self.max_size = max_size
+        self._data = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key):
+        with self._lock:
+            value = self._data.get(key)
+            if value is not None:
+                self._data.move_to_end(key)
+            return value
+
+    def put(self, key, value):
+        if self.max_size <= 0:
+            return
+        with self._lock:
+            self._data[key] = value
+            self._data.move_to_end(key)
+            while len(self._data) > self.max_size:
+                self._data.popitem(last=False)
+
+
+_memory = LRUCache(getattr(settings, 'RECOGNITION_RESULT_CACHE_SIZE', 256))
+
+
+def lookup(image_hash, recognition_type, confidence_threshold, version):
+    """
+    Looks up a finished recognition of the same image with the same parameters.
+
+    Args:
+        image_hash (str): The SHA-256 of the uploaded file.
+        recognition_type (str): The recognition type.
+        confidence_threshold (float): The confidence threshold.
+        version (str): The model version, see `model_version`.
+
+    Returns:
+        dict: The `result`, `image` and `annotated_image` (file names) of the cached recognition, or None.
+    """
+    key = cache_key(image_hash, recognition_type, confidence_threshold, version)
+    cached = _memory.get(key)
+    if cached is not None:
+        return cached
+
+    matches = UploadedImage.objects.filter(
+        image_hash=image_hash,
+        recognition_type=recognition_type,
+        model_version=version,
+        status=UploadedImage.STATUS_DONE,
+    )
+    if key[2] is not None:
+        matches = matches.filter(confidence_threshold=key[2])
+    match = matches.exclude(result=None).order_by('-id').only('result', 'image', 'annotated_image').first()
+    if match is None:
+        return None
+
+    cached = {'result': match.result, 'image': match.image.name, 'annotated_image': match.annotated_image.name or None}
+    _memory.put(key, cached)
+    return cached
+
+
+def remember(uploaded_image):
+    """
+    Adds a finished recognition to the in-memory layer of the cache.
+
+    Args:
+        uploaded_image (UploadedImage): A recognition with `image_hash` and `model_version` set.
+    """
+    if not uploaded_image.image_hash or uploaded_image.status != UploadedImage.STATUS_DONE:
+        return
+    key = cache_key(
+        uploaded_image.image_hash, uploaded_image.recognition_type,
+        uploaded_image.confidence_threshold, uploaded_image.model_version,
+    )
+    _memory.put(key, {
+        'result': uploaded_image.result,
+        'image': uploaded_image.image.name,
+        'annotated_image': uploaded_image.annotated_image.name or None,
+    })
+
+
+def apply(uploaded_image, cached):
+    """
+    Fills an unsaved UploadedImage from a cache entry, reusing the stored files instead of writing new ones.
+    """
+    uploaded_image.result = cached['result']
+    uploaded_image.image = cached['image']
+    uploaded_image.annotated_image = cached['annotated_image']
+    uploaded_image.status = UploadedImage.STATUS_DONE
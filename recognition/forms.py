@@ -8,6 +8,8 @@ class UploadImageForm(forms.ModelForm):
             ('vgg16', 'Custom VGG16 (Full Image)'),
             ('faster_rcnn', 'Faster R-CNN + Custom VGG16 (Segmented)'),
             ('mask_rcnn', 'Mask R-CNN + Custom VGG16 (Segmented)'),
+            ('faster_rcnn_mobilenet', 'Faster R-CNN MobileNetV3 + Custom VGG16 (Segmented, fast)'),
+            ('ssdlite', 'SSDlite + Custom VGG16 (Segmented, fastest)'),
         ],
         initial='vgg16',
         widget=forms.Select(attrs={'class': 'form-control'})
@@ -21,3 +23,8 @@ class UploadImageForm(forms.ModelForm):
         widgets = {
             'image': forms.ClearableFileInput(attrs={'class': 'form-control'}),
         }
+
+
+class ThresholdForm(forms.Form):
+    confidence_threshold = forms.FloatField(min_value=0.1, max_value=1.0, initial=0.5,
+                                            widget=forms.NumberInput(attrs={'step': '0.05', 'class': 'form-control'}))
@@ -0,0 +1,179 @@
+"""
+jobs.py
+=======
+
+This module implements the database-backed queue of recognition jobs used in the asynchronous mode
+(RECOGNITION_ASYNC). The queue needs no outside broker: a job is an UploadedImage row with the
+'pending' status. Workers (`manage.py recognition_worker`) claim jobs with a conditional UPDATE, so
+several workers can poll the same table without processing a job twice. While a job runs, its worker
+touches it every third of RECOGNITION_JOB_TIMEOUT; a job whose worker died stops being touched and is
+requeued after RECOGNITION_JOB_TIMEOUT seconds, and marked as failed once it has been claimed
+RECOGNITION_JOB_MAX_ATTEMPTS times, so that an image that crashes every worker is not retried forever.
+The claim count is also the token of a run: a worker only stores the result of the run it claimed.
+"""
+import threading
+import time
+from contextlib import contextmanager
+from datetime import timedelta
+
+from django.conf import settings
+from django.db import close_old_connections, connection
+from django.db.models import F
+from django.utils import timezone
+from PIL import Image
+
+from . import cache as result_cache
+from .models import UploadedImage
+
+
+def claim_next_job():
+    """
+    Marks the oldest pending job as processing, counts the attempt and returns it.
+
+    Returns:
+        UploadedImage: The claimed job, or None if the queue is empty.
+    """
+    pending = UploadedImage.objects.filter(status=UploadedImage.STATUS_PENDING).order_by('id')
+    for job_id in pending.values_list('id', flat=True)[:10]:
+        # Only one worker can win the transition from pending to processing
+        claimed = UploadedImage.objects.filter(id=job_id, status=UploadedImage.STATUS_PENDING).update(
+            status=UploadedImage.STATUS_PROCESSING, updated_at=timezone.now(), attempts=F('attempts') + 1
+        )
+        if claimed:
+            return UploadedImage.objects.get(id=job_id)
+    return None
+
+
+def requeue_stalled_jobs(timeout=None, max_attempts=None):
+    """
+    Puts jobs that have been processing for too long (e.g. their worker died) back into the queue,
+    or marks them as failed if they have already been claimed `max_attempts` times.
+
+    Args:
+        timeout (int): Seconds after which a processing job is considered stalled.
+        max_attempts (int): The number of claims after which a stalled job fails.
+
+    Returns:
+        int: The number of requeued jobs.
+    """
+    if timeout is None:
+        timeout = getattr(settings, 'RECOGNITION_JOB_TIMEOUT', 600)
+    if max_attempts is None:
+        max_attempts = getattr(settings, 'RECOGNITION_JOB_MAX_ATTEMPTS', 3)
+    stalled = UploadedImage.objects.filter(
+        status=UploadedImage.STATUS_PROCESSING,
+        updated_at__lt=timezone.now() - timedelta(seconds=timeout),
+    )
+    # An image that crashes every worker is not put back into the queue forever
+    stalled.filter(attempts__gte=max_attempts).update(
+        status=UploadedImage.STATUS_FAILED,
+        error=f"The recognition was interrupted {max_attempts} times (e.g. the worker crashed or ran out of memory).",
+        updated_at=timezone.now(),
+    )
+    return stalled.filter(attempts__lt=max_attempts).update(
+        status=UploadedImage.STATUS_PENDING, updated_at=timezone.now()
+    )
+
+
+def current_run(uploaded_image):
+    """
+    Returns a queryset of the job that matches only while the run claimed as `uploaded_image` owns it,
+    i.e. the job has not been requeued (and possibly claimed again) in the meantime.
+    """
+    return UploadedImage.objects.filter(
+        id=uploaded_image.id, status=UploadedImage.STATUS_PROCESSING, attempts=uploaded_image.attempts
+    )
+
+
+@contextmanager
+def heartbeat(uploaded_image, interval=None):
+    """
+    Touches a running job from a background thread, so that it is not requeued as stalled while it runs.
+
+    Args:
+        uploaded_image (UploadedImage): The claimed job.
+        interval (float): Seconds between the touches; a third of RECOGNITION_JOB_TIMEOUT by default.
+    """
+    if interval is None:
+        interval = getattr(settings, 'RECOGNITION_JOB_TIMEOUT', 600) / 3
+    stop = threading.Event()
+
+    def beat():
+        try:
+            while not stop.wait(interval):
+                current_run(uploaded_image).update(updated_at=timezone.now())
+        finally:
+            # The thread has its own database connection
+            connection.close()
+
+    thread = threading.Thread(target=beat, name=f'recognition-job-{uploaded_image.id}', daemon=True)
+    thread.start()
+    try:
+        yield
+    finally:
+        stop.set()
+        thread.join()
+
+
+def process_job(uploaded_image):
+    """
+    Runs the recognition of a claimed job and stores its result or error.
+
+    Args:
+        uploaded_image (UploadedImage): The job to process.
+    """
+    from .tiling import tiling_enabled
+    from .views import prepare_image, recognize
+
+    try:
+        with heartbeat(uploaded_image), uploaded_image.image.open('rb') as f:
+            source = Image.open(f)
+            img = prepare_image(source)
+            result, annotated_image, detections = recognize(img, uploaded_image.recognition_type, uploaded_image.confidence_threshold,
+                                                            source if tiling_enabled() else None)
+
+        uploaded_image.result = result
+        uploaded_image.detections = detections
+        if annotated_image:
+            uploaded_image.annotated_image.save(annotated_image.name, annotated_image, save=False)
+        uploaded_image.status = UploadedImage.STATUS_DONE
+        uploaded_image.error = None
+    except Exception as e:
+        uploaded_image.status = UploadedImage.STATUS_FAILED
+        uploaded_image.error = str(e)
+
+    # A run that was requeued in the meantime does not overwrite the job of the run that replaced it
+    stored = current_run(uploaded_image).update(
+        status=uploaded_image.status,
+        error=uploaded_image.error,
+        result=uploaded_image.result,
+        detections=uploaded_image.detections,
+        annotated_image=uploaded_image.annotated_image.name,
+        updated_at=timezone.now(),
+    )
+    if not stored:
+        print(f"Recognition job {uploaded_image.id} was requeued during attempt {uploaded_image.attempts}; its result is discarded.")
+        return
+    result_cache.remember(uploaded_image)
+
+
+def run_worker(poll_interval=1.0, once=False):
+    """
+    Processes queued jobs until interrupted.
+
+    Args:
+        poll_interval (float): Seconds to sleep when the queue is empty.
+        once (bool): If True, return as soon as the queue is empty.
+    """
+    while True:
+        close_old_connections()
+        requeue_stalled_jobs()
+
+        job = claim_next_job()
+        if job is None:
+            if once:
+                return
+            time.sleep(poll_interval)
+            continue
+
+        process_job(job)
@@ -0,0 +1,315 @@
+"""
+loaders.py
+==========
+
+This module registers the loader functions of the recognition models (VGG16 fine-tuned on CIFAR-10,
+the R-CNN and MobileNet detectors) and of the game's Keras CIFAR-10 model in the process-wide model
+registry. Nothing is loaded at import time; each model is built the first time it is requested through
+`registry.get`. The architectures come straight from `torchvision.models` and the weights from the
+local artifact store (see `artifacts.py`), so loading a model never goes through torch.hub.
+Models listed in ONNX_RUNTIME_MODELS are served by ONNX Runtime instead (see `onnx_backend.py`).
+"""
+import json
+import os
+import tempfile
+
+import numpy as np
+import torch
+from django.conf import settings
+from torchvision import models
+
+from .artifacts import get_store, sha256sum
+from .registry import registry
+from .onnx_backend import OnnxClassifier, OnnxDetector, uses_onnx
+from .variants import VGG16_ARTIFACT, load_variant
+
+
+# The artifacts whose weights determine the results of each recognition type (and of the game models)
+MODEL_ARTIFACTS = {
+    'vgg16': ['vgg16_cifar10'],
+    'faster_rcnn': ['fasterrcnn_resnet50_fpn_coco', 'vgg16_cifar10'],
+    'mask_rcnn': ['maskrcnn_resnet50_fpn_coco', 'vgg16_cifar10'],
+    'faster_rcnn_mobilenet': ['fasterrcnn_mobilenet_v3_large_fpn_coco', 'vgg16_cifar10'],
+    'ssdlite': ['ssdlite320_mobilenet_v3_large_coco', 'vgg16_cifar10'],
+    'cifar10_keras': ['cifar10_keras'],
+}
+
+
+def _file_state(path):
+    """
+    Returns the size and modification time of a file, or None if it does not exist.
+    """
+    try:
+        stat = os.stat(path)
+    except FileNotFoundError:
+        return None
+    return [stat.st_size, stat.st_mtime_ns]
+
+
+def mmap_path(artifact_name):
+    """
+    Returns the path of an mmap-friendly copy of an artifact, creating it on first use.
+
+    `torch.load(mmap=True)` only works with the zipfile serialization format, which older checkpoints
+    (including the torchvision detection weights) do not use, so the verified artifact is re-saved
+    once next to the original. The artifact is hashed only then: a `.json` file next to the copy
+    records the digests, sizes and modification times of both files, and later loads trust the copy
+    as long as neither file has changed (and the recorded digest still satisfies the manifest).
+    Otherwise the copy is re-created from the re-verified artifact.
+
+    Args:
+        artifact_name (str): The artifact name from the manifest.
+
+    Returns:
+        str: The path of the re-saved state dict.
+    """
+    store = get_store()
+    path = store.local_path(artifact_name)
+    target = os.path.splitext(path)[0] + '.mmap.pt'
+    record_path = target + '.json'
+
+    try:
+        with open(record_path) as f:
+            record = json.load(f)
+    except (OSError, ValueError):
+        record = None
+    if record is not None:
+        if record.get('copy') == _file_state(target) and record.get('source') == _file_state(path):
+            store.check_digest(artifact_name, record['source_sha256'])
+            return target
+        print(f"The memory-mapped copy {target} does not match its artifact, re-creating it.")
+
+    path = store.path(artifact_name)
+    source_digest = store.digest(artifact_name)
+
+    # Several processes may create the copy at once (workers after fork, pool processes), so each
+    # writes its own temporary files and publishes them with an atomic rename
+    directory = os.path.dirname(target)
+    fd, tmp_path = tempfile.mkstemp(dir=directory, suffix='.part')
+    os.close(fd)
+    tmp_record_path = None
+    try:
+        state_dict = torch.load(path, map_location=torch.device('cpu'), weights_only=True)
+        torch.save({key: value.contiguous() for key, value in state_dict.items()}, tmp_path)
+        # mkstemp creates the files readable by the owner only
+        os.chmod(tmp_path, 0o644)
+        fd, tmp_record_path = tempfile.mkstemp(dir=directory, suffix='.part')
+        with os.fdopen(fd, 'w') as f:
+            # A rename keeps the modification time, so the state of the temporary file is recorded
+            json.dump({
+                'sha256': sha256sum(tmp_path),
+                'copy': _file_state(tmp_path),
+                'source_sha256': source_digest,
+                'source': _file_state(path),
+            }, f)
+        os.chmod(tmp_record_path, 0o644)
+        os.replace(tmp_path, target)
+        os.replace(tmp_record_path, record_path)
+    finally:
+        for leftover in (tmp_path, tmp_record_path):
+            if leftover and os.path.exists(leftover):
+                os.remove(leftover)
+    return target
+
+
+def load_state_dict(artifact_name):
+    """
+    Loads a state dict from a verified file in the artifact store.
+
+    With `MODEL_MMAP_WEIGHTS` enabled the tensors are memory-mapped from disk rather than read into
+    private memory, so every worker process maps the same page-cache pages.
+
+    Args:
+        artifact_name (str): The artifact name from the manifest.
+
+    Returns:
+        dict: The state dict, with all tensors on the CPU.
+
+    Raises:
+        RuntimeError: If the artifact is missing, fails verification or cannot be loaded.
+    """
+    use_mmap = getattr(settings, 'MODEL_MMAP_WEIGHTS', True)
+    path = mmap_path(artifact_name) if use_mmap else get_store().path(artifact_name)
+    try:
+        return torch.load(path, map_location=torch.device('cpu'), weights_only=True, mmap=use_mmap)
+    except Exception as e:
+        raise RuntimeError(f"Failed to load the model from the file {path}. Error: {e}")
+
+
+def load_weights(model, artifact_name):
+    """
+    Loads the weights of an artifact into a model and switches it to evaluation mode.
+
+    The tensors are assigned rather than copied into the freshly initialised parameters, which keeps
+    memory-mapped weights shared and avoids touching the torch thread pool before gunicorn forks.
+
+    Args:
+        model (torch.nn.Module): The model to load the weights into.
+        artifact_name (str): The artifact name from the manifest.
+
+    Returns:
+        torch.nn.Module: The same model, in evaluation mode and without gradients.
+    """
+    model.load_state_dict(load_state_dict(artifact_name), assign=True)
+    model.requires_grad_(False)
+    model.eval()
+    return model
+
+
+def build_vgg16():
+    """
+    Builds VGG16 with a 10-class head and loads the CIFAR-10 fine-tuned weights.
+
+    Returns:
+        torch.nn.Module: The fp32 VGG16 model in evaluation mode.
+    """
+    # Build VGG16 without pretraining and replace the head with a 10-class one
+    vgg16 = models.vgg16(weights=None)
+    vgg16.classifier[6] = torch.nn.Linear(vgg16.classifier[6].in_features, 10)
+    return load_weights(vgg16, VGG16_ARTIFACT)
+
+
+@registry.loader('vgg16')
+def load_vgg16():
+    """
+    Loads the VGG16 variant selected by RECOGNITION_VGG16_VARIANT (see `variants.py`), or the ONNX
+    Runtime session if VGG16 is listed in ONNX_RUNTIME_MODELS.
+
+    Returns:
+        torch.nn.Module: The VGG16 model in evaluation mode.
+    """
+    if uses_onnx('vgg16'):
+        return OnnxClassifier('vgg16')
+    variant = getattr(settings, 'RECOGNITION_VGG16_VARIANT', 'fp32')
+    if variant == 'fp32':
+        return build_vgg16()
+    return load_variant(variant)
+
+
+def detector_options():
+    """
+    Returns the keyword arguments that set the inference resolution of the R-CNN detectors.
+
+    The detectors resize every input internally so that its longer side is RECOGNITION_DETECTOR_MAX_SIDE
+    pixels and map the boxes and masks back to the coordinates of the input. 0 keeps torchvision's
+    default (shorter side 800, longer side at most 1333).
+    """
+    max_side = getattr(settings, 'RECOGNITION_DETECTOR_MAX_SIDE', 800)
+    if not max_side:
+        return {}
+    return {'min_size': max_side, 'max_size': max_side}
+
+
+def build_faster_rcnn():
+    """
+    Builds Faster R-CNN (ResNet50-FPN) with pre-trained COCO_V1 weights.
+
+    Returns:
+        torch.nn.Module: The detector in evaluation mode.
+    """
+    # Built without weights enums so torchvision does not download anything; in evaluation mode the
+    # plain BatchNorm layers used then compute the same as the frozen ones of the pre-trained builder
+    faster_rcnn = models.detection.fasterrcnn_resnet50_fpn(weights=None, weights_backbone=None, **detector_options())
+    return load_weights(faster_rcnn, 'fasterrcnn_resnet50_fpn_coco')
+
+
+@registry.loader('faster_rcnn')
+def load_faster_rcnn():
+    """
+    Loads Faster R-CNN (ResNet50-FPN), on ONNX Runtime if it is listed in ONNX_RUNTIME_MODELS.
+
+    Returns:
+        torch.nn.Module: The detector in evaluation mode.
+    """
+    if uses_onnx('faster_rcnn'):
+        return OnnxDetector('faster_rcnn')
+    return build_faster_rcnn()
+
+
+@registry.loader('mask_rcnn')
+def load_mask_rcnn():
+    """
+    Builds Mask R-CNN (ResNet50-FPN) with pre-trained COCO_V1 weights.
+
+    Returns:
+        torch.nn.Module: The detector in evaluation mode.
+    """
+    mask_rcnn = models.detection.maskrcnn_resnet50_fpn(weights=None, weights_backbone=None, **detector_options())
+    return load_weights(mask_rcnn, 'maskrcnn_resnet50_fpn_coco')
+
+
+@registry.loader('faster_rcnn_mobilenet')
+def load_faster_rcnn_mobilenet():
+    """
+    Builds Faster R-CNN (MobileNetV3-Large FPN) with pre-trained COCO_V1 weights, a much faster detector on CPU.
+
+    Returns:
+        torch.nn.Module: The detector in evaluation mode.
+    """
+    faster_rcnn = models.detection.fasterrcnn_mobilenet_v3_large_fpn(weights=None, weights_backbone=None, **detector_options())
+    return load_weights(faster_rcnn, 'fasterrcnn_mobilenet_v3_large_fpn_coco')
+
+
+@registry.loader('ssdlite')
+def load_ssdlite():
+    """
+    Builds SSDlite (MobileNetV3-Large) with pre-trained COCO_V1 weights, the fastest detector on CPU.
+
+    Returns:
+        torch.nn.Module: The detector in evaluation mode.
+    """
+    # SSDlite always runs at 320x320, so RECOGNITION_DETECTOR_MAX_SIDE does not apply
+    ssdlite = models.detection.ssdlite320_mobilenet_v3_large(weights=None, weights_backbone=None)
+    return load_weights(ssdlite, 'ssdlite320_mobilenet_v3_large_coco')
+
+
+def build_cifar10_keras():
+    """
+    Loads the Keras CIFAR-10 model of the game with TensorFlow, which is only imported here.
+
+    Returns:
+        keras.Model: The model.
+    """
+    # Run TensorFlow on the CPU only
+    os.environ.setdefault("TF_ENABLE_ONEDNN_OPTS", "0")
+    os.environ.setdefault("CUDA_VISIBLE_DEVICES", "-1")
+    try:
+        from tensorflow.keras.models import load_model
+    except ImportError:
+        raise RuntimeError("The Keras CIFAR-10 model requires TensorFlow; install it or serve the model with ONNX Runtime.")
+
+    return load_model(get_store().path('cifar10_keras'))
+
+
+class KerasClassifier:
+    """
+    Serves a Keras classifier through a direct call traced once with `tf.function`.
+
+    `model.predict` builds a data adapter and a new execution function on every call, which costs far
+    more than the forward pass of a small batch; the traced call accepts batches of any size without
+    retracing. `predict(batch)` keeps the Keras calling convention and returns a NumPy array.
+    """
+
+    def __init__(self, model):
+        import tensorflow as tf
+
+        self.model = model
+        spec = tf.TensorSpec((None, *model.input_shape[1:]), tf.float32)
+        self._call = tf.function(lambda batch: model(batch, training=False), input_signature=[spec])
+
+    def predict(self, batch):
+        return self._call(np.asarray(batch, dtype=np.float32)).numpy()
+
+
+@registry.loader('cifar10_keras')
+def load_cifar10_keras():
+    """
+    Loads the CIFAR-10 model of the game (32x32 RGB inputs in [0, 1], NHWC), on ONNX Runtime if it is
+    listed in ONNX_RUNTIME_MODELS. Both backends provide Keras' `predict(batch)`.
+
+    Returns:
+        The model.
+    """
+    if uses_onnx('cifar10_keras'):
+        return OnnxClassifier('cifar10_keras')
+    return KerasClassifier(build_cifar10_keras())
@@ -0,0 +1,46 @@
+"""
+_cifar10.py
+===========
+
+Helpers shared by the management commands that check VGG16 on the CIFAR-10 test set.
+"""
+import os
+
+import torch
+from django.conf import settings
+from django.core.management.base import CommandError
+
+
+def add_cifar10_arguments(parser, samples=1000):
+    """
+    Adds the options that select the CIFAR-10 sample to a command's parser.
+    """
+    parser.add_argument('--data', help="Directory of the CIFAR-10 dataset (default: <MODEL_ARTIFACTS_DIR>/cifar10).")
+    parser.add_argument('--download', action='store_true', help="Download CIFAR-10 if it is missing.")
+    parser.add_argument('--samples', type=int, default=samples, help="Number of test images used.")
+
+
+def load_cifar10_sample(options):
+    """
+    Loads a fixed random sample of the CIFAR-10 test set.
+
+    Args:
+        options (dict): The command options added by `add_cifar10_arguments`.
+
+    Returns:
+        list[tuple]: (PIL.Image.Image, label) pairs.
+
+    Raises:
+        CommandError: If the dataset is missing.
+    """
+    from torchvision.datasets import CIFAR10
+
+    root = options['data'] or os.path.join(settings.MODEL_ARTIFACTS_DIR, 'cifar10')
+    try:
+        dataset = CIFAR10(root, train=False, download=options['download'])
+    except RuntimeError as e:
+        raise CommandError(f"{e} Pass --download or --data DIR.")
+
+    generator = torch.Generator().manual_seed(0)
+    indices = torch.randperm(len(dataset), generator=generator)[:options['samples']].tolist()
+    return [dataset[i] for i in indices]
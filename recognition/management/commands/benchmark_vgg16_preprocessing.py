@@ -0,0 +1,91 @@
+"""
+benchmark_vgg16_preprocessing.py
+================================
+
+Management command that compares the 'legacy' and 'direct' VGG16 preprocessing pipelines (see
+`recognition/preprocessing.py`): the accuracy and latency of whole-image classification on a sample
+of the CIFAR-10 test set, and the latency of preparing the crops of a detection request.
+
+Usage:
+    python manage.py benchmark_vgg16_preprocessing [--data DIR] [--download] [--samples N]
+                                                   [--image PATH] [--boxes N] [--repeat N]
+"""
+import time
+
+import torch
+from django.core.management.base import BaseCommand
+from PIL import Image
+
+from recognition.preprocessing import classifier_inputs, crop_inputs, image_tensor
+from recognition.registry import registry
+
+from ._cifar10 import add_cifar10_arguments, load_cifar10_sample
+
+
+MODES = ('legacy', 'direct')
+
+
+class Command(BaseCommand):
+    help = "Compares the latency and accuracy of the legacy and direct VGG16 preprocessing pipelines."
+
+    def add_arguments(self, parser):
+        add_cifar10_arguments(parser, samples=500)
+        parser.add_argument('--batch-size', type=int, default=16)
+        parser.add_argument('--image', help="Image used for the crop benchmark (default: random 1000x750 noise).")
+        parser.add_argument('--boxes', type=int, default=20, help="Number of random crops per request.")
+        parser.add_argument('--repeat', type=int, default=5, help="Repetitions of the crop benchmark.")
+
+    def handle(self, *args, **options):
+        model = registry.get('vgg16')
+        samples = load_cifar10_sample(options)
+        labels = torch.tensor([label for _, label in samples])
+        images = [img for img, _ in samples]
+
+        predictions = {}
+        for mode in MODES:
+            start = time.perf_counter()
+            inputs = classifier_inputs(images, mode=mode)
+            preprocess_time = (time.perf_counter() - start) / len(images)
+
+            start = time.perf_counter()
+            outputs = []
+            with torch.no_grad():
+                for i in range(0, len(inputs), options['batch_size']):
+                    outputs.append(model(torch.stack(inputs[i:i + options['batch_size']])))
+            forward_time = (time.perf_counter() - start) / len(images)
+
+            predictions[mode] = torch.cat(outputs).argmax(dim=1)
+            accuracy = (predictions[mode] == labels).float().mean().item()
+            self.stdout.write(
+                f"{mode}: accuracy {accuracy:.4f}, preprocessing {preprocess_time * 1000:.2f} ms, "
+                f"forward {forward_time * 1000:.1f} ms per image"
+            )
+
+        agreement = (predictions['legacy'] == predictions['direct']).float().mean().item()
+        self.stdout.write(f"agreement between the pipelines: {agreement:.4f}")
+
+        self.benchmark_crops(options)
+
+    def benchmark_crops(self, options):
+        """
+        Times the preparation of the crops of one detection request with both pipelines.
+        """
+        if options['image']:
+            img = Image.open(options['image']).convert('RGB')
+        else:
+            img = Image.fromarray(torch.randint(0, 256, (750, 1000, 3), dtype=torch.uint8).numpy())
+
+        generator = torch.Generator().manual_seed(0)
+        width, height = img.size
+        corners = torch.rand(options['boxes'], 2, generator=generator) * torch.tensor([width * 0.8, height * 0.8])
+        sizes = torch.rand(options['boxes'], 2, generator=generator) * torch.tensor([width * 0.5, height * 0.5]) + 16
+        boxes = torch.cat([corners, torch.minimum(corners + sizes, torch.tensor([width, height]))], dim=1).tolist()
+
+        for mode in MODES:
+            start = time.perf_counter()
+            for _ in range(options['repeat']):
+                # The direct pipeline slices the tensor the detector has already decoded
+                image = image_tensor(img) if mode == 'direct' else None
+                crop_inputs(img, boxes, image=image, mode=mode)
+            elapsed = (time.perf_counter() - start) / options['repeat']
+            self.stdout.write(f"{mode}: {elapsed * 1000:.1f} ms for {len(boxes)} crops of a {width}x{height} image")
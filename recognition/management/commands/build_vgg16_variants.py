@@ -0,0 +1,103 @@
+"""
+build_vgg16_variants.py
+=======================
+
+Management command that builds the optimized VGG16 variants (see `recognition/variants.py`) from the
+fp32 weights and checks their accuracy against the fp32 model on a sample of the CIFAR-10 test set.
+A variant is only saved if its accuracy drops by at most `--max-drop`.
+
+Usage:
+    python manage.py build_vgg16_variants [script] [int8] [--data DIR] [--download] [--samples N]
+                                          [--max-drop FRACTION] [--skip-check]
+"""
+import os
+import time
+
+import torch
+from django.core.management.base import BaseCommand, CommandError
+
+from recognition.loaders import build_vgg16
+from recognition.preprocessing import classifier_inputs
+from recognition.variants import VGG16_VARIANTS, build_variant, save_variant
+
+from ._cifar10 import add_cifar10_arguments, load_cifar10_sample
+
+
+class Command(BaseCommand):
+    help = "Builds the TorchScript and int8 variants of VGG16 and checks their accuracy on CIFAR-10."
+
+    def add_arguments(self, parser):
+        parser.add_argument('variants', nargs='*', help="Variants to build: script, int8 (default: all).")
+        add_cifar10_arguments(parser)
+        parser.add_argument('--batch-size', type=int, default=64)
+        parser.add_argument('--max-drop', type=float, default=0.01, help="Maximum allowed loss of accuracy.")
+        parser.add_argument('--skip-check', action='store_true', help="Save the variants without the accuracy check.")
+
+    def handle(self, *args, **options):
+        variants = options['variants'] or list(VGG16_VARIANTS[1:])
+        unknown = set(variants) - set(VGG16_VARIANTS[1:])
+        if unknown:
+            raise CommandError(f"Unknown variants: {', '.join(sorted(unknown))}")
+
+        fp32 = build_vgg16()
+
+        batches = None
+        if not options['skip_check']:
+            batches = self.load_sample(options)
+            fp32_accuracy, fp32_predictions, fp32_time = self.evaluate(fp32, batches)
+            self.stdout.write(f"fp32: accuracy {fp32_accuracy:.4f}, {fp32_time * 1000:.1f} ms per batch")
+
+        for variant in variants:
+            module = build_variant(fp32, variant)
+
+            if batches is not None:
+                accuracy, predictions, elapsed = self.evaluate(module, batches)
+                agreement = (predictions == fp32_predictions).float().mean().item()
+                self.stdout.write(
+                    f"{variant}: accuracy {accuracy:.4f}, agreement with fp32 {agreement:.4f}, "
+                    f"{elapsed * 1000:.1f} ms per batch"
+                )
+                if fp32_accuracy - accuracy > options['max_drop']:
+                    raise CommandError(
+                        f"The accuracy of the '{variant}' variant drops by {fp32_accuracy - accuracy:.4f}, "
+                        f"more than {options['max_drop']}; it was not saved."
+                    )
+
+            path = save_variant(module, variant)
+            size = os.path.getsize(path) / 2 ** 20
+            self.stdout.write(self.style.SUCCESS(f"{variant}: {path} ({size:.1f} MiB)"))
+
+    def load_sample(self, options):
+        """
+        Loads a fixed random sample of the CIFAR-10 test set, preprocessed like uploaded images.
+
+        Returns:
+            list[tuple]: (images, labels) batches.
+        """
+        samples = load_cifar10_sample(options)
+
+        batches = []
+        for start in range(0, len(samples), options['batch_size']):
+            batch = samples[start:start + options['batch_size']]
+            images = torch.stack(classifier_inputs([img for img, _ in batch]))
+            labels = torch.tensor([label for _, label in batch])
+            batches.append((images, labels))
+        return batches
+
+    def evaluate(self, model, batches):
+        """
+        Runs a model on the sample.
+
+        Returns:
+            tuple: The accuracy, the predicted classes and the mean time per batch in seconds.
+        """
+        predictions = []
+        start = time.perf_counter()
+        with torch.no_grad():
+            for images, _ in batches:
+                predictions.append(model(images).argmax(dim=1))
+        elapsed = (time.perf_counter() - start) / len(batches)
+
+        predictions = torch.cat(predictions)
+        labels = torch.cat([labels for _, labels in batches])
+        return (predictions == labels).float().mean().item(), predictions, elapsed
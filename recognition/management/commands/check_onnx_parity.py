@@ -0,0 +1,169 @@
+"""
+check_onnx_parity.py
+====================
+
+Management command that compares the outputs of the exported ONNX models on ONNX Runtime with the
+eager PyTorch/Keras models they were exported from. It fails if the outputs differ by more than the
+given tolerances, so it can be run after `export_onnx` before enabling `ONNX_RUNTIME_MODELS`. The
+detections of the two Faster R-CNN models are matched in both directions, and the check fails if
+no detection was compared at all.
+
+Usage:
+    python manage.py check_onnx_parity [vgg16] [faster_rcnn] [cifar10_keras] [--image PATH ...]
+                                       [--atol VALUE] [--box-atol PIXELS] [--score-atol VALUE]
+"""
+import glob
+import os
+
+import numpy as np
+import torch
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+from PIL import Image
+
+from recognition import loaders
+from recognition.onnx_backend import ONNX_MODELS, OnnxClassifier, OnnxDetector
+from recognition.preprocessing import classifier_inputs, image_tensor
+
+
+# Detections below this score are too unstable to compare
+MIN_COMPARED_SCORE = 0.5
+
+# Photos shipped with the repository (animals, vehicles and people, i.e. COCO classes), used when
+# no --image is given: random noise yields no detections and would compare nothing
+SAMPLE_IMAGE_PATTERNS = (
+    os.path.join('static', 'game_images', '*.jpg'),
+    os.path.join('static', 'img', 'team-*.jpg'),
+)
+
+
+def sample_images():
+    """
+    Returns the paths of the sample images shipped with the repository.
+    """
+    paths = []
+    for pattern in SAMPLE_IMAGE_PATTERNS:
+        paths.extend(sorted(glob.glob(os.path.join(settings.BASE_DIR, pattern))))
+    return paths
+
+
+def match_detections(source, target, min_score, box_atol, score_atol):
+    """
+    Matches the detections of one model on an image with the detections of the other model.
+
+    Detections with (almost) equal scores may come out in a different order, so every `source`
+    detection scoring at least `min_score` is matched with the closest `target` detection of the
+    same class whose score is within `score_atol`.
+
+    Args:
+        source (dict): The 'boxes', 'labels' and 'scores' tensors of one model.
+        target (dict): The 'boxes', 'labels' and 'scores' tensors of the other model.
+        min_score (float): The lowest score of the compared `source` detections.
+        box_atol (float): The largest difference of box coordinates of a match, in pixels.
+        score_atol (float): The largest difference of scores of a match.
+
+    Returns:
+        tuple: The number of compared `source` detections, the number of them without a match, and
+        the largest box difference of the matched ones.
+    """
+    s_keep = source['scores'] >= min_score
+    # Target detections just below the cut-off can still match source ones just above it
+    t_keep = target['scores'] >= min_score - score_atol
+    s_boxes, s_labels, s_scores = source['boxes'][s_keep], source['labels'][s_keep], source['scores'][s_keep]
+    t_boxes, t_labels, t_scores = target['boxes'][t_keep], target['labels'][t_keep], target['scores'][t_keep]
+    if not len(s_boxes):
+        return 0, 0, 0.0
+    if not len(t_boxes):
+        return len(s_boxes), len(s_boxes), 0.0
+
+    distance = (s_boxes[:, None, :] - t_boxes[None, :, :]).abs().amax(dim=2)
+    distance[s_labels[:, None] != t_labels[None, :]] = float('inf')
+    distance[(s_scores[:, None] - t_scores[None, :]).abs() > score_atol] = float('inf')
+    closest = distance.min(dim=1).values
+    matched = closest[closest <= box_atol]
+    return len(s_boxes), len(s_boxes) - len(matched), matched.max().item() if len(matched) else 0.0
+
+
+class Command(BaseCommand):
+    help = "Compares the ONNX Runtime models with the eager models they were exported from."
+
+    def add_arguments(self, parser):
+        parser.add_argument('names', nargs='*', help="Models to check (default: all).")
+        parser.add_argument('--image', action='append', default=[], help="Image to run the models on (repeatable; default: the sample images in static/).")
+        parser.add_argument('--atol', type=float, default=1e-3, help="Maximum absolute difference of classifier outputs.")
+        parser.add_argument('--box-atol', type=float, default=1.0, help="Maximum difference of box coordinates in pixels.")
+        parser.add_argument('--score-atol', type=float, default=1e-2, help="Maximum difference of detection scores.")
+
+    def handle(self, *args, **options):
+        names = options['names'] or list(ONNX_MODELS)
+        unknown = set(names) - set(ONNX_MODELS)
+        if unknown:
+            raise CommandError(f"Unknown models: {', '.join(sorted(unknown))}")
+
+        paths = options['image'] or sample_images()
+        if not paths:
+            raise CommandError("No images to run the models on; pass them with --image.")
+        images = [Image.open(path).convert('RGB') for path in paths]
+
+        failures = []
+        for name in names:
+            try:
+                ok = getattr(self, f"check_{name}")(images, options)
+            except RuntimeError as e:
+                raise CommandError(f"{name}: {e}")
+            if not ok:
+                failures.append(name)
+
+        if failures:
+            raise CommandError(f"The ONNX outputs differ from the eager models: {', '.join(failures)}")
+        self.stdout.write(self.style.SUCCESS("The ONNX models match the eager models."))
+
+    def report(self, name, ok, message):
+        style = self.style.SUCCESS if ok else self.style.ERROR
+        self.stdout.write(style(f"{name}: {message}"))
+        return ok
+
+    def check_vgg16(self, images, options):
+        batch = torch.stack(classifier_inputs(images))
+        with torch.no_grad():
+            expected = loaders.build_vgg16()(batch)
+        actual = OnnxClassifier('vgg16')(batch)
+
+        diff = (expected - actual).abs().max().item()
+        agreement = (expected.argmax(dim=1) == actual.argmax(dim=1)).float().mean().item()
+        return self.report('vgg16', diff <= options['atol'] and agreement == 1.0,
+                           f"max difference {diff:.2e}, top-1 agreement {agreement:.4f}")
+
+    def check_faster_rcnn(self, images, options):
+        tensors = [image_tensor(img) for img in images]
+        with torch.no_grad():
+            expected = loaders.build_faster_rcnn()(tensors)
+        actual = OnnxDetector('faster_rcnn')(tensors)
+
+        # Both directions: every eager detection needs an ONNX match and every ONNX detection an
+        # eager one, otherwise missing or extra detections of either model would go unnoticed
+        compared = {'eager': 0, 'ONNX': 0}
+        unmatched, box_diff = 0, 0.0
+        for e, a in zip(expected, actual):
+            for name, source, target in (('eager', e, a), ('ONNX', a, e)):
+                count, missing, diff = match_detections(source, target, MIN_COMPARED_SCORE,
+                                                        options['box_atol'], options['score_atol'])
+                compared[name] += count
+                unmatched += missing
+                box_diff = max(box_diff, diff)
+
+        message = (f"{compared['eager']} eager and {compared['ONNX']} ONNX detections compared, "
+                   f"{unmatched} without a match, max box difference {box_diff:.3f} px")
+        if not compared['eager'] and not compared['ONNX']:
+            message += f" (no detection scored {MIN_COMPARED_SCORE} or more; use images with objects in them)"
+        return self.report('faster_rcnn', unmatched == 0 and (compared['eager'] or compared['ONNX']) > 0, message)
+
+    def check_cifar10_keras(self, images, options):
+        batch = np.stack([np.asarray(img.resize((32, 32)), dtype=np.float32) / 255.0 for img in images])
+        expected = loaders.build_cifar10_keras().predict(batch)
+        actual = OnnxClassifier('cifar10_keras').predict(batch)
+
+        diff = float(np.abs(expected - actual).max())
+        agreement = float((expected.argmax(axis=1) == actual.argmax(axis=1)).mean())
+        return self.report('cifar10_keras', diff <= options['atol'] and agreement == 1.0,
+                           f"max difference {diff:.2e}, top-1 agreement {agreement:.4f}")
@@ -0,0 +1,36 @@
+"""
+export_onnx.py
+==============
+
+Management command that exports models from their verified weights to ONNX files in the artifact
+store, for the ONNX Runtime backend (see `ONNX_RUNTIME_MODELS` and `recognition/onnx_backend.py`).
+
+Usage:
+    python manage.py export_onnx [vgg16] [faster_rcnn] [cifar10_keras]
+"""
+import os
+
+from django.core.management.base import BaseCommand, CommandError
+
+from recognition.onnx_backend import ONNX_MODELS, export
+
+
+class Command(BaseCommand):
+    help = "Exports VGG16, Faster R-CNN and the Keras CIFAR-10 model to ONNX."
+
+    def add_arguments(self, parser):
+        parser.add_argument('names', nargs='*', help="Models to export: vgg16, faster_rcnn, cifar10_keras (default: all).")
+
+    def handle(self, *args, **options):
+        names = options['names'] or list(ONNX_MODELS)
+        unknown = set(names) - set(ONNX_MODELS)
+        if unknown:
+            raise CommandError(f"Unknown models: {', '.join(sorted(unknown))}")
+
+        for name in names:
+            try:
+                path = export(name)
+            except RuntimeError as e:
+                raise CommandError(f"{name}: {e}")
+            size = os.path.getsize(path) / 2 ** 20
+            self.stdout.write(self.style.SUCCESS(f"{name}: {path} ({size:.1f} MiB)"))
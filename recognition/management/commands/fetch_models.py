@@ -0,0 +1,46 @@
+"""
+fetch_models.py
+===============
+
+Management command that warms the local model artifact store, so that the application can later
+start without network access (see `MODEL_OFFLINE`). Artifacts without a full SHA-256 digest in the
+manifest are refused.
+
+`--pin` is for maintainers updating recognition/artifacts.json, not for deployments: it replaces a
+published digest prefix (the torchvision weights carry one in their file names) with the full digest
+of a file that matches it; the manifest is then committed.
+
+Usage:
+    python manage.py fetch_models [name ...] [--force] [--pin]
+"""
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+
+from recognition.artifacts import ArtifactStore
+from recognition.loaders import mmap_path
+
+
+class Command(BaseCommand):
+    help = "Downloads the model artifacts listed in recognition/artifacts.json and verifies their SHA-256 digests."
+
+    def add_arguments(self, parser):
+        parser.add_argument('names', nargs='*', help="Artifact names to fetch (default: all).")
+        parser.add_argument('--force', action='store_true', help="Fetch the artifacts even if they are already stored.")
+        parser.add_argument('--pin', action='store_true', help="Maintainers: replace the digest prefixes in the manifest with the full digests of the fetched files.")
+
+    def handle(self, *args, **options):
+        store = ArtifactStore(offline=False)
+        names = options['names'] or list(store.manifest)
+
+        for name in names:
+            try:
+                path = store.fetch(name, force=options['force'])
+                digest = store.pin(name) if options['pin'] else store.verify(name)
+            except (KeyError, RuntimeError, OSError) as e:
+                raise CommandError(str(e))
+
+            self.stdout.write(self.style.SUCCESS(f"{name}: {path} {digest}"))
+
+            # Prepare the memory-mapped copy of PyTorch state dicts up front
+            if getattr(settings, 'MODEL_MMAP_WEIGHTS', True) and path.endswith('.pth'):
+                self.stdout.write(f"{name}: {mmap_path(name)}")
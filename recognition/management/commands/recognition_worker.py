@@ -0,0 +1,28 @@
+"""
+recognition_worker.py
+=====================
+
+Management command that processes the queued recognition jobs of the asynchronous mode
+(RECOGNITION_ASYNC). Several workers may run at the same time.
+
+Usage:
+    python manage.py recognition_worker [--interval SECONDS] [--once]
+"""
+from django.core.management.base import BaseCommand
+
+from recognition.jobs import run_worker
+
+
+class Command(BaseCommand):
+    help = "Processes queued image recognition jobs."
+
+    def add_arguments(self, parser):
+        parser.add_argument('--interval', type=float, default=1.0, help="Seconds to wait when the queue is empty.")
+        parser.add_argument('--once', action='store_true', help="Exit as soon as the queue is empty.")
+
+    def handle(self, *args, **options):
+        self.stdout.write("Waiting for recognition jobs...")
+        try:
+            run_worker(poll_interval=options['interval'], once=options['once'])
+        except KeyboardInterrupt:
+            pass
@@ -0,0 +1,129 @@
+"""
+masks.py
+========
+
+This module converts the segmentation masks predicted by Mask R-CNN to and from the uncompressed
+run-length encoding used by COCO (`{"size": [height, width], "counts": [...]}`, runs counted in
+column-major order and starting with a run of zeros), so that they can be stored as JSON, and
+post-processes all masks of an image at once: thresholding, run-length encoding and the outlines
+drawn by the renderer are single tensor/array operations over the whole batch of masks.
+"""
+import numpy as np
+import torch
+import torch.nn.functional as F
+
+
+# Mask R-CNN predicts per-pixel probabilities; pixels above this value belong to the object
+MASK_THRESHOLD = 0.5
+
+# Number of masks eroded at once when finding outlines, bounds the memory of the float buffers
+OUTLINE_CHUNK_SIZE = 16
+
+
+def encode_rle(mask):
+    """
+    Encodes a binary mask as COCO run-length encoding.
+
+    Args:
+        mask (numpy.ndarray): A 2-D boolean mask.
+
+    Returns:
+        dict: The `size` ([height, width]) and `counts` (run lengths) of the mask.
+    """
+    mask = np.asarray(mask, dtype=bool)
+    pixels = mask.ravel(order='F')
+
+    # Run boundaries are the positions where the value changes
+    changes = np.flatnonzero(pixels[1:] != pixels[:-1]) + 1
+    counts = np.diff(np.concatenate(([0], changes, [pixels.size])))
+    if pixels.size and pixels[0]:
+        counts = np.concatenate(([0], counts))
+
+    return {'size': list(mask.shape), 'counts': counts.tolist()}
+
+
+def decode_rle(rle):
+    """
+    Decodes COCO run-length encoding into a binary mask.
+
+    Args:
+        rle (dict): The `size` and `counts` of the mask.
+
+    Returns:
+        numpy.ndarray: The 2-D boolean mask.
+    """
+    height, width = rle['size']
+    counts = np.asarray(rle['counts'], dtype=np.int64)
+    values = np.arange(len(counts)) % 2 == 1  # odd runs are ones
+    return np.repeat(values, counts).reshape((height, width), order='F')
+
+
+def binarize_masks(mask_probs, threshold=MASK_THRESHOLD):
+    """
+    Thresholds the per-pixel probabilities of all masks of an image in one tensor operation.
+
+    Args:
+        mask_probs (torch.Tensor): The (N, 1, H, W) mask probabilities predicted by Mask R-CNN
+                                   (or masks already binarized by the inference pool, see `batching.py`).
+        threshold (float): The probability above which a pixel belongs to the object.
+
+    Returns:
+        numpy.ndarray: The (N, H, W) boolean masks (sharing memory with the thresholded tensor).
+    """
+    if mask_probs.dtype == torch.bool:
+        return mask_probs[:, 0].numpy()
+    return (mask_probs[:, 0] > threshold).numpy()
+
+
+def encode_rle_batch(masks):
+    """
+    Encodes a batch of binary masks of the same size as COCO run-length encoding.
+
+    The run boundaries of all masks are found in one pass; the result is the same as calling
+    `encode_rle` on each mask.
+
+    Args:
+        masks (numpy.ndarray): (N, H, W) boolean masks.
+
+    Returns:
+        list[dict]: The `size` and `counts` of every mask.
+    """
+    masks = np.asarray(masks, dtype=bool)
+    if masks.ndim != 3 or not len(masks):
+        return [encode_rle(mask) for mask in masks]
+
+    n, height, width = masks.shape
+    length = height * width
+    # Column-major pixels of every mask, after a virtual zero so that the runs start with zeros
+    pixels = masks.transpose(0, 2, 1).reshape(n, length)
+    padded = np.concatenate((np.zeros((n, 1), dtype=bool), pixels), axis=1)
+    rows, changes = np.nonzero(padded[:, 1:] != padded[:, :-1])
+
+    # `np.nonzero` returns the changes sorted by mask, so every mask is a contiguous slice
+    bounds = np.searchsorted(rows, np.arange(n + 1))
+    encoded = []
+    for i in range(n):
+        counts = np.diff(np.concatenate(([0], changes[bounds[i]:bounds[i + 1]], [length])))
+        encoded.append({'size': [height, width], 'counts': counts.tolist()})
+    return encoded
+
+
+def mask_outlines(masks, width=2):
+    """
+    Finds the outlines of a batch of binary masks with a batched morphological erosion.
+
+    Args:
+        masks (numpy.ndarray): (N, H, W) boolean masks.
+        width (int): The thickness of the outlines in pixels.
+
+    Returns:
+        numpy.ndarray: An (H, W) boolean array that is True on the outline of any mask.
+    """
+    masks = torch.as_tensor(np.asarray(masks, dtype=bool))
+    outline = torch.zeros(masks.shape[1:], dtype=torch.bool)
+    for chunk in masks.split(OUTLINE_CHUNK_SIZE):
+        # Erosion is a max-pooling of the inverted masks; pixels outside the image do not count
+        x = chunk.unsqueeze(1).float()
+        eroded = -F.max_pool2d(-x, kernel_size=2 * width + 1, stride=1, padding=width)
+        outline |= (chunk & (eroded[:, 0] < 0.5)).any(dim=0)
+    return outline.numpy()
@@ -0,0 +1,23 @@
+# Generated by Django 5.1 on 2026-10-18 10:30
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('recognition', '0002_uploadedimage_status'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='uploadedimage',
+            name='image_hash',
+            field=models.CharField(blank=True, db_index=True, max_length=64, null=True),
+        ),
+        migrations.AddField(
+            model_name='uploadedimage',
+            name='model_version',
+            field=models.CharField(blank=True, max_length=16, null=True),
+        ),
+    ]
@@ -0,0 +1,18 @@
+# Generated by Django 5.1 on 2026-10-18 11:00
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('recognition', '0003_uploadedimage_image_hash'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='uploadedimage',
+            name='detections',
+            field=models.JSONField(blank=True, null=True),
+        ),
+    ]
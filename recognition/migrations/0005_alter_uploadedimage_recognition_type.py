@@ -0,0 +1,18 @@
+# Generated by Django 5.1 on 2026-10-18 12:00
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('recognition', '0004_uploadedimage_detections'),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name='uploadedimage',
+            name='recognition_type',
+            field=models.CharField(choices=[('vgg16', 'VGG16'), ('faster_rcnn', 'Faster R-CNN'), ('mask_rcnn', 'Mask R-CNN'), ('faster_rcnn_mobilenet', 'Faster R-CNN MobileNetV3'), ('ssdlite', 'SSDlite')], max_length=32),
+        ),
+    ]
@@ -0,0 +1,18 @@
+# Generated by Django 5.1 on 2026-10-18 16:00
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('recognition', '0005_alter_uploadedimage_recognition_type'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='uploadedimage',
+            name='attempts',
+            field=models.PositiveSmallIntegerField(default=0),
+        ),
+    ]
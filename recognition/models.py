@@ -5,6 +5,7 @@ models.py
 This module defines the models used in the image classification application. 
 It includes the UploadedImage model, which is responsible for storing the uploaded 
 images, annotated images, recognition types, confidence thresholds, and classification results.
+In the asynchronous mode the UploadedImage rows also serve as the recognition job queue.
 """
 from django.db import models
 
@@ -20,18 +21,58 @@ class UploadedImage(models.Model):
     annotated_image : ImageField
         The image with annotations after recognition (optional).
     recognition_type : CharField
-        The type of recognition model used (VGG16, Faster R-CNN, Mask R-CNN).
+        The type of recognition model used (VGG16, Faster R-CNN, Mask R-CNN, Faster R-CNN MobileNetV3, SSDlite).
     confidence_threshold : FloatField
         The confidence threshold used for object detection.
     result : TextField
         The result of the classification/recognition process.
-    """    
+    status : CharField
+        The state of the recognition job (pending, processing, done, failed).
+    error : TextField
+        The error message if the recognition failed (optional).
+    updated_at : DateTimeField
+        The time of the last change, used to find stalled jobs.
+    attempts : PositiveSmallIntegerField
+        The number of times a worker has claimed the recognition job.
+    image_hash : CharField
+        The SHA-256 of the uploaded file, the key of the result cache.
+    model_version : CharField
+        The version of the models that produced the result.
+    detections : JSONField
+        The raw detector output (boxes, scores, labels, RLE masks) before thresholding (optional).
+    """
+    STATUS_PENDING = 'pending'
+    STATUS_PROCESSING = 'processing'
+    STATUS_DONE = 'done'
+    STATUS_FAILED = 'failed'
+
     image = models.ImageField(upload_to='images/')
     annotated_image = models.ImageField(upload_to='annotated_images/', null=True, blank=True)
-    recognition_type = models.CharField(max_length=11, choices=[
+    recognition_type = models.CharField(max_length=32, choices=[
         ('vgg16', 'VGG16'),
         ('faster_rcnn', 'Faster R-CNN'),
-        ('mask_rcnn', 'Mask R-CNN')
+        ('mask_rcnn', 'Mask R-CNN'),
+        ('faster_rcnn_mobilenet', 'Faster R-CNN MobileNetV3'),
+        ('ssdlite', 'SSDlite')
     ])
     confidence_threshold = models.FloatField(default=0.5)
     result = models.TextField(blank=True, null=True)
+    status = models.CharField(max_length=10, default=STATUS_DONE, db_index=True, choices=[
+        (STATUS_PENDING, 'Pending'),
+        (STATUS_PROCESSING, 'Processing'),
+        (STATUS_DONE, 'Done'),
+        (STATUS_FAILED, 'Failed')
+    ])
+    error = models.TextField(blank=True, null=True)
+    updated_at = models.DateTimeField(auto_now=True, null=True)
+    image_hash = models.CharField(max_length=64, blank=True, null=True, db_index=True)
+    model_version = models.CharField(max_length=16, blank=True, null=True)
+    detections = models.JSONField(blank=True, null=True)
+    attempts = models.PositiveSmallIntegerField(default=0)
+
+    @property
+    def is_finished(self):
+        """
+        Returns True if the recognition job is done or has failed.
+        """
+        return self.status in (self.STATUS_DONE, self.STATUS_FAILED)
@@ -0,0 +1,185 @@
+"""
+onnx_backend.py
+===============
+
+This module implements the optional ONNX Runtime backend (CPU execution provider) of the models.
+The models listed in ONNX_RUNTIME_MODELS (any of 'vgg16', 'faster_rcnn' and 'cifar10_keras') are served
+by an `onnxruntime.InferenceSession` with all graph optimizations enabled instead of eager PyTorch or
+TensorFlow; the wrappers below keep the calling conventions of the models they replace, so the
+batching and the views do not change.
+
+The ONNX files are exported from the verified weights by `manage.py export_onnx` into the artifact
+store, and `manage.py check_onnx_parity` compares their outputs with the eager models.
+onnxruntime (requirements-onnx.txt) and tf2onnx (for the Keras model) are optional dependencies,
+imported only when they are used.
+"""
+import inspect
+import os
+
+import numpy as np
+import torch
+from django.conf import settings
+
+from .artifacts import get_store
+
+
+ONNX_MODELS = ('vgg16', 'faster_rcnn', 'cifar10_keras')
+
+# The operator set used for the export; torchvision's detection models need at least 11
+ONNX_OPSET = 17
+
+# Newer PyTorch versions export with the dynamo-based exporter by default, which does not handle the
+# data-dependent control flow of the detectors; the TorchScript-based exporter does
+EXPORT_OPTIONS = {'dynamo': False} if 'dynamo' in inspect.signature(torch.onnx.export).parameters else {}
+
+
+def uses_onnx(name):
+    """
+    Checks whether a model is configured to run on ONNX Runtime.
+    """
+    return name in getattr(settings, 'ONNX_RUNTIME_MODELS', [])
+
+
+def onnx_path(name):
+    """
+    Returns the path of a model's ONNX file in the artifact store.
+    """
+    return os.path.join(get_store().root, f"{name}.onnx")
+
+
+def create_session(name):
+    """
+    Opens an ONNX Runtime session for an exported model.
+
+    Args:
+        name (str): One of ONNX_MODELS.
+
+    Returns:
+        onnxruntime.InferenceSession: The session on the CPU execution provider.
+
+    Raises:
+        RuntimeError: If onnxruntime is not installed or the model has not been exported.
+    """
+    try:
+        import onnxruntime as ort
+    except ImportError:
+        raise RuntimeError(f"The model '{name}' is configured for ONNX Runtime, but onnxruntime is not installed "
+                           "(pip install -r requirements-onnx.txt).")
+
+    path = onnx_path(name)
+    if not os.path.exists(path):
+        raise RuntimeError(f"The ONNX model '{name}' has not been exported. Run `python manage.py export_onnx {name}`.")
+
+    options = ort.SessionOptions()
+    options.graph_optimization_level = ort.GraphOptimizationLevel.ORT_ENABLE_ALL
+    options.intra_op_num_threads = getattr(settings, 'ONNX_INTRA_OP_THREADS', 0)
+    options.inter_op_num_threads = 1
+    return ort.InferenceSession(path, sess_options=options, providers=['CPUExecutionProvider'])
+
+
+class OnnxClassifier:
+    """
+    Serves an image classifier exported with a dynamic batch dimension, e.g. VGG16.
+
+    Called with a batch tensor, like the eager model, it returns the output batch as a tensor.
+    """
+
+    def __init__(self, name):
+        self.session = create_session(name)
+        self.input_name = self.session.get_inputs()[0].name
+
+    def __call__(self, batch):
+        output = self.session.run(None, {self.input_name: np.ascontiguousarray(batch, dtype=np.float32)})[0]
+        return torch.from_numpy(output)
+
+    def predict(self, batch):
+        """
+        Keras-style prediction on a NumPy batch, returning a NumPy array.
+        """
+        return self.session.run(None, {self.input_name: np.asarray(batch, dtype=np.float32)})[0]
+
+
+class OnnxDetector:
+    """
+    Serves a torchvision detector exported for one (3, H, W) image at a time.
+
+    Called with a list of image tensors, like the eager model, it returns a list of prediction dicts.
+    """
+
+    def __init__(self, name):
+        self.session = create_session(name)
+        self.input_name = self.session.get_inputs()[0].name
+        self.output_names = [output.name for output in self.session.get_outputs()]
+
+    def __call__(self, images):
+        predictions = []
+        for image in images:
+            outputs = self.session.run(None, {self.input_name: image.numpy()})
+            predictions.append({name: torch.from_numpy(output) for name, output in zip(self.output_names, outputs)})
+        return predictions
+
+
+def export_classifier(model, path):
+    """
+    Exports a PyTorch classifier taking (N, 3, 224, 224) batches.
+    """
+    example = torch.zeros(1, 3, 224, 224)
+    with torch.no_grad():
+        torch.onnx.export(
+            model, (example,), path, opset_version=ONNX_OPSET, **EXPORT_OPTIONS,
+            input_names=['input'], output_names=['output'],
+            dynamic_axes={'input': {0: 'batch'}, 'output': {0: 'batch'}},
+        )
+
+
+def export_detector(model, path):
+    """
+    Exports a torchvision detector taking one (3, H, W) image of any size.
+    """
+    example = torch.rand(3, 600, 800)
+    with torch.no_grad():
+        torch.onnx.export(
+            model, ([example],), path, opset_version=ONNX_OPSET, **EXPORT_OPTIONS,
+            input_names=['image'], output_names=['boxes', 'labels', 'scores'],
+            dynamic_axes={'image': {1: 'height', 2: 'width'}},
+        )
+
+
+def export_keras(model, path):
+    """
+    Converts a Keras model with tf2onnx.
+    """
+    try:
+        import tf2onnx
+        import tensorflow as tf
+    except ImportError:
+        raise RuntimeError("Converting the Keras model requires tensorflow and tf2onnx.")
+
+    spec = (tf.TensorSpec((None, *model.input_shape[1:]), tf.float32, name='input'),)
+    tf2onnx.convert.from_keras(model, input_signature=spec, opset=ONNX_OPSET, output_path=path)
+
+
+def export(name):
+    """
+    Exports a model from its verified weights into the artifact store.
+
+    Args:
+        name (str): One of ONNX_MODELS.
+
+    Returns:
+        str: The path of the ONNX file.
+    """
+    from . import loaders
+
+    path = onnx_path(name)
+    tmp_path = path + '.part'
+    if name == 'vgg16':
+        export_classifier(loaders.build_vgg16(), tmp_path)
+    elif name == 'faster_rcnn':
+        export_detector(loaders.build_faster_rcnn(), tmp_path)
+    elif name == 'cifar10_keras':
+        export_keras(loaders.build_cifar10_keras(), tmp_path)
+    else:
+        raise ValueError(f"Unknown ONNX model: {name}")
+    os.replace(tmp_path, path)
+    return path
@@ -0,0 +1,174 @@
+"""
+pool.py
+=======
+
+This module runs CPU-bound inference in a dedicated pool of processes, so that a forward pass does
+not block the web worker. Under gunicorn's gevent worker the waiting greenlet polls its job and
+yields to the hub in between, so other greenlets (static pages, the chat endpoint, ...) keep being
+served while the models run.
+
+The pool is configured by the INFERENCE_POOL_SIZE (2 by default; 0 runs inference inline, in the
+calling process) and INFERENCE_TORCH_THREADS settings. Pool processes are started with the `spawn`
+method, which is safe with gevent monkey-patching and with the torch thread pool, and set up Django
+on their own. Functions registered with `add_warm_up` (e.g. loading a model) run in the initializer of
+every pool process, so each process is warmed up once, whenever it is started.
+
+Every call runs in its own pool process, one call at a time, so a pool process never sees concurrent
+requests; with RECOGNITION_BATCHING the requests are batched in the web worker and only the batched
+forward passes run here (see `batching.py`). Pool processes run everything inline: they do not start
+a pool or batchers of their own.
+"""
+import multiprocessing
+import os
+import threading
+from concurrent.futures import ProcessPoolExecutor
+
+from django.conf import settings
+
+
+# Set in the pool processes
+_is_pool_worker = False
+
+# Functions run by every pool process when it starts (see `add_warm_up`)
+_warm_ups = []
+
+
+def _init_worker(num_threads, warm_ups=()):
+    """
+    Initializes a pool process: limits the math library threads, sets up Django and runs the warm-ups.
+    """
+    global _is_pool_worker
+    _is_pool_worker = True
+    for name in ('OMP_NUM_THREADS', 'MKL_NUM_THREADS', 'TF_NUM_INTRAOP_THREADS'):
+        os.environ[name] = str(num_threads)
+    os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'root.settings')
+
+    import django
+    import torch
+
+    torch.set_num_threads(num_threads)
+    django.setup()
+
+    for func in warm_ups:
+        try:
+            func()
+        except Exception as e:
+            # An exception in the initializer would break the whole pool
+            print(f"Could not run the warm-up {func.__module__}.{func.__qualname__} in the inference pool: {e}")
+
+
+# How often a waiting greenlet checks whether its job has finished (seconds)
+POLL_INTERVAL = 0.005
+
+_executor = None
+_executor_pid = None
+_lock = threading.Lock()
+
+
+def add_warm_up(func):
+    """
+    Registers a function that every pool process runs once when it starts, after setting up Django.
+
+    Only affects pools started afterwards, so register warm-ups before the first use of the pool.
+
+    Args:
+        func (callable): A module-level function without arguments, so that it can be pickled.
+    """
+    if func not in _warm_ups:
+        _warm_ups.append(func)
+
+
+def in_pool_worker():
+    """
+    Checks whether the current process is an inference pool process.
+    """
+    return _is_pool_worker
+
+
+def get_executor():
+    """
+    Returns the process pool of the current process, starting it on first use.
+
+    Returns:
+        ProcessPoolExecutor: The pool, or None if INFERENCE_POOL_SIZE is 0 or this is a pool process.
+    """
+    global _executor, _executor_pid
+
+    size = getattr(settings, 'INFERENCE_POOL_SIZE', 2)
+    if size <= 0 or _is_pool_worker:
+        return None
+
+    # A pool inherited through fork (gunicorn preload_app) cannot be used by the child
+    if _executor is None or _executor_pid != os.getpid():
+        with _lock:
+            if _executor is None or _executor_pid != os.getpid():
+                _executor = ProcessPoolExecutor(
+                    max_workers=size,
+                    mp_context=multiprocessing.get_context('spawn'),
+                    initializer=_init_worker,
+                    initargs=(getattr(settings, 'INFERENCE_TORCH_THREADS', 1), tuple(_warm_ups)),
+                )
+                _executor_pid = os.getpid()
+    return _executor
+
+
+def start_processes():
+    """
+    Starts the pool processes now instead of on first use.
+
+    The pool starts a process for every job submitted while no process is idle, so one short job per
+    process starts all of them. The processes initialize in parallel; this returns once the jobs have
+    run, i.e. once at least one process is ready. The others finish their warm-ups before their first job.
+    """
+    executor = get_executor()
+    if executor is None:
+        return
+    futures = [executor.submit(os.getpid) for _ in range(getattr(settings, 'INFERENCE_POOL_SIZE', 2))]
+    for future in futures:
+        future.result()
+
+
+def wait(future):
+    """
+    Waits for a future without blocking the gevent hub, if gevent has patched this process.
+
+    Under gevent the future is polled every POLL_INTERVAL seconds with `gevent.sleep`. Blocking in
+    `future.result()` would stop every greenlet of the worker, and calling it from a native thread of
+    the hub is unsafe: the future waits on a patched lock, which belongs to the hub's thread.
+
+    Args:
+        future (concurrent.futures.Future): The future to wait for.
+
+    Returns:
+        object: The result of the future.
+    """
+    try:
+        import gevent
+        from gevent.monkey import is_module_patched
+    except ImportError:
+        return future.result()
+
+    if is_module_patched('threading'):
+        while not future.done():
+            gevent.sleep(POLL_INTERVAL)
+    return future.result()
+
+
+def run_in_pool(func, *args, **kwargs):
+    """
+    Runs a function in the inference pool and waits for its result cooperatively.
+
+    The function and its arguments must be picklable, i.e. `func` has to be a module-level function.
+
+    Args:
+        func (callable): The function to run.
+        *args: Positional arguments for `func`.
+        **kwargs: Keyword arguments for `func`.
+
+    Returns:
+        object: The return value of `func`. Exceptions raised by `func` are re-raised.
+    """
+    executor = get_executor()
+    if executor is None:
+        return func(*args, **kwargs)
+    return wait(executor.submit(func, *args, **kwargs))
@@ -0,0 +1,168 @@
+"""
+registry.py
+===========
+
+This module provides a process-wide registry of the machine learning models used by the application.
+Models are registered together with a loader function and are only built the first time they are
+requested, so a worker that serves a single recognition type never pays for the others.
+Loading is guarded by per-model locks, which makes the registry safe to use from threads and from
+gevent greenlets (gunicorn's gevent worker monkey-patches `threading`).
+"""
+import os
+import threading
+import time
+
+
+def current_rss():
+    """
+    Returns the resident set size of the current process in bytes.
+
+    Returns:
+        int: The resident memory of the process, or 0 if it cannot be determined.
+    """
+    try:
+        with open('/proc/self/statm') as statm:
+            return int(statm.read().split()[1]) * os.sysconf('SC_PAGE_SIZE')
+    except (OSError, ValueError, IndexError):
+        pass
+
+    try:
+        import resource
+        # ru_maxrss is reported in kilobytes on Linux and in bytes on macOS
+        return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss * 1024
+    except (ImportError, OSError):
+        return 0
+
+
+class ModelRegistry:
+    """
+    Lazily loads and caches models by name.
+
+    Attributes:
+    ----------
+    _loaders : dict
+        Maps a model name to the callable that builds the model.
+    _models : dict
+        Maps a model name to the loaded model instance.
+    _stats : dict
+        Maps a model name to its load time (seconds) and resident memory delta (bytes).
+    """
+
+    def __init__(self):
+        self._loaders = {}
+        self._models = {}
+        self._stats = {}
+        self._locks = {}
+        self._lock = threading.Lock()
+
+    def register(self, name, loader):
+        """
+        Registers a loader for the given model name.
+
+        Args:
+            name (str): The name the model is requested by.
+            loader (callable): A function without arguments that returns the loaded model.
+        """
+        with self._lock:
+            self._loaders[name] = loader
+            self._locks.setdefault(name, threading.Lock())
+
+    def loader(self, name):
+        """
+        Decorator form of `register`.
+
+        Args:
+            name (str): The name the model is requested by.
+
+        Returns:
+            callable: A decorator that registers the decorated function and returns it unchanged.
+        """
+        def decorator(func):
+            self.register(name, func)
+            return func
+        return decorator
+
+    def names(self):
+        """
+        Returns the names of all registered models.
+        """
+        return list(self._loaders)
+
+    def is_loaded(self, name):
+        """
+        Returns True if the model has already been loaded in this process.
+        """
+        return name in self._models
+
+    def get(self, name):
+        """
+        Returns the model registered under `name`, loading it on first use.
+
+        Args:
+            name (str): The name of the model.
+
+        Returns:
+            object: The loaded model.
+
+        Raises:
+            KeyError: If no loader is registered under `name`.
+        """
+        model = self._models.get(name)
+        if model is not None:
+            return model
+
+        if name not in self._loaders:
+            raise KeyError(f"No model registered under the name '{name}'.")
+
+        with self._locks[name]:
+            # Another thread may have finished loading while we waited for the lock
+            model = self._models.get(name)
+            if model is not None:
+                return model
+
+            rss_before = current_rss()
+            started = time.perf_counter()
+            model = self._loaders[name]()
+            load_time = time.perf_counter() - started
+            rss_delta = max(current_rss() - rss_before, 0)
+
+            self._stats[name] = {'load_time': load_time, 'rss': rss_delta}
+            self._models[name] = model
+            print(f"Model '{name}' loaded in {load_time:.2f}s, resident memory +{rss_delta / 2 ** 20:.1f} MiB.")
+            return model
+
+    def preload(self, names):
+        """
+        Loads the given models eagerly, e.g. at application start-up.
+
+        A model that fails to load is reported and skipped, so that start-up does not abort; it is
+        loaded again (and the error raised) on first use.
+
+        Args:
+            names (iterable): The names of the models to load.
+        """
+        for name in names:
+            try:
+                self.get(name)
+            except Exception as e:
+                print(f"Could not preload the model '{name}': {e}")
+
+    def unload(self, name):
+        """
+        Drops the loaded instance of a model so that the next `get` reloads it.
+        """
+        with self._locks.get(name, self._lock):
+            self._models.pop(name, None)
+            self._stats.pop(name, None)
+
+    def stats(self):
+        """
+        Returns the load time and resident memory delta of every loaded model.
+
+        Returns:
+            dict: Maps model names to dicts with `load_time` (seconds) and `rss` (bytes) keys.
+        """
+        return {name: dict(stat) for name, stat in self._stats.items()}
+
+
+registry = ModelRegistry()
@@ -0,0 +1,112 @@
+"""
+rendering.py
+============
+
+This module draws the recognition results (bounding boxes, mask contours and labels) directly onto
+a copy of the image with PIL's ImageDraw. It replaces the per-request matplotlib figures, which were
+slow, allocated a lot and relied on pyplot's global state that is not thread-safe.
+
+The look follows the former matplotlib output: red boxes, red mask contours and black labels on a
+yellow, red-edged rounded box anchored at the top-left corner of each detection. The output format
+and quality come from the RECOGNITION_ANNOTATION_FORMAT and RECOGNITION_ANNOTATION_QUALITY settings.
+"""
+import io
+
+from django.conf import settings
+from django.core.files.base import ContentFile
+import numpy as np
+from PIL import Image, ImageDraw, ImageFont
+
+from .masks import mask_outlines
+
+
+BOX_COLOR = (255, 0, 0)
+LABEL_COLOR = (0, 0, 0)
+LABEL_BACKGROUND = (255, 255, 0)
+
+# File extension of every supported output format
+EXTENSIONS = {'PNG': 'png', 'JPEG': 'jpg', 'WEBP': 'webp'}
+
+
+def _font(img):
+    # Scale the label font with the image, as matplotlib did when fitting the image into its figure
+    size = max(12, round(max(img.size) / 40))
+    try:
+        return ImageFont.load_default(size=size)
+    except TypeError:  # Pillow < 10.1 has no scalable default font
+        return ImageFont.load_default()
+
+
+def draw_label(draw, position, text, font):
+    """
+    Draws a label on a yellow, red-edged rounded box whose top-left corner is at `position`.
+    """
+    x, y = position
+    left, top, right, bottom = draw.textbbox((x, y), text, font=font)
+    pad = max(2, (bottom - top) // 5)
+    draw.rounded_rectangle(
+        (left - pad, top - pad, right + pad, bottom + pad),
+        radius=pad, fill=LABEL_BACKGROUND, outline=BOX_COLOR, width=1,
+    )
+    draw.text((x, y), text, fill=LABEL_COLOR, font=font)
+
+
+def render_annotations(img, boxes, labels, masks=None):
+    """
+    Draws detections onto a copy of an image and encodes it.
+
+    Args:
+        img (PIL.Image.Image): The image the detections were made on.
+        boxes (list): Bounding boxes as (x1, y1, x2, y2) sequences.
+        labels (list[str]): The label drawn at the top-left corner of each box.
+        masks (numpy.ndarray, optional): (N, H, W) binary masks of the detections. If given, the mask
+                                         contours are drawn instead of the boxes.
+
+    Returns:
+        ContentFile: The encoded annotated image.
+    """
+    canvas = img.convert('RGB')  # always a copy, the input image is left untouched
+
+    if masks is not None and len(masks):
+        # Paint all mask outlines straight into the pixel buffer
+        pixels = np.array(canvas)
+        pixels[mask_outlines(masks)] = BOX_COLOR
+        canvas = Image.fromarray(pixels)
+
+    draw = ImageDraw.Draw(canvas)
+    font = _font(canvas)
+
+    if masks is None:
+        for box in boxes:
+            draw.rectangle(tuple(box), outline=BOX_COLOR, width=1)
+
+    # Labels go on top of all boxes and contours
+    for box, label in zip(boxes, labels):
+        draw_label(draw, (box[0], box[1]), label, font)
+
+    return encode_image(canvas)
+
+
+def encode_image(img, image_format=None, quality=None):
+    """
+    Encodes an image in the configured annotation format.
+
+    Args:
+        img (PIL.Image.Image): The image to encode.
+        image_format (str): 'PNG', 'JPEG' or 'WEBP' (default: RECOGNITION_ANNOTATION_FORMAT).
+        quality (int): The quality of lossy formats (default: RECOGNITION_ANNOTATION_QUALITY).
+
+    Returns:
+        ContentFile: The encoded image, named `annotated_image.<extension>`.
+    """
+    image_format = (image_format or getattr(settings, 'RECOGNITION_ANNOTATION_FORMAT', 'WEBP')).upper()
+    quality = quality or getattr(settings, 'RECOGNITION_ANNOTATION_QUALITY', 85)
+    if image_format not in EXTENSIONS:
+        raise ValueError(f"Unsupported annotation format: {image_format}")
+
+    buf = io.BytesIO()
+    if image_format == 'PNG':
+        img.save(buf, format='PNG', optimize=False)
+    else:
+        img.save(buf, format=image_format, quality=quality)
+    return ContentFile(buf.getvalue(), name=f'annotated_image.{EXTENSIONS[image_format]}')
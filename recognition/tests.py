@@ -1,3 +1,560 @@
-from django.test import TestCase
+import gc
+import json
+import os
+import shutil
+import subprocess
+import sys
+import tempfile
+import textwrap
+import threading
+import time
+import unittest
+from datetime import timedelta
+from importlib.util import find_spec
+from io import BytesIO, StringIO
+from unittest import mock
 
-# Create your tests here.
+import numpy as np
+import torch
+from django.conf import settings
+from django.core.management import call_command
+from django.core.files.storage import default_storage
+from django.core.files.uploadedfile import SimpleUploadedFile
+from django.core.management.base import CommandError
+from django.test import SimpleTestCase, TestCase, override_settings
+from django.urls import reverse
+from django.utils import timezone
+from PIL import Image
+
+from recognition import artifacts, batching, jobs, loaders, pool, tiling, views
+from recognition import cache as result_cache
+from recognition.artifacts import ArtifactStore, sha256sum
+from recognition.jobs import claim_next_job, heartbeat, process_job, requeue_stalled_jobs
+from recognition.management.commands import check_onnx_parity
+from recognition.management.commands.check_onnx_parity import match_detections, sample_images
+from recognition.masks import binarize_masks, decode_rle, encode_rle, encode_rle_batch
+from recognition.models import UploadedImage
+from recognition.views import prepare_image
+
+
+def detections(*rows):
+    """
+    Builds the output of a detector on one image from (x1, y1, x2, y2, label, score) rows.
+    """
+    rows = torch.tensor(rows, dtype=torch.float32).reshape(-1, 6)
+    return {'boxes': rows[:, :4], 'labels': rows[:, 4].long(), 'scores': rows[:, 5]}
+
+
+class MatchDetectionsTests(SimpleTestCase):
+    def match(self, source, target):
+        return match_detections(source, target, min_score=0.5, box_atol=1.0, score_atol=0.01)
+
+    def test_matches_detections_in_a_different_order(self):
+        eager = detections((0, 0, 10, 10, 1, 0.9), (20, 20, 40, 40, 3, 0.8))
+        onnx = detections((20.5, 20, 40, 40, 3, 0.805), (0, 0, 10, 10.2, 1, 0.9))
+        compared, unmatched, box_diff = self.match(eager, onnx)
+        self.assertEqual((compared, unmatched), (2, 0))
+        self.assertAlmostEqual(box_diff, 0.5)
+
+    def test_other_class_or_distant_box_is_no_match(self):
+        eager = detections((0, 0, 10, 10, 1, 0.9), (20, 20, 40, 40, 3, 0.8))
+        onnx = detections((0, 0, 10, 10, 2, 0.9), (25, 20, 40, 40, 3, 0.8))
+        self.assertEqual(self.match(eager, onnx)[:2], (2, 2))
+
+    def test_low_scores_are_not_compared(self):
+        eager = detections((0, 0, 10, 10, 1, 0.3))
+        self.assertEqual(self.match(eager, detections()), (0, 0, 0.0))
+
+    def test_target_just_below_the_cut_off_matches(self):
+        eager = detections((0, 0, 10, 10, 1, 0.505))
+        onnx = detections((0, 0, 10, 10, 1, 0.498))
+        self.assertEqual(self.match(eager, onnx)[:2], (1, 0))
+        self.assertEqual(self.match(onnx, eager)[:2], (0, 0))
+
+
+class CheckFasterRcnnTests(SimpleTestCase):
+    def run_check(self, eager, onnx):
+        """
+        Runs `check_onnx_parity faster_rcnn` with the given outputs of the eager and ONNX models.
+        """
+        out = StringIO()
+        with mock.patch.object(check_onnx_parity.loaders, 'build_faster_rcnn', return_value=lambda tensors: eager), \
+                mock.patch.object(check_onnx_parity, 'OnnxDetector', return_value=lambda tensors: onnx):
+            call_command('check_onnx_parity', 'faster_rcnn', image=sample_images()[:1], stdout=out)
+        return out.getvalue()
+
+    def test_matching_outputs_pass(self):
+        output = self.run_check([detections((0, 0, 10, 10, 1, 0.9))], [detections((0, 0, 10, 10.5, 1, 0.9))])
+        self.assertIn("1 eager and 1 ONNX detections compared, 0 without a match", output)
+
+    def test_nothing_compared_fails(self):
+        with self.assertRaises(CommandError):
+            self.run_check([detections((0, 0, 10, 10, 1, 0.2))], [detections()])
+
+    def test_extra_onnx_detection_fails(self):
+        with self.assertRaises(CommandError):
+            self.run_check([detections((0, 0, 10, 10, 1, 0.9))],
+                           [detections((0, 0, 10, 10, 1, 0.9), (50, 50, 80, 80, 18, 0.7))])
+
+    def test_missing_onnx_detection_fails(self):
+        with self.assertRaises(CommandError):
+            self.run_check([detections((0, 0, 10, 10, 1, 0.9), (50, 50, 80, 80, 18, 0.7))],
+                           [detections((0, 0, 10, 10, 1, 0.9))])
+
+    def test_sample_images_are_shipped(self):
+        self.assertTrue(sample_images())
+
+
+# Runs under gevent.monkey.patch_all() in a separate interpreter, so that the patching does not leak
+# into the other tests: a greenlet has to keep ticking while another one waits for a pool process
+GEVENT_WAIT_SCRIPT = textwrap.dedent("""
+    from gevent import monkey
+    monkey.patch_all()
+
+    import multiprocessing
+    import time
+    from concurrent.futures import ProcessPoolExecutor
+
+    import gevent
+
+    from recognition.pool import wait
+
+    ticks = []
+
+    def tick():
+        while True:
+            ticks.append(time.perf_counter())
+            gevent.sleep(0.01)
+
+    ticker = gevent.spawn(tick)
+    with ProcessPoolExecutor(max_workers=1, mp_context=multiprocessing.get_context('spawn')) as executor:
+        assert wait(executor.submit(abs, -1)) == 1
+        del ticks[:]
+        assert wait(executor.submit(time.sleep, 0.3)) is None
+        assert len(ticks) >= 10, ticks
+        waiters = [gevent.spawn(wait, executor.submit(abs, -i)) for i in range(20)]
+        gevent.joinall(waiters, raise_error=True)
+        assert [waiter.value for waiter in waiters] == list(range(20))
+        try:
+            wait(executor.submit(int, 'x'))
+        except ValueError:
+            pass
+        else:
+            raise AssertionError('The exception of the job was not re-raised.')
+    ticker.kill()
+    print('ok')
+""")
+
+
+@unittest.skipUnless(find_spec('gevent'), "gevent is not installed")
+class PoolWaitGeventTests(SimpleTestCase):
+    def test_wait_yields_to_other_greenlets(self):
+        result = subprocess.run([sys.executable, '-c', GEVENT_WAIT_SCRIPT], cwd=settings.BASE_DIR,
+                                capture_output=True, text=True, timeout=120)
+        self.assertEqual(result.returncode, 0, result.stderr)
+        self.assertEqual(result.stdout.strip(), 'ok')
+
+
+class RequeueStalledJobsTests(TestCase):
+    def stall(self, job):
+        # The worker that claimed the job died: nothing has touched it for longer than the timeout
+        UploadedImage.objects.filter(id=job.id).update(updated_at=timezone.now() - timedelta(seconds=120))
+
+    def test_stalled_job_fails_after_max_attempts(self):
+        job = UploadedImage.objects.create(image='images/test.png', recognition_type='vgg16',
+                                           status=UploadedImage.STATUS_PENDING)
+        for attempt in range(1, 4):
+            claimed = claim_next_job()
+            self.assertEqual((claimed.id, claimed.attempts), (job.id, attempt))
+            self.stall(claimed)
+            requeued = requeue_stalled_jobs(timeout=60, max_attempts=3)
+            self.assertEqual(requeued, 1 if attempt < 3 else 0)
+
+        job.refresh_from_db()
+        self.assertEqual(job.status, UploadedImage.STATUS_FAILED)
+        self.assertIn("interrupted 3 times", job.error)
+        self.assertIsNone(claim_next_job())
+
+    def test_recent_job_is_left_alone(self):
+        UploadedImage.objects.create(image='images/test.png', recognition_type='vgg16',
+                                     status=UploadedImage.STATUS_PENDING)
+        claim_next_job()
+        self.assertEqual(requeue_stalled_jobs(timeout=60, max_attempts=3), 0)
+        self.assertEqual(UploadedImage.objects.get().status, UploadedImage.STATUS_PROCESSING)
+
+    def test_zero_timeout_is_not_the_default(self):
+        UploadedImage.objects.create(image='images/test.png', recognition_type='vgg16',
+                                     status=UploadedImage.STATUS_PENDING)
+        claim_next_job()
+        self.assertEqual(requeue_stalled_jobs(timeout=0, max_attempts=3), 1)
+
+    def test_requeued_run_does_not_overwrite_the_next_one(self):
+        UploadedImage.objects.create(image='images/test.png', recognition_type='vgg16',
+                                     status=UploadedImage.STATUS_PENDING)
+        first = claim_next_job()
+        self.stall(first)
+        requeue_stalled_jobs(timeout=60, max_attempts=3)
+        second = claim_next_job()
+
+        # The first run finishes late (its image cannot even be opened) and is discarded
+        with mock.patch('builtins.print') as print_:
+            process_job(first)
+        self.assertIn("its result is discarded", print_.call_args[0][0])
+        job = UploadedImage.objects.get()
+        self.assertEqual((job.status, job.attempts, job.error), (UploadedImage.STATUS_PROCESSING, 2, None))
+
+        process_job(second)
+        self.assertEqual(UploadedImage.objects.get().status, UploadedImage.STATUS_FAILED)
+
+    def test_heartbeat_touches_the_running_job(self):
+        job = UploadedImage.objects.create(image='images/test.png', recognition_type='vgg16')
+        touched = mock.MagicMock()
+        with mock.patch.object(jobs, 'current_run', return_value=touched):
+            with heartbeat(job, interval=0.01):
+                time.sleep(0.1)
+            count = touched.update.call_count
+            time.sleep(0.05)
+        self.assertGreaterEqual(count, 2)
+        # The thread stops with the block
+        self.assertEqual(touched.update.call_count, count)
+
+
+class ArtifactStoreTests(SimpleTestCase):
+    def setUp(self):
+        self.root = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.root, ignore_errors=True)
+        self.path = os.path.join(self.root, 'weights.pth')
+        with open(self.path, 'wb') as f:
+            f.write(b'weights')
+        self.digest = sha256sum(self.path)
+
+    def store(self, sha256, allow_unpinned=False):
+        manifest_path = os.path.join(self.root, 'artifacts.json')
+        with open(manifest_path, 'w') as f:
+            json.dump({'weights': {'filename': 'weights.pth', 'source': 'url', 'url': '', 'sha256': sha256}}, f)
+        return ArtifactStore(root=self.root, offline=True, manifest_path=manifest_path, allow_unpinned=allow_unpinned)
+
+    def test_full_digest_is_verified(self):
+        self.assertEqual(self.store(self.digest).path('weights'), self.path)
+        with self.assertRaisesMessage(RuntimeError, "does not match the manifest"):
+            self.store('0' * 64).verify('weights')
+
+    def test_unpinned_artifacts_are_refused(self):
+        for sha256 in ('', self.digest[:8]):
+            with self.assertRaisesMessage(RuntimeError, "has no full SHA-256 digest"):
+                self.store(sha256).verify('weights')
+
+    def test_opt_out_still_checks_the_prefix(self):
+        self.assertEqual(self.store(self.digest[:8], allow_unpinned=True).verify('weights'), self.digest)
+        with self.assertRaisesMessage(RuntimeError, "does not match the manifest"):
+            self.store('00000000', allow_unpinned=True).verify('weights')
+
+    def test_pin_needs_a_matching_prefix(self):
+        with self.assertRaisesMessage(RuntimeError, "no digest to check the file against"):
+            self.store('').pin('weights')
+        with self.assertRaisesMessage(RuntimeError, "does not match"):
+            self.store('00000000').pin('weights')
+        store = self.store(self.digest[:8])
+        self.assertEqual(store.pin('weights'), self.digest)
+        self.assertEqual(store.manifest['weights']['sha256'], self.digest)
+
+
+class MmapPathTests(SimpleTestCase):
+    def setUp(self):
+        self.root = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.root, ignore_errors=True)
+        source = os.path.join(self.root, 'source.pth')
+        # The legacy (non-zipfile) format of the torchvision checkpoints
+        torch.save({'weight': torch.arange(6.0).reshape(2, 3).t()}, source, _use_new_zipfile_serialization=False)
+        manifest_path = os.path.join(self.root, 'artifacts.json')
+        with open(manifest_path, 'w') as f:
+            json.dump({'weights': {'filename': 'weights.pth', 'source': 'file', 'path': source,
+                                   'sha256': sha256sum(source)}}, f)
+        store = ArtifactStore(root=os.path.join(self.root, 'store'), offline=True, manifest_path=manifest_path)
+        patcher = mock.patch.object(loaders, 'get_store', return_value=store)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+    def test_copy_is_hashed_only_when_created(self):
+        target = loaders.mmap_path('weights')
+        state_dict = torch.load(target, mmap=True, weights_only=True)
+        self.assertTrue(torch.equal(state_dict['weight'], torch.arange(6.0).reshape(2, 3).t()))
+
+        # A new process: nothing verified yet, and nothing is hashed for an unchanged copy
+        loaders.get_store.return_value._verified.clear()
+        with mock.patch.object(artifacts, 'sha256sum', side_effect=AssertionError("hashed")), \
+                mock.patch.object(loaders, 'sha256sum', side_effect=AssertionError("hashed")):
+            self.assertEqual(loaders.mmap_path('weights'), target)
+
+    def test_changed_copy_is_recreated(self):
+        target = loaders.mmap_path('weights')
+        with open(target, 'ab') as f:
+            f.write(b'corrupt')
+        with mock.patch('builtins.print'):
+            self.assertEqual(loaders.mmap_path('weights'), target)
+        torch.load(target, mmap=True, weights_only=True)
+        self.assertEqual(sorted(os.listdir(os.path.dirname(target))),
+                         ['weights.mmap.pt', 'weights.mmap.pt.json', 'weights.pth'])
+
+
+def detect_bright_pixels(name, inputs):
+    """
+    A fake Mask R-CNN: one detection covering the bright pixels of each input that has any.
+    """
+    predictions = []
+    for image in inputs:
+        ys, xs = (image[0] > 0.5).nonzero(as_tuple=True)
+        if not len(ys):
+            predictions.append({'boxes': torch.zeros((0, 4)), 'scores': torch.zeros(0),
+                                'labels': torch.zeros(0, dtype=torch.int64), 'masks': torch.zeros((0, 1, *image.shape[1:]))})
+            continue
+        box = [xs.min().item(), ys.min().item(), xs.max().item() + 1, ys.max().item() + 1]
+        predictions.append({'boxes': torch.tensor([box], dtype=torch.float32), 'scores': torch.tensor([0.9]),
+                            'labels': torch.tensor([1]), 'masks': (image[:1] > 0.5).float()[None]})
+    return predictions
+
+
+@override_settings(RECOGNITION_DETECTOR_TILING=True, RECOGNITION_MAX_IMAGE_SIDE=800,
+                   RECOGNITION_TILE_SIZE=800, RECOGNITION_TILE_OVERLAP=128)
+class TiledDetectionTests(SimpleTestCase):
+    def test_small_object_of_the_upload_is_found_and_scaled(self):
+        # A 40 px object in a 1600x1200 upload, 20 px in the displayed image; the displayed image
+        # itself is blank so that only the tiles of the upload can find it
+        source = Image.new('RGB', (1600, 1200))
+        source.paste((255, 255, 255), (1000, 700, 1040, 740))
+        img = prepare_image(source)
+        self.assertEqual(img.size, (800, 600))
+        with mock.patch.object(tiling, 'run_batched', side_effect=detect_bright_pixels) as run_batched:
+            detections = tiling.detect_tiled('mask_rcnn', source, torch.zeros((3, 600, 800)), 0.5)
+
+        # The displayed image and 3x2 tiles; the tiles overlapping the object are merged into one detection
+        self.assertEqual(len(run_batched.call_args[0][1]), 7)
+        self.assertEqual(detections['boxes'], [[500.0, 350.0, 520.0, 370.0]])
+        mask = decode_rle(detections['masks'][0])
+        self.assertEqual(mask.shape, (600, 800))
+        ys, xs = mask.nonzero()
+        self.assertEqual((ys.min(), ys.max(), xs.min(), xs.max()), (350, 369, 500, 519))
+
+    def test_small_upload_is_not_tiled(self):
+        self.assertFalse(tiling.needs_tiling(Image.new('RGB', (800, 600))))
+        self.assertFalse(tiling.needs_tiling(None))
+        self.assertTrue(tiling.needs_tiling(Image.new('RGB', (1600, 1200))))
+
+
+@override_settings(RECOGNITION_BATCHING=True, INFERENCE_POOL_SIZE=2, RECOGNITION_BATCH_MAX_WAIT_MS=200,
+                   RECOGNITION_VGG16_BATCH_SIZE=4)
+class BatchingWithPoolTests(SimpleTestCase):
+    def setUp(self):
+        # A stand-in for the pool: records the batches instead of sending them to another process
+        self.batches = []
+
+        def run_in_pool(func, *args):
+            self.batches.append(len(args[1]))
+            return func(*args)
+
+        for patcher in (mock.patch.dict(batching._batchers, clear=True),
+                        mock.patch.object(batching, 'run_in_pool', side_effect=run_in_pool),
+                        mock.patch.object(batching.registry, 'get', return_value=lambda batch: batch * 2)):
+            patcher.start()
+            self.addCleanup(patcher.stop)
+
+    def test_concurrent_requests_share_a_pool_forward_pass(self):
+        results = {}
+
+        def request(i):
+            results[i] = batching.run_batched('vgg16', [torch.full((3,), float(i))])[0]
+
+        threads = [threading.Thread(target=request, args=(i,)) for i in range(4)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+
+        self.assertEqual({i: result[0].item() for i, result in results.items()}, {i: 2.0 * i for i in range(4)})
+        self.assertLess(len(self.batches), 4)
+        self.assertEqual(sum(self.batches), 4)
+        self.assertEqual(batching.get_batcher('vgg16').dispatchers, 2)
+
+    def test_request_runs_in_the_web_worker(self):
+        with mock.patch.object(pool, 'get_executor', side_effect=AssertionError("sent to the pool")):
+            self.assertEqual(batching.run_inference(abs, -1), 1)
+
+    def test_pool_process_runs_its_request_inline(self):
+        with mock.patch.object(pool, '_is_pool_worker', True):
+            self.assertIsNone(pool.get_executor())
+            output = batching.run_batched('vgg16', [torch.ones(3)])
+        self.assertEqual(output[0].tolist(), [2.0, 2.0, 2.0])
+        self.assertEqual(self.batches, [])
+
+
+@override_settings(INFERENCE_POOL_SIZE=2)
+class PoolWarmUpTests(SimpleTestCase):
+    def setUp(self):
+        for patcher in (mock.patch.object(pool, '_executor', None), mock.patch.object(pool, '_warm_ups', [])):
+            patcher.start()
+            self.addCleanup(patcher.stop)
+
+    def test_every_process_runs_the_warm_ups_when_it_starts(self):
+        # gc.disable stands in for loading a model: its effect is visible from the jobs of the process
+        pool.add_warm_up(gc.disable)
+        pool.add_warm_up(gc.disable)
+        self.assertEqual(pool._warm_ups, [gc.disable])
+        pool.start_processes()
+        executor = pool.get_executor()
+        self.addCleanup(executor.shutdown)
+        self.assertEqual(len(executor._processes), 2)
+        futures = [executor.submit(gc.isenabled) for _ in range(8)]
+        self.assertEqual({future.result() for future in futures}, {False})
+
+
+def png_file(color, name='upload.png'):
+    buf = BytesIO()
+    Image.new('RGB', (32, 32), color).save(buf, 'PNG')
+    return SimpleUploadedFile(name, buf.getvalue(), content_type='image/png')
+
+
+class ResultCacheTests(TestCase):
+    def setUp(self):
+        media_root = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, media_root, ignore_errors=True)
+        settings_override = override_settings(MEDIA_ROOT=media_root, INFERENCE_POOL_SIZE=0, RECOGNITION_ASYNC=False)
+        settings_override.enable()
+        self.addCleanup(settings_override.disable)
+        for patcher in (mock.patch.object(result_cache, '_memory', result_cache.LRUCache(16)),
+                        mock.patch.object(views, 'recognize', return_value=("cat", None, None))):
+            patcher.start()
+            self.addCleanup(patcher.stop)
+
+    def post(self, color, name='upload.png', recognition_type='vgg16'):
+        return self.client.post(reverse('recognition:index2'), {
+            'image': png_file(color, name), 'recognition_type': recognition_type, 'confidence_threshold': 0.5,
+        })
+
+    def upload(self, color, name='upload.png', recognition_type='vgg16'):
+        self.post(color, name, recognition_type)
+        return UploadedImage.objects.latest('id')
+
+    def test_same_content_is_recognized_once(self):
+        first = self.upload((255, 0, 0))
+        # The same bytes under another file name: a hit, the stored upload is reused
+        second = self.upload((255, 0, 0), name='renamed.png')
+        self.assertEqual(views.recognize.call_count, 1)
+        self.assertEqual((second.result, second.image.name), ("cat", first.image.name))
+        self.assertEqual(second.image_hash, first.image_hash)
+
+    def test_other_content_or_parameters_miss(self):
+        self.upload((255, 0, 0))
+        self.upload((0, 255, 0))
+        self.upload((255, 0, 0), recognition_type='faster_rcnn')
+        self.assertEqual(views.recognize.call_count, 3)
+
+    def test_hit_from_the_database_after_a_restart(self):
+        first = self.upload((255, 0, 0))
+        result_cache._memory._data.clear()
+        with self.assertNumQueries(2):
+            # The lookup of the indexed hash and the INSERT of the new row
+            self.post((255, 0, 0))
+        self.assertEqual(views.recognize.call_count, 1)
+        self.assertEqual(UploadedImage.objects.latest('id').image.name, first.image.name)
+
+
+def box_mask(box, size=(32, 32)):
+    mask = torch.zeros(size, dtype=torch.bool)
+    x1, y1, x2, y2 = box
+    mask[y1:y2, x1:x2] = True
+    return encode_rle(mask.numpy())
+
+
+def classify_by_position(img, boxes, topk=1, image=None):
+    # A stand-in for VGG16: the "class" of a crop is the x coordinate of its box
+    return [[(f"x{int(box[0])}", 0.5)] for box in boxes]
+
+
+class RethresholdTests(TestCase):
+    BOXES = [[0, 0, 8, 8], [10, 10, 20, 20], [20, 0, 30, 6]]
+
+    def setUp(self):
+        media_root = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, media_root, ignore_errors=True)
+        settings_override = override_settings(MEDIA_ROOT=media_root, INFERENCE_POOL_SIZE=0)
+        settings_override.enable()
+        self.addCleanup(settings_override.disable)
+        for patcher in (mock.patch.object(result_cache, '_memory', result_cache.LRUCache(16)),
+                        mock.patch.object(views, 'classify_crops', side_effect=classify_by_position),
+                        # Re-thresholding never runs the detector again
+                        mock.patch.object(views, 'run_batched', side_effect=AssertionError("detector called"))):
+            patcher.start()
+            self.addCleanup(patcher.stop)
+
+        name = default_storage.save('images/upload.png', png_file((255, 255, 255)))
+        self.detections = {
+            'boxes': self.BOXES, 'scores': [0.9, 0.6, 0.35], 'labels': [1, 1, 3],
+            'masks': [box_mask(box) for box in self.BOXES],
+        }
+        self.image = UploadedImage.objects.create(
+            image=name, recognition_type='mask_rcnn', confidence_threshold=0.3, result="x0\nx10\nx20",
+            detections=self.detections, image_hash='a' * 64, model_version='v',
+        )
+
+    def rethreshold(self, image, threshold):
+        response = self.client.post(reverse('recognition:rethreshold', args=[image.id]),
+                                    {'confidence_threshold': threshold})
+        self.assertRedirects(response, reverse('recognition:result', args=[image.id]), fetch_redirect_response=False)
+        image.refresh_from_db()
+        return image
+
+    def test_only_detections_above_the_threshold_are_kept(self):
+        image = self.rethreshold(self.image, 0.5)
+        self.assertEqual(image.result, "x0, 50.00%\nx10, 50.00%")
+        self.assertEqual(image.confidence_threshold, 0.5)
+        # The stored detections stay complete, so the threshold can be lowered again
+        self.assertEqual(image.detections, self.detections)
+        self.assertTrue(image.annotated_image.name)
+
+        image = self.rethreshold(image, 0.3)
+        self.assertEqual(image.result.count("\n"), 2)
+        image = self.rethreshold(image, 0.95)
+        self.assertEqual(image.result, "")
+
+    def test_cached_recognition_uses_the_detections_of_the_same_file(self):
+        cached = UploadedImage.objects.create(
+            image=self.image.image.name, recognition_type='mask_rcnn', confidence_threshold=0.3,
+            result=self.image.result, image_hash=self.image.image_hash, model_version='v',
+        )
+        cached = self.rethreshold(cached, 0.7)
+        self.assertEqual(cached.result, "x0, 50.00%")
+        self.assertEqual(cached.detections, self.detections)
+
+
+class MaskRleTests(SimpleTestCase):
+    def masks(self):
+        rng = np.random.default_rng(0)
+        masks = rng.random((6, 7, 5)) > 0.5
+        masks[0] = False  # empty
+        masks[1] = True  # full, starts with a run of ones
+        masks[2, :, :] = False
+        masks[2, 3, 2] = True  # a single pixel
+        return masks
+
+    def test_column_major_counts_start_with_zeros(self):
+        # COCO counts run down the columns: 0 at (0, 0), then 1, 1, 1
+        self.assertEqual(encode_rle(np.array([[0, 1], [1, 1]], dtype=bool)), {'size': [2, 2], 'counts': [1, 3]})
+        self.assertEqual(encode_rle(np.ones((2, 3), dtype=bool))['counts'], [0, 6])
+        self.assertEqual(encode_rle(np.zeros((2, 3), dtype=bool))['counts'], [6])
+
+    def test_round_trip(self):
+        for mask in self.masks():
+            rle = encode_rle(mask)
+            self.assertEqual(sum(rle['counts']), mask.size)
+            self.assertTrue(np.array_equal(decode_rle(json.loads(json.dumps(rle))), mask))
+
+    def test_batch_matches_single_masks(self):
+        masks = self.masks()
+        self.assertEqual(encode_rle_batch(masks), [encode_rle(mask) for mask in masks])
+        self.assertEqual(encode_rle_batch(np.zeros((0, 7, 5), dtype=bool)), [])
+
+    def test_binarize_accepts_probabilities_and_binary_masks(self):
+        probs = torch.tensor([[[[0.2, 0.7], [0.5, 0.9]]]])
+        expected = np.array([[[False, True], [False, True]]])
+        self.assertTrue(np.array_equal(binarize_masks(probs), expected))
+        self.assertTrue(np.array_equal(binarize_masks(probs > 0.5), expected))
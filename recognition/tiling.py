@@ -0,0 +1,162 @@
+"""
+tiling.py
+=========
+
+This module implements the tiled detection mode (RECOGNITION_DETECTOR_TILING) for large images.
+The displayed image is downscaled to RECOGNITION_MAX_IMAGE_SIDE pixels and the detectors downscale
+their input again to RECOGNITION_DETECTOR_MAX_SIDE pixels, so small objects in a large photo can
+shrink below what they can find. In the tiled mode the original upload is additionally cut into
+overlapping tiles of RECOGNITION_TILE_SIZE pixels that are detected at their native resolution; the
+detections of the tiles and of the whole displayed image are scaled to the displayed image and merged
+with a class-wise non-maximum suppression across tiles.
+"""
+import numpy as np
+import torch
+import torch.nn.functional as F
+from django.conf import settings
+from torchvision.ops import batched_nms
+
+from .batching import run_batched
+from .masks import MASK_THRESHOLD, encode_rle
+from .preprocessing import image_tensor
+
+
+# Overlapping detections of the same class from different tiles are merged above this IoU
+TILE_NMS_IOU = 0.5
+
+# Torchvision's detectors return at most this many detections per image
+MAX_DETECTIONS = 100
+
+
+def tile_positions(length, tile_size, overlap):
+    """
+    Returns the start offsets of tiles covering a range; the last tile is aligned with the end.
+
+    Args:
+        length (int): The length of the range (image width or height).
+        tile_size (int): The length of a tile.
+        overlap (int): The minimum overlap of neighbouring tiles.
+
+    Returns:
+        list[int]: The offsets.
+    """
+    if length <= tile_size:
+        return [0]
+    stride = max(1, tile_size - overlap)
+    positions = list(range(0, length - tile_size, stride))
+    positions.append(length - tile_size)
+    return positions
+
+
+def tiling_enabled():
+    """
+    Checks whether the tiled mode is on, i.e. whether the recognition needs the original upload.
+    """
+    return getattr(settings, 'RECOGNITION_DETECTOR_TILING', False)
+
+
+def needs_tiling(source):
+    """
+    Checks whether an uploaded image is detected in tiles.
+
+    Args:
+        source (PIL.Image.Image): The original upload, or None if it was not kept.
+    """
+    if source is None or not tiling_enabled():
+        return False
+    return max(source.size) > getattr(settings, 'RECOGNITION_TILE_SIZE', 800)
+
+
+def crop_mask(mask_probs, scale):
+    """
+    Resizes a predicted mask to the scale of the displayed image and cuts out the region of the object.
+
+    Args:
+        mask_probs (torch.Tensor): The (H, W) mask probabilities (or binary mask) in the coordinates of the
+                                   detector input.
+        scale (tuple): The (x, y) scale from the detector input to the displayed image.
+
+    Returns:
+        tuple: The (x, y) offset of the crop in the resized mask and the boolean crop,
+               or None if no pixel belongs to the object.
+    """
+    mask_probs = mask_probs.float()
+    size = (max(1, round(mask_probs.shape[0] * scale[1])), max(1, round(mask_probs.shape[1] * scale[0])))
+    if tuple(mask_probs.shape) != size:
+        mask_probs = F.interpolate(mask_probs[None, None], size=size, mode='bilinear', align_corners=False)[0, 0]
+    mask = mask_probs > MASK_THRESHOLD
+    ys, xs = mask.nonzero(as_tuple=True)
+    if not len(ys):
+        return None
+    y1, y2, x1, x2 = int(ys.min()), int(ys.max()) + 1, int(xs.min()), int(xs.max()) + 1
+    return (x1, y1), mask[y1:y2, x1:x2]
+
+
+def detect_tiled(detector, source, image, min_score):
+    """
+    Runs a detector on the displayed image and on overlapping tiles of the original upload and merges the detections.
+
+    Args:
+        detector (str): The registry name of the detector.
+        source (PIL.Image.Image): The original upload.
+        image (torch.Tensor): The (3, H, W) tensor of the displayed (downscaled) image.
+        min_score (float): Detections scoring below this value are dropped before merging.
+
+    Returns:
+        dict: The `boxes`, `scores`, `labels` and, for Mask R-CNN, run-length encoded `masks` of the merged
+              detections in the coordinates of the displayed image, like `views.detect_objects`.
+    """
+    tile_size = getattr(settings, 'RECOGNITION_TILE_SIZE', 800)
+    overlap = getattr(settings, 'RECOGNITION_TILE_OVERLAP', 128)
+    height, width = image.shape[1:]
+    original = image_tensor(source)
+    source_height, source_width = original.shape[1:]
+    scale = (width / source_width, height / source_height)
+
+    # The displayed image first (for objects larger than a tile), then the tiles of the upload;
+    # every input has the offset and scale of its coordinates in the displayed image
+    placements = [(0.0, 0.0, 1.0, 1.0)]
+    inputs = [image]
+    for y in tile_positions(source_height, tile_size, overlap):
+        for x in tile_positions(source_width, tile_size, overlap):
+            placements.append((x * scale[0], y * scale[1], *scale))
+            inputs.append(original[:, y:y + tile_size, x:x + tile_size])
+
+    predictions = run_batched(detector, inputs)
+
+    boxes, scores, labels, sources = [], [], [], []
+    for i, ((x, y, sx, sy), prediction) in enumerate(zip(placements, predictions)):
+        keep = prediction['scores'] >= min_score
+        transform = torch.tensor([sx, sy, sx, sy], dtype=torch.float32)
+        offset = torch.tensor([x, y, x, y], dtype=torch.float32)
+        boxes.append(prediction['boxes'][keep] * transform + offset)
+        scores.append(prediction['scores'][keep])
+        labels.append(prediction['labels'][keep])
+        sources.extend((i, j) for j in keep.nonzero().flatten().tolist())
+
+    boxes, scores, labels = torch.cat(boxes), torch.cat(scores), torch.cat(labels)
+    keep = batched_nms(boxes, scores, labels, TILE_NMS_IOU)[:MAX_DETECTIONS]
+    detections = {
+        'boxes': boxes[keep].tolist(),
+        'scores': scores[keep].tolist(),
+        'labels': labels[keep].tolist(),
+    }
+
+    if 'masks' in predictions[0]:
+        # Only the object region of each kept mask is cut out at the scale of the displayed image; the
+        # crops are pasted into one reused canvas and encoded one by one, not into a canvas per detection
+        canvas = np.zeros((height, width), dtype=bool)
+        masks = []
+        for index in keep.tolist():
+            i, j = sources[index]
+            x, y, sx, sy = placements[i]
+            cropped = crop_mask(predictions[i]['masks'][j, 0], (sx, sy))
+            canvas[:] = False
+            if cropped is not None:
+                (x1, y1), crop = cropped
+                left, top = round(x) + x1, round(y) + y1
+                crop = crop[:max(0, height - top), :max(0, width - left)].numpy()
+                canvas[top:top + crop.shape[0], left:left + crop.shape[1]] = crop
+            masks.append(encode_rle(canvas))
+        detections['masks'] = masks
+    return detections
@@ -7,4 +7,6 @@ app_name = "recognition"
 urlpatterns = [
     path('', views.index, name='index2'),
     path('result/<int:image_id>/', views.result, name='result'),
+    path('result/<int:image_id>/status/', views.result_status, name='result_status'),
+    path('result/<int:image_id>/threshold/', views.rethreshold, name='rethreshold'),
 ]
@@ -0,0 +1,108 @@
+"""
+variants.py
+===========
+
+This module builds and loads the optimized variants of the VGG16 CIFAR-10 classifier that can be
+served instead of the fp32 eager model (RECOGNITION_VGG16_VARIANT):
+
+- 'fp32': the eager model built from the state dict (the default);
+- 'script': the fp32 model in channels_last memory format, traced and frozen with TorchScript;
+- 'int8': the 'script' variant with its Linear layers (most of VGG16's weights) dynamically
+  quantized to int8, about four times smaller and faster on CPU.
+
+The optimized variants are built from the verified fp32 weights by `manage.py build_vgg16_variants`,
+which also checks their accuracy, and are stored next to the weights in the artifact store.
+"""
+import os
+
+import torch
+
+from .artifacts import get_store
+
+
+VGG16_ARTIFACT = 'vgg16_cifar10'
+VGG16_VARIANTS = ('fp32', 'script', 'int8')
+
+
+class ChannelsLast(torch.nn.Module):
+    """
+    Runs a convolutional model on inputs converted to the channels_last memory format.
+    """
+
+    def __init__(self, model):
+        super().__init__()
+        self.model = model.to(memory_format=torch.channels_last)
+
+    def forward(self, x):
+        return self.model(x.contiguous(memory_format=torch.channels_last))
+
+
+def variant_path(variant):
+    """
+    Returns the path of a built VGG16 variant in the artifact store.
+
+    Args:
+        variant (str): One of the optimized VGG16_VARIANTS.
+
+    Returns:
+        str: The path of the TorchScript file.
+    """
+    return os.path.join(get_store().root, f"{VGG16_ARTIFACT}.{variant}.pt")
+
+
+def build_variant(model, variant):
+    """
+    Builds an optimized variant of the fp32 VGG16 model.
+
+    Args:
+        model (torch.nn.Module): The fp32 model in evaluation mode.
+        variant (str): 'script' or 'int8'.
+
+    Returns:
+        torch.jit.ScriptModule: The frozen TorchScript module.
+    """
+    if variant not in VGG16_VARIANTS[1:]:
+        raise ValueError(f"Unknown VGG16 variant: {variant}")
+
+    model = ChannelsLast(model).eval()
+    if variant == 'int8':
+        model = torch.ao.quantization.quantize_dynamic(model, {torch.nn.Linear}, dtype=torch.qint8)
+
+    example = torch.zeros(1, 3, 224, 224)
+    with torch.no_grad():
+        return torch.jit.freeze(torch.jit.trace(model, example).eval())
+
+
+def save_variant(module, variant):
+    """
+    Saves a built variant to the artifact store and returns its path.
+    """
+    path = variant_path(variant)
+    tmp_path = path + '.part'
+    torch.jit.save(module, tmp_path)
+    os.replace(tmp_path, path)
+    return path
+
+
+def load_variant(variant):
+    """
+    Loads a built VGG16 variant.
+
+    Args:
+        variant (str): 'script' or 'int8'.
+
+    Returns:
+        torch.jit.ScriptModule: The model in evaluation mode.
+
+    Raises:
+        RuntimeError: If the variant has not been built or is older than the fp32 weights.
+    """
+    path = variant_path(variant)
+    if not os.path.exists(path):
+        raise RuntimeError(f"The VGG16 variant '{variant}' has not been built. Run `python manage.py build_vgg16_variants`.")
+    if os.path.getmtime(path) < os.path.getmtime(get_store().path(VGG16_ARTIFACT)):
+        raise RuntimeError(f"The VGG16 variant '{variant}' is older than its weights. Run `python manage.py build_vgg16_variants`.")
+    try:
+        return torch.jit.load(path, map_location=torch.device('cpu')).eval()
+    except Exception as e:
+        raise RuntimeError(f"Failed to load the model from the file {path}. Error: {e}")
@@ -1,90 +1,115 @@
-
 """
 views.py
 =========
 
 This module contains views and helper functions for image classification and recognition using models like VGG16, Faster R-CNN, and Mask R-CNN.
+The models themselves are loaded lazily through the model registry (see `loaders.py`).
 """
-import os
-import io
+import threading
+from contextlib import contextmanager
 
-import gdown
 import torch
 import numpy as np
-import matplotlib
-from django.http import Http404
-
-matplotlib.use('Agg')
-import matplotlib.pyplot as plt
-import matplotlib.patches as patches
+from django.http import Http404, JsonResponse
 from PIL import Image
-from skimage import measure
-from torchvision import models, transforms
-import torchvision.transforms.functional as TF
 
+from django.conf import settings
 from django.shortcuts import render, redirect
 from django.utils.translation import gettext as _
-from django.core.files.base import ContentFile
 from django.core.exceptions import ValidationError
 
-from .forms import UploadImageForm
+from .forms import UploadImageForm, ThresholdForm
 from .models import UploadedImage
 from .classes import class_names
+from . import cache as result_cache
+from .batching import run_batched, run_inference
+from .masks import binarize_masks, encode_rle_batch, decode_rle
+from .preprocessing import classifier_inputs, crop_inputs, image_tensor
+from .rendering import render_annotations
+from .tiling import detect_tiled, needs_tiling, tiling_enabled
+
+
+# Detections scoring below the lowest threshold UploadImageForm accepts are never shown, so they are not stored
+MIN_STORED_SCORE = 0.1
+
+# The detectors selectable as recognition types; all of them share the VGG16 crop classification and annotation
+DETECTORS = ('faster_rcnn', 'mask_rcnn', 'faster_rcnn_mobilenet', 'ssdlite')
+
+# Heavy detectors replaced by RECOGNITION_FAST_DETECTOR under load (not Mask R-CNN, whose masks would be lost)
+FALLBACK_DETECTORS = ('faster_rcnn',)
 
+# Recognitions currently running in this process
+_in_flight = 0
+_in_flight_lock = threading.Lock()
 
-def load_model_from_google_drive(file_id, model_name, download_if_exists=False):
+
+def result(request, image_id):
     """
-    Downloads a model file from Google Drive and loads it into memory using PyTorch.
+    Retrieves an uploaded image from the database using its ID and renders a template to display the image.
+    While an asynchronous recognition job is still running, the page shows its status instead.
 
     Args:
-        file_id (str): The unique identifier for the file on Google Drive.
-        model_name (str): The name of the model file to save on the local disk.
-        download_if_exists (bool): If True, the model will be re-downloaded even if it already exists locally.
-                                    If False, the model will be loaded from the local disk if it exists.
+        request (HttpRequest): The HTTP request object.
+        image_id (int): The unique identifier of the uploaded image in the database.
 
     Returns:
-        torch.nn.Module: The PyTorch model loaded from the specified file.
+        HttpResponse: The rendered HTML page to display the image.
 
     Raises:
-        RuntimeError: If the model file cannot be loaded.
+        Http404: If no image is found with the given ID.
     """
-    model_dir = 'media/models'
-    if not os.path.exists(model_dir):
-        os.makedirs(model_dir)
+    try:
+        uploaded_image = UploadedImage.objects.get(id=image_id)
+    except UploadedImage.DoesNotExist:
+        raise Http404(_("Image not found"))
+
+    threshold_form = None
+    if uploaded_image.recognition_type != 'vgg16' and uploaded_image.status == UploadedImage.STATUS_DONE:
+        threshold_form = ThresholdForm(initial={'confidence_threshold': uploaded_image.confidence_threshold})
+
+    return render(request, 'recognition/recognition.html', {'uploaded_image': uploaded_image, 'threshold_form': threshold_form, "title": _("Пізнання")})
 
-    model_path = os.path.join(model_dir, model_name)
 
+def result_status(request, image_id):
+    """
+    Returns the status of a recognition job as JSON, for polling from the result page.
+
+    Args:
+        request (HttpRequest): The HTTP request object.
+        image_id (int): The unique identifier of the uploaded image in the database.
+
+    Returns:
+        JsonResponse: The job status, and the result or error once the job has finished.
+
+    Raises:
+        Http404: If no image is found with the given ID.
+    """
     try:
-        if os.path.exists(model_path) and not download_if_exists:
-            print(f"Model already exists at {model_path}. Loading from disk.")
-        else:
-            print(f"Downloading model to {model_path}...")
-            gdown.download(id=file_id, output=model_path, quiet=False)
-
-        model = torch.load(model_path, map_location=torch.device('cpu'))
-        return model
-
-    except gdown.exceptions.RequestError as e:
-        raise RuntimeError(f"Failed to download the model from Google Drive. Error: {e}")
-    except FileNotFoundError:
-        raise RuntimeError(f"The model file was not found after download. Check if the path is correct: {model_path}")
-    except RuntimeError as e:
-        raise RuntimeError(f"Failed to load the model from the file. Error: {e}")
-    except Exception as e:
-        raise RuntimeError(f"An unexpected error occurred: {e}")
+        uploaded_image = UploadedImage.objects.get(id=image_id)
+    except UploadedImage.DoesNotExist:
+        raise Http404(_("Image not found"))
 
+    return JsonResponse({
+        'status': uploaded_image.status,
+        'finished': uploaded_image.is_finished,
+        'result': uploaded_image.result,
+        'error': uploaded_image.error,
+    })
 
 
-def result(request, image_id):
+def rethreshold(request, image_id):
     """
-    Retrieves an uploaded image from the database using its ID and renders a template to display the image.
+    Re-applies a new confidence threshold to the stored detections of an image.
+
+    Only the filtering, the VGG16 classification of the crops and the annotation are recomputed;
+    the detector does not run again.
 
     Args:
-        request (HttpRequest): The HTTP request object.
+        request (HttpRequest): The HTTP request object with the new `confidence_threshold`.
         image_id (int): The unique identifier of the uploaded image in the database.
 
     Returns:
-        HttpResponse: The rendered HTML page to display the image.
+        HttpResponse: Redirects to the result page.
 
     Raises:
         Http404: If no image is found with the given ID.
@@ -94,7 +119,48 @@ def result(request, image_id):
     except UploadedImage.DoesNotExist:
         raise Http404(_("Image not found"))
 
-    return render(request, 'recognition/recognition.html', {'uploaded_image': uploaded_image, "title": _("Пізнання")})
+    form = ThresholdForm(request.POST or None)
+    detections = find_detections(uploaded_image)
+    if request.method == 'POST' and form.is_valid() and detections is not None:
+        confidence_threshold = form.cleaned_data['confidence_threshold']
+        with uploaded_image.image.open('rb') as f:
+            img = prepare_image(Image.open(f))
+            result, annotated_image = run_inference(annotate_detections, img, detections, confidence_threshold)
+
+        uploaded_image.confidence_threshold = confidence_threshold
+        uploaded_image.result = result
+        uploaded_image.detections = detections
+        uploaded_image.annotated_image.save(annotated_image.name, annotated_image, save=False)
+        uploaded_image.save()
+        result_cache.remember(uploaded_image)
+
+    return redirect('recognition:result', uploaded_image.id)
+
+
+def find_detections(uploaded_image):
+    """
+    Returns the stored raw detections of an image.
+
+    Detections are stored per image, so a recognition that was served from the result cache
+    uses the detections of an earlier recognition of the same file with the same models.
+
+    Args:
+        uploaded_image (UploadedImage): The recognition.
+
+    Returns:
+        dict: The raw detections, or None if there are none (e.g. for whole-image classification).
+    """
+    if uploaded_image.detections is not None:
+        return uploaded_image.detections
+    if not uploaded_image.image_hash or uploaded_image.recognition_type == 'vgg16':
+        return None
+
+    return UploadedImage.objects.filter(
+        image_hash=uploaded_image.image_hash,
+        recognition_type=uploaded_image.recognition_type,
+        model_version=uploaded_image.model_version,
+        detections__isnull=False,
+    ).values_list('detections', flat=True).first()
 
 
 def index(request):
@@ -128,30 +194,45 @@ def index(request):
             img = Image.open(image)
 
             # Checking the image size
-            max_size = (1000, 1000)  # Maximum image size
-            if img.size[0] > max_size[0] or img.size[1] > max_size[1]:
-                if img.size[0] > 10000 or img.size[1] > 10000:  # The image is too large
-                    form.add_error(None, _("The image is too large and cannot be processed."))
-                    return render(request, 'recognition/cognition.html', {'form': form, "title": _("Пізнання"), "page": "cognition", "app": "home"})
-                else:
-                    img = img.resize((max_size[0], max_size[1]), Image.Resampling.LANCZOS)
+            if img.size[0] > 10000 or img.size[1] > 10000:  # The image is too large
+                form.add_error(None, _("The image is too large and cannot be processed."))
+                return render(request, 'recognition/cognition.html', {'form': form, "title": _("Пізнання"), "page": "cognition", "app": "home"})
+
+            uploaded_image = form.save(commit=False)
+            # Under load a heavy detector may be replaced by the fast one; the stored type is the one that ran
+            recognition_type = select_recognition_type(recognition_type)
+            uploaded_image.recognition_type = recognition_type
+            uploaded_image.image_hash = result_cache.content_hash(image)
+            uploaded_image.model_version = result_cache.model_version(recognition_type)
+
+            # A re-upload of the same image with the same parameters reuses the stored result and files
+            cached = result_cache.lookup(uploaded_image.image_hash, recognition_type, confidence_threshold, uploaded_image.model_version)
+            if cached is not None:
+                result_cache.apply(uploaded_image, cached)
+                uploaded_image.save()
+                return redirect('recognition:result', uploaded_image.id)
+
+            if getattr(settings, 'RECOGNITION_ASYNC', False):
+                # Queue the job for `manage.py recognition_worker`; the result page polls its status
+                uploaded_image.status = UploadedImage.STATUS_PENDING
+                uploaded_image.save()
+                return redirect('recognition:result', uploaded_image.id)
 
             try:
-                if recognition_type == 'vgg16':
-                    result = recognize_with_vgg16(img)
-                    annotated_image = None
-                elif recognition_type == 'faster_rcnn':
-                    result, annotated_image = recognize_with_faster_rcnn(img, confidence_threshold)
-                elif recognition_type == 'mask_rcnn':
-                    result, annotated_image = recognize_with_mask_rcnn(img, confidence_threshold)
-                else:
-                    raise ValueError("Invalid recognition type selected.")
-
-                uploaded_image = form.save(commit=False)
+                # The tiled mode detects small objects in the original upload, not only in the downscaled image
+                source = img if tiling_enabled() else None
+                img = prepare_image(img)
+
+                # The models run in the inference pool, so this worker keeps serving other requests
+                with track_in_flight():
+                    result, annotated_image, detections = run_inference(recognize, img, recognition_type, confidence_threshold, source)
+
                 uploaded_image.result = result
+                uploaded_image.detections = detections
                 if annotated_image:
-                    uploaded_image.annotated_image.save(annotated_image.name, annotated_image)
+                    uploaded_image.annotated_image.save(annotated_image.name, annotated_image, save=False)
                 uploaded_image.save()
+                result_cache.remember(uploaded_image)
 
                 return redirect('recognition:result', uploaded_image.id)
             except Exception as e:
@@ -167,6 +248,175 @@ def index(request):
     return render(request, 'recognition/cognition.html', {'form': form, "title": _("Пізнання"), "page": "cognition", "app": "home"})
 
 
+@contextmanager
+def track_in_flight():
+    """
+    Counts a recognition as running in this process for the duration of the block.
+    """
+    global _in_flight
+    with _in_flight_lock:
+        _in_flight += 1
+    try:
+        yield
+    finally:
+        with _in_flight_lock:
+            _in_flight -= 1
+
+
+def current_load():
+    """
+    Returns the number of recognitions waiting or running: queued jobs in the asynchronous mode,
+    otherwise the recognitions running in this process.
+    """
+    if getattr(settings, 'RECOGNITION_ASYNC', False):
+        return UploadedImage.objects.filter(status=UploadedImage.STATUS_PENDING).count()
+    return _in_flight
+
+
+def select_recognition_type(recognition_type):
+    """
+    Replaces a heavy detector with the fast one (RECOGNITION_FAST_DETECTOR) while the load is at or
+    above RECOGNITION_FALLBACK_LOAD. A limit of 0 disables the fallback.
+
+    Args:
+        recognition_type (str): The recognition type selected by the user.
+
+    Returns:
+        str: The recognition type to run.
+    """
+    limit = getattr(settings, 'RECOGNITION_FALLBACK_LOAD', 0)
+    if not limit or recognition_type not in FALLBACK_DETECTORS:
+        return recognition_type
+    if current_load() >= limit:
+        return getattr(settings, 'RECOGNITION_FAST_DETECTOR', 'faster_rcnn_mobilenet')
+    return recognition_type
+
+
+def prepare_image(img):
+    """
+    Downscales an image whose longer side exceeds RECOGNITION_MAX_IMAGE_SIDE, keeping its aspect ratio.
+
+    This is the resolution the results are shown at; the detectors choose their own inference
+    resolution (RECOGNITION_DETECTOR_MAX_SIDE) and return coordinates in this image.
+
+    Args:
+        img (PIL.Image.Image): The uploaded image.
+
+    Returns:
+        PIL.Image.Image: The image, resized if necessary.
+    """
+    max_side = getattr(settings, 'RECOGNITION_MAX_IMAGE_SIDE', 1000)  # Maximum image size
+    if max(img.size) > max_side:
+        scale = max_side / max(img.size)
+        size = (max(1, round(img.size[0] * scale)), max(1, round(img.size[1] * scale)))
+        img = img.resize(size, Image.Resampling.LANCZOS)
+    return img
+
+
+def recognize(img, recognition_type, confidence_threshold, source=None):
+    """
+    Runs the selected recognition on an image.
+
+    Args:
+        img (PIL.Image.Image): The input image.
+        recognition_type (str): 'vgg16' or one of the DETECTORS.
+        confidence_threshold (float): The minimum confidence score for a detection to be considered.
+        source (PIL.Image.Image, optional): The original upload before `prepare_image`, detected in tiles
+                                            by the tiled mode.
+
+    Returns:
+        tuple: The recognition result text, the annotated image (ContentFile or None)
+               and the raw detections (dict or None), see `detect_objects`.
+
+    Raises:
+        ValueError: If the recognition type is invalid or the recognition fails.
+    """
+    if recognition_type == 'vgg16':
+        return recognize_with_vgg16(img), None, None
+    elif recognition_type in DETECTORS:
+        try:
+            # The image is decoded once for the detector and the VGG16 crops
+            image = image_tensor(img)
+            detections = detect_objects(img, recognition_type, image, source)
+            return (*annotate_detections(img, detections, confidence_threshold, image), detections)
+        except Exception as e:
+            raise ValueError("An error occurred during object detection and recognition: " + str(e))
+    raise ValueError("Invalid recognition type selected.")
+
+
+def classify_images(images, topk=1):
+    """
+    Classifies a list of images with the VGG16 model fine-tuned on CIFAR-10 using batched forward passes.
+
+    Args:
+        images (list[PIL.Image.Image]): The images to be classified.
+        topk (int): The number of most probable classes returned per image.
+
+    Returns:
+        list[list[tuple]]: For every image, a list of `topk` (class name, probability) pairs,
+                           most probable first.
+    """
+    return classify_inputs(classifier_inputs(images), topk)
+
+
+def classify_inputs(inputs, topk=1):
+    """
+    Runs VGG16 on prepared (3, 224, 224) inputs, see `preprocessing.py`.
+
+    Args:
+        inputs (list[torch.Tensor]): The normalized inputs.
+        topk (int): The number of most probable classes returned per input.
+
+    Returns:
+        list[list[tuple]]: For every input, a list of `topk` (class name, probability) pairs,
+                           most probable first.
+    """
+    if not inputs:
+        return []
+
+    # Run VGG16, possibly sharing the forward pass with concurrent requests
+    output = torch.stack(run_batched('vgg16', inputs))
+
+    # Apply softmax to get probabilities and find the top predictions
+    probabilities = torch.nn.functional.softmax(output, dim=1)
+    top_probs, top_catids = torch.topk(probabilities, topk, dim=1)
+
+    return [
+        [(class_names[catid], prob) for prob, catid in zip(probs, catids)]
+        for probs, catids in zip(top_probs.tolist(), top_catids.tolist())
+    ]
+
+
+def classify_crops(img, boxes, topk=1, image=None):
+    """
+    Classifies the regions of an image given by bounding boxes in a single batch.
+
+    Args:
+        img (PIL.Image.Image): The source image.
+        boxes (list): Bounding boxes as (x1, y1, x2, y2) sequences.
+        topk (int): The number of most probable classes returned per crop.
+        image (torch.Tensor, optional): `img` already decoded as a tensor; the crops are sliced out of it.
+
+    Returns:
+        list[list[tuple]]: For every box, a list of `topk` (class name, probability) pairs.
+    """
+    return classify_inputs(crop_inputs(img, boxes, image), topk)
+
+
+def format_prediction(prediction):
+    """
+    Formats the most probable class of a prediction the way it is shown to the user.
+
+    Args:
+        prediction (list[tuple]): (class name, probability) pairs, most probable first.
+
+    Returns:
+        str: The class name and its probability as a percentage.
+    """
+    class_name, prob = prediction[0]
+    return f"{class_name}, {prob*100:.2f}%"
+
+
 def recognize_with_vgg16(img):
     """
     Recognizes the class of an image using a pre-trained VGG16 model fine-tuned on the CIFAR-10 dataset.
@@ -181,31 +431,77 @@ def recognize_with_vgg16(img):
         ValueError: If the image is not in RGB mode or if any error occurs during processing.
     """
     try:
-        # Ensure the image is in RGB mode
-        if img.mode != 'RGB':
-            img = img.convert('RGB')
+        return format_prediction(classify_images([img])[0])
+    except Exception as e:
+        # Handle any unexpected errors
+        raise ValueError("An error occurred during recognition: " + str(e))
 
-        # Resize the image to match the input size used during training
-        img = img.resize((32, 32))
 
-        # Transform the image to a tensor and add a batch dimension
-        img_tensor = transform(img).unsqueeze(0)
+def detect_objects(img, detector, image=None, source=None):
+    """
+    Runs an object detector on an image and returns its raw detections, independent of the confidence threshold.
 
-        # Perform inference without tracking gradients
-        with torch.no_grad():
-            output = vgg16(img_tensor)
+    Detections scoring below MIN_STORED_SCORE (the lowest threshold a user can select) are dropped;
+    the masks of Mask R-CNN are binarized and run-length encoded so that they can be stored as JSON.
 
-        # Apply softmax to get probabilities and find the top prediction
-        probabilities = torch.nn.functional.softmax(output[0], dim=0)
-        top_prob, top_catid = torch.topk(probabilities, 1)
+    Args:
+        img (PIL.Image.Image): The input image.
+        detector (str): The registry name of the detector, one of the DETECTORS.
+        image (torch.Tensor, optional): `img` already decoded as a tensor.
+        source (PIL.Image.Image, optional): The original upload; large uploads are detected in tiles
+                                            when RECOGNITION_DETECTOR_TILING is on.
 
-        # Map the predicted class ID to class name
-        class_name = class_names[top_catid.item()]
+    Returns:
+        dict: The `boxes`, `scores`, `labels` and, for Mask R-CNN, `masks` of the detections.
+    """
+    # Convert image to tensor and run the detector, possibly batched with concurrent requests
+    if image is None:
+        image = image_tensor(img)
+    if needs_tiling(source):
+        return detect_tiled(detector, source, image, MIN_STORED_SCORE)
+    predictions = run_batched(detector, [image])[0]
+
+    keep = predictions['scores'] >= MIN_STORED_SCORE
+    detections = {
+        'boxes': predictions['boxes'][keep].tolist(),
+        'scores': predictions['scores'][keep].tolist(),
+        'labels': predictions['labels'][keep].tolist(),
+    }
+    if 'masks' in predictions:
+        detections['masks'] = encode_rle_batch(binarize_masks(predictions['masks'][keep]))
+    return detections
+
+
+def annotate_detections(img, detections, confidence_threshold, image=None):
+    """
+    Classifies the detections above the confidence threshold with VGG16 and draws them on the image.
 
-        return f"{class_name}, {top_prob.item()*100:.2f}%"
-    except Exception as e:
-        # Handle any unexpected errors
-        raise ValueError("An error occurred during recognition: " + str(e))
+    This is the part of the detector paths that depends on the threshold, so changing the threshold
+    only reruns this function on the stored detections.
+
+    Args:
+        img (PIL.Image.Image): The image the detections were made on.
+        detections (dict): Raw detections as returned by `detect_objects`.
+        confidence_threshold (float): The minimum confidence score for a detection to be considered.
+        image (torch.Tensor, optional): `img` already decoded as a tensor.
+
+    Returns:
+        tuple: A tuple containing:
+            - str: The recognition results for all detected objects.
+            - ContentFile: An image file with bounding boxes (or mask contours) and recognition results drawn on it.
+    """
+    # Keep the detections above the confidence threshold and classify all crops in one batch
+    keep = [i for i, score in enumerate(detections['scores']) if score > confidence_threshold]
+    boxes = [detections['boxes'][i] for i in keep]
+    masks = None
+    if 'masks' in detections:
+        masks = np.stack([decode_rle(detections['masks'][i]) for i in keep]) if keep else []
+    recognition_results = [format_prediction(prediction) for prediction in classify_crops(img, boxes, image=image)]
+
+    # Draw the boxes (or mask contours) and labels directly onto the image
+    annotated_image = render_annotations(img, boxes, recognition_results, masks)
+
+    return "\n".join(recognition_results), annotated_image
 
 
 def recognize_with_faster_rcnn(img, confidence_threshold):
@@ -225,62 +521,7 @@ def recognize_with_faster_rcnn(img, confidence_threshold):
         ValueError: If an error occurs during image processing or model inference.
     """
     try:
-        # Convert image to tensor and add batch dimension
-        img_tensor = TF.to_tensor(img).unsqueeze(0)
-
-        # Perform inference without tracking gradients
-        with torch.no_grad():
-            predictions = faster_rcnn(img_tensor)
-
-        # Extract bounding boxes and scores from predictions
-        boxes = predictions[0]['boxes']
-        scores = predictions[0]['scores']
-
-        # Initialize plot
-        fig, ax = plt.subplots()
-        ax.imshow(img)
-
-        # Hide axes
-        ax.axis('off')
-
-        recognition_results = []
-
-        # Iterate over detected objects
-        for box, score in zip(boxes, scores):
-            if score > confidence_threshold:  # Use confidence threshold
-                box = box.tolist()
-                cropped_img = img.crop(box)
-                recognition_result = recognize_with_vgg16(cropped_img)
-                recognition_results.append(recognition_result)
-
-                # Draw bounding box and label on the image
-                rect = patches.Rectangle(
-                    (box[0], box[1]),
-                    box[2] - box[0],
-                    box[3] - box[1],
-                    linewidth=1,
-                    edgecolor='r',
-                    facecolor='none'
-                )
-                ax.add_patch(rect)
-                ax.text(
-                    box[0],
-                    box[1],
-                    recognition_result,
-                    color='k',
-                    fontsize=12,
-                    verticalalignment='top',
-                    bbox=dict(facecolor='yellow', edgecolor='red', boxstyle='round,pad=0.2')
-                )
-
-        # Save the annotated image to a buffer
-        buf = io.BytesIO()
-        plt.savefig(buf, format='png', bbox_inches='tight')
-        buf.seek(0)
-        plt.close(fig)
-
-        return "\n".join(recognition_results), ContentFile(buf.getvalue(), name='annotated_image.png')
-
+        return annotate_detections(img, detect_objects(img, 'faster_rcnn'), confidence_threshold)
     except Exception as e:
         # Handle any unexpected errors
         raise ValueError("An error occurred during object detection and recognition: " + str(e))
@@ -304,97 +545,7 @@ def recognize_with_mask_rcnn(img, confidence_threshold):
         ValueError: If an error occurs during image processing or model inference.
     """
     try:
-        # Convert image to tensor and add batch dimension
-        img_tensor = TF.to_tensor(img).unsqueeze(0)
-
-        # Perform inference without tracking gradients
-        with torch.no_grad():
-            predictions = mask_rcnn(img_tensor)
-
-        # Extract bounding boxes, masks, and scores from predictions
-        boxes = predictions[0]['boxes']
-        masks = predictions[0]['masks']
-        scores = predictions[0]['scores']
-
-        # Initialize plot
-        fig, ax = plt.subplots()
-        ax.imshow(img)
-
-        # Hide axes
-        ax.axis('off')
-
-        recognition_results = []
-
-        # Iterate over detected objects
-        for box, mask, score in zip(boxes, masks, scores):
-            if score > confidence_threshold:  # Use confidence threshold
-                box = box.tolist()
-                mask = mask[0].mul(255).byte().cpu().numpy()
-                mask = np.array(mask, dtype=np.uint8)
-
-                # Find contours of the mask
-                contours = measure.find_contours(mask, 0.5)
-
-                # Plot contours
-                for contour in contours:
-                    contour = np.fliplr(contour)  # Flip coordinates for display
-                    ax.plot(contour[:, 0], contour[:, 1], linewidth=2, color='r')
-
-                # Crop the image to the bounding box
-                cropped_img = img.crop(box).convert('RGB')
-                recognition_result = recognize_with_vgg16(cropped_img)
-                recognition_results.append(recognition_result)
-
-                # Draw bounding box and label on the image
-                ax.text(
-                    box[0],
-                    box[1],
-                    recognition_result,
-                    color='k',
-                    fontsize=12,
-                    verticalalignment='top',
-                    bbox=dict(facecolor='yellow', edgecolor='red', boxstyle='round,pad=0.2')
-                )
-
-        # Save the annotated image to a buffer
-        buf = io.BytesIO()
-        plt.savefig(buf, format='png', bbox_inches='tight')
-        buf.seek(0)
-        plt.close(fig)
-
-        return "\n".join(recognition_results), ContentFile(buf.getvalue(), name='annotated_image.png')
-
+        return annotate_detections(img, detect_objects(img, 'mask_rcnn'), confidence_threshold)
     except Exception as e:
         # Handle any unexpected errors
         raise ValueError("An error occurred during object detection, segmentation, and recognition: " + str(e))
-
-
-file_id = '17v6ng5QSMOShyzJeRblkTNpU4H7mzAb6'
-model_name = 'vgg16_cifar10.pth'
-
-# Load VGG16 model without pretraining
-vgg16 = torch.hub.load('pytorch/vision:v0.10.0', 'vgg16', weights=None)
-vgg16.classifier[6] = torch.nn.Linear(vgg16.classifier[6].in_features, 10)
-
-try:
-    # Set download_if_exists=True to force re-download of the model
-    vgg16.load_state_dict(load_model_from_google_drive(file_id, model_name, download_if_exists=False))
-except ValueError as e:
-    print(f"Error loading model: {e}")
-vgg16.eval()
-
-# Load Faster R-CNN with pre-trained COCO_V1 weights
-faster_rcnn = models.detection.fasterrcnn_resnet50_fpn(weights=models.detection.FasterRCNN_ResNet50_FPN_Weights.COCO_V1)
-faster_rcnn.eval()
-
-# Load Mask R-CNN with pre-trained COCO_V1 weights
-mask_rcnn = models.detection.maskrcnn_resnet50_fpn(weights=models.detection.MaskRCNN_ResNet50_FPN_Weights.COCO_V1)
-mask_rcnn.eval()
-
-# Transformations for VGG16
-transform = transforms.Compose([
-    transforms.Resize(256),
-    transforms.CenterCrop(224),
-    transforms.ToTensor(),
-    transforms.Normalize(mean=[0.485, 0.456, 0.406], std=[0.229, 0.224, 0.225]),
-])
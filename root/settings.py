@@ -185,3 +185,97 @@ SESSION_ENGINE = 'django.contrib.sessions.backends.db'  # або 'cache'
 SESSION_COOKIE_SECURE = False  # Якщо тестуєте локально
 SESSION_EXPIRE_AT_BROWSER_CLOSE = True
 
+
+
+# Machine learning models
+# Models are loaded lazily on first use. List the registry names (vgg16, faster_rcnn, mask_rcnn,
+# faster_rcnn_mobilenet, ssdlite) that the web server (root/wsgi.py) should load at start-up instead,
+# e.g. RECOGNITION_PRELOAD_MODELS=vgg16; manage.py commands never preload
+RECOGNITION_PRELOAD_MODELS = env.list("RECOGNITION_PRELOAD_MODELS", default=[])
+
+# Local store of model weights (see recognition/artifacts.json and `manage.py fetch_models`).
+# With MODEL_OFFLINE=True missing artifacts are an error instead of being downloaded.
+MODEL_ARTIFACTS_DIR = env("MODEL_ARTIFACTS_DIR", default="") or os.path.join(MEDIA_ROOT, "models")
+MODEL_OFFLINE = env.bool("MODEL_OFFLINE", default=False)
+# Load artifacts that have no full SHA-256 digest in the manifest (pin them with `fetch_models --pin` instead)
+MODEL_ALLOW_UNPINNED = env.bool("MODEL_ALLOW_UNPINNED", default=False)
+# Memory-map the weights (torch.load(mmap=True)) so that gunicorn workers share one copy of them
+MODEL_MMAP_WEIGHTS = env.bool("MODEL_MMAP_WEIGHTS", default=True)
+# Maximum number of crops classified by VGG16 / images detected by R-CNN in one forward pass
+RECOGNITION_VGG16_BATCH_SIZE = env.int("RECOGNITION_VGG16_BATCH_SIZE", default=16)
+RECOGNITION_DETECTOR_BATCH_SIZE = env.int("RECOGNITION_DETECTOR_BATCH_SIZE", default=2)
+# Micro-batching of concurrent requests: a batch is run once it is full or its first input
+# has waited RECOGNITION_BATCH_MAX_WAIT_MS milliseconds; with INFERENCE_POOL_SIZE > 0 the batches are
+# collected in the web worker and every batch runs in one pool process
+RECOGNITION_BATCHING = env.bool("RECOGNITION_BATCHING", default=False)
+RECOGNITION_BATCH_MAX_WAIT_MS = env.int("RECOGNITION_BATCH_MAX_WAIT_MS", default=10)
+
+# Process pool for CPU-bound inference and the number of torch intra-op threads of every pool process;
+# 0 runs the models inside the web worker, where a forward pass blocks every greenlet of the gevent worker
+INFERENCE_POOL_SIZE = env.int("INFERENCE_POOL_SIZE", default=2)
+INFERENCE_TORCH_THREADS = env.int("INFERENCE_TORCH_THREADS", default=1)
+
+# Asynchronous recognition: uploads are queued in the database and processed by
+# `manage.py recognition_worker`; processing jobs that their worker has not touched for RECOGNITION_JOB_TIMEOUT
+# seconds are requeued, or fail once they have been claimed RECOGNITION_JOB_MAX_ATTEMPTS times
+RECOGNITION_ASYNC = env.bool("RECOGNITION_ASYNC", default=False)
+RECOGNITION_JOB_TIMEOUT = env.int("RECOGNITION_JOB_TIMEOUT", default=600)
+RECOGNITION_JOB_MAX_ATTEMPTS = env.int("RECOGNITION_JOB_MAX_ATTEMPTS", default=3)
+# Recognition results cached in memory per process (the database keeps all of them)
+RECOGNITION_RESULT_CACHE_SIZE = env.int("RECOGNITION_RESULT_CACHE_SIZE", default=256)
+# Format (WEBP, JPEG or PNG) and quality (1-100, lossy formats only) of the annotated images
+RECOGNITION_ANNOTATION_FORMAT = env("RECOGNITION_ANNOTATION_FORMAT", default="WEBP")
+RECOGNITION_ANNOTATION_QUALITY = env.int("RECOGNITION_ANNOTATION_QUALITY", default=85)
+
+# Resolution of recognition: uploads are downscaled to RECOGNITION_MAX_IMAGE_SIDE pixels on the longer
+# side (aspect ratio kept) and the R-CNN detectors run at RECOGNITION_DETECTOR_MAX_SIDE (0 - torchvision default)
+RECOGNITION_MAX_IMAGE_SIDE = env.int("RECOGNITION_MAX_IMAGE_SIDE", default=1000)
+RECOGNITION_DETECTOR_MAX_SIDE = env.int("RECOGNITION_DETECTOR_MAX_SIDE", default=800)
+# Tiled detection of large images: overlapping tiles of RECOGNITION_TILE_SIZE pixels of the original upload
+# are detected at native resolution in addition to the downscaled image, and the detections are merged
+RECOGNITION_DETECTOR_TILING = env.bool("RECOGNITION_DETECTOR_TILING", default=False)
+RECOGNITION_TILE_SIZE = env.int("RECOGNITION_TILE_SIZE", default=800)
+RECOGNITION_TILE_OVERLAP = env.int("RECOGNITION_TILE_OVERLAP", default=128)
+
+# Load-based fallback: while RECOGNITION_FALLBACK_LOAD or more recognitions are running in the process
+# (queued jobs in the asynchronous mode), Faster R-CNN requests run RECOGNITION_FAST_DETECTOR instead (0 - never)
+RECOGNITION_FAST_DETECTOR = env("RECOGNITION_FAST_DETECTOR", default="faster_rcnn_mobilenet")
+RECOGNITION_FALLBACK_LOAD = env.int("RECOGNITION_FALLBACK_LOAD", default=0)
+
+# VGG16 model served for classification: fp32 (eager), script (TorchScript, channels_last) or
+# int8 (dynamically quantized); build the optimized ones with `manage.py build_vgg16_variants`
+RECOGNITION_VGG16_VARIANT = env("RECOGNITION_VGG16_VARIANT", default="fp32")
+# Preprocessing of the VGG16 inputs: legacy or direct (one tensor resize to 224x224, as in training;
+# only benchmarked on CIFAR-10 images so far, not on detection crops)
+RECOGNITION_VGG16_PREPROCESS = env("RECOGNITION_VGG16_PREPROCESS", default="legacy")
+
+# Models served by ONNX Runtime instead of PyTorch/TensorFlow (vgg16, faster_rcnn, cifar10_keras; needs
+# `pip install -r requirements-onnx.txt`); export them with `manage.py export_onnx` and compare them with
+# `manage.py check_onnx_parity` first.
+# ONNX_INTRA_OP_THREADS limits the threads of every session (0 - ONNX Runtime's default)
+ONNX_RUNTIME_MODELS = env.list("ONNX_RUNTIME_MODELS", default=[])
+ONNX_INTRA_OP_THREADS = env.int("ONNX_INTRA_OP_THREADS", default=0)
+
+# Model of the game: cifar10_keras (TensorFlow, or ONNX Runtime if listed in ONNX_RUNTIME_MODELS) or
+# vgg16 (the recognition VGG16, PyTorch only; needs its pinned artifact digest); compare them with
+# `manage.py check_game_model` before switching
+GAME_MODEL = env("GAME_MODEL", default="cifar10_keras")
+
+# Load the game model and run it once in every gunicorn worker after fork (in its inference pool
+# processes if the pool is enabled), so that the first round does not pay the model loading and
+# graph tracing; see `post_worker_init` in gunicorn.conf.py
+GAME_WARM_UP = env.bool("GAME_WARM_UP", default=False)
+
+# Face ID login: the largest distance between face encodings accepted as the same person
+# (lower is stricter; 0.6 is the face_recognition default)
+FACEID_TOLERANCE = env.float("FACEID_TOLERANCE", default=0.6)
+
+# Face ID index: exact (a float32 matrix scan) or hnsw (approximate, for 100k+ users; requires
+# `pip install hnswlib`). The hnsw index is saved to FACEID_INDEX_PATH by `manage.py build_face_index`;
+# FACEID_HNSW_EF is its search breadth (higher: better recall, slower), see `manage.py benchmark_face_index`
+FACEID_INDEX_BACKEND = env("FACEID_INDEX_BACKEND", default="exact")
+FACEID_INDEX_PATH = env("FACEID_INDEX_PATH", default="") or os.path.join(BASE_DIR, "faceid_index.bin")
+FACEID_HNSW_EF = env.int("FACEID_HNSW_EF", default=128)
+# Seconds between the checks of a worker's face index for deleted and backfilled rows (new rows are
+# picked up at every login)
+FACEID_INDEX_RECONCILE_INTERVAL = env.int("FACEID_INDEX_RECONCILE_INTERVAL", default=60)
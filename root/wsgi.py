@@ -14,3 +14,11 @@ from django.core.wsgi import get_wsgi_application
 os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'root.settings')
 
 application = get_wsgi_application()
+
+# Load the models listed in RECOGNITION_PRELOAD_MODELS in the web process only (with gunicorn's
+# preload_app in the master, before fork, so that the workers share their pages); manage.py
+# commands and the inference pool processes load models on first use
+from django.conf import settings
+from recognition.registry import registry
+
+registry.preload(getattr(settings, 'RECOGNITION_PRELOAD_MODELS', []))